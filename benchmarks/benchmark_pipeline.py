@@ -0,0 +1,219 @@
+# This script measures how long each stage of the analysis scripts takes, and
+# how much memory it uses, on synthetic result files of increasing sizes (see
+# common/synthetic_results.py). For each size, it writes a scenario's files,
+# then times each stage on them:
+#
+#  - "parse": Loading every file as a result_trace.Trace, without the cache.
+#  - "load_cached": Loading every file's Trace from its up-to-date cache.
+#  - "summarize_timeline": view_timelines.summarize_file, for every file.
+#  - "get_thread_timeline": view_timelines.get_thread_timeline, for every
+#    file's summary.
+#  - "get_stackplot_values": view_timelines.get_stackplot_values, for all of
+#    the summaries at once.
+#  - "plugin_summary_values": view_scatterplots.plugin_summary_values, for
+#    every Trace.
+#  - "convert_values_to_cdf": generate_plots_and_table.convert_values_to_cdf,
+#    for every file's execute times.
+#  - "compute_stats": stats.compute_stats, for every file's execute times.
+#
+# Each stage is run --repeats times, and then once more while tracing memory
+# allocations to find its peak memory usage (memory-mapped cache files aren't
+# counted). The results are saved as JSON, and can be compared to the results
+# of an earlier run using --baseline.
+#
+# Usage: python benchmark_pipeline.py [--sizes 1,10,100,1000] [--output
+#     results.json] [--baseline old_results.json] [options]
+import argparse
+import json
+import numpy
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+TOP_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(TOP_DIRECTORY)
+for d in ["worst_case_experiment", "cutting_ahead_timelines",
+    "cu_mask_scatterplot"]:
+    sys.path.append(os.path.join(TOP_DIRECTORY, d))
+from common import plot_utils
+from common import result_trace
+from common import stats
+from common import synthetic_results
+# The scripts import matplotlib, but nothing is drawn.
+plot_utils.use_headless_backend()
+import generate_plots_and_table
+import view_scatterplots
+import view_timelines
+
+def get_stages(filenames):
+    """Returns a list of [name, function] pairs, one for each stage, where
+    each function takes the inputs returned by prepare_inputs."""
+    return [
+        ["parse", lambda inputs: [result_trace.load_trace(f, False)
+            for f in filenames]],
+        ["load_cached", lambda inputs: [result_trace.load_trace(f)
+            for f in filenames]],
+        ["summarize_timeline", lambda inputs: [
+            view_timelines.summarize_file(f) for f in filenames]],
+        ["get_thread_timeline", lambda inputs: [
+            view_timelines.get_thread_timeline(s)
+            for s in inputs["summaries"]]],
+        ["get_stackplot_values", lambda inputs:
+            view_timelines.get_stackplot_values(inputs["summaries"])],
+        ["plugin_summary_values", lambda inputs: [
+            view_scatterplots.plugin_summary_values(t, "execute_times")
+            for t in inputs["traces"]]],
+        ["convert_values_to_cdf", lambda inputs: [
+            generate_plots_and_table.convert_values_to_cdf(t)
+            for t in inputs["times"]]],
+        ["compute_stats", lambda inputs: [stats.compute_stats(t)
+            for t in inputs["times"]]],
+    ]
+
+def prepare_inputs(filenames):
+    """Returns a dict containing the inputs used by the stages that don't
+    read the files themselves: the "traces", the timeline "summaries" and the
+    execute "times" of each file. This also creates each file's cache."""
+    traces = [result_trace.load_trace(f) for f in filenames]
+    return {
+        "traces": traces,
+        "summaries": [view_timelines.summarize_file(f) for f in filenames],
+        "times": [generate_plots_and_table.get_times(t) for t in traces],
+    }
+
+def time_stage(function, inputs, repeats):
+    """Runs the stage's function on the inputs the given number of times,
+    then once more while tracing memory allocations. Returns a dict containing
+    the "seconds" taken by each run, the "min_seconds", and the
+    "peak_memory_bytes" allocated at once during the traced run."""
+    times = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        function(inputs)
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    function(inputs)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        "seconds": times,
+        "min_seconds": min(times),
+        "peak_memory_bytes": peak,
+    }
+
+def write_files(directory, size, args):
+    """Writes the synthetic scenario for the given total size, in bytes, to a
+    subdirectory of the given directory, unless it was already written with
+    the same settings. Returns a list of the file names and the number of
+    jobs per plugin."""
+    job_count = synthetic_results.get_job_count(size, args.plugins,
+        args.blocks, args.threads, args.kernels, args.block_times,
+        args.mean_ms)
+    name = "%dB_%dp_%dk_%db_%dt_%s_%d" % (size, args.plugins, args.kernels,
+        args.blocks, args.threads, str(args.block_times).lower(), args.seed)
+    directory = os.path.join(directory, name)
+    filenames = [os.path.join(directory, "synthetic_%d.json" % (i + 1))
+        for i in range(args.plugins)]
+    if all(os.path.exists(f) for f in filenames):
+        return [filenames, job_count]
+    filenames = synthetic_results.write_scenario(directory,
+        "Synthetic Scenario", args.plugins, job_count, args.blocks,
+        args.threads, args.kernels, args.block_times, args.mean_ms, args.seed)
+    return [filenames, job_count]
+
+def run_size(directory, size, args):
+    """Writes the files for the given size, in bytes, and times each stage on
+    them. Returns a dict describing the results."""
+    start = time.perf_counter()
+    filenames, job_count = write_files(directory, size, args)
+    generate_seconds = time.perf_counter() - start
+    to_return = {
+        "size": size,
+        "bytes": sum(os.path.getsize(f) for f in filenames),
+        "jobs_per_plugin": job_count,
+        "generate_seconds": generate_seconds,
+        "stages": {},
+    }
+    inputs = prepare_inputs(filenames)
+    for name, function in get_stages(filenames):
+        if (args.stages is not None) and (name not in args.stages):
+            continue
+        to_return["stages"][name] = time_stage(function, inputs,
+            args.repeats)
+        print("  %-24s %10.4f s %12.1f MB" % (name,
+            to_return["stages"][name]["min_seconds"],
+            to_return["stages"][name]["peak_memory_bytes"] / 1e6))
+    return to_return
+
+def print_comparison(results, baseline):
+    """Prints the ratio of each stage's time to its time in the baseline (a
+    saved results dict), for each size in both."""
+    print("Compared to the baseline (time / baseline time):")
+    old_sizes = {}
+    for r in baseline["results"]:
+        old_sizes[r["size"]] = r
+    for r in results["results"]:
+        if r["size"] not in old_sizes:
+            continue
+        old = old_sizes[r["size"]]
+        print("  %.1f MB:" % (r["size"] / 1e6))
+        for name in r["stages"]:
+            if name not in old["stages"]:
+                continue
+            ratio = r["stages"][name]["min_seconds"] / \
+                old["stages"][name]["min_seconds"]
+            print("    %-24s %8.3f" % (name, ratio))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1,10,100,1000",
+        help="A comma-separated list of the total sizes of the result files "+
+            "to test, in MB.")
+    parser.add_argument("--repeats", type=int, default=3,
+        help="The number of times to time each stage. The fastest is "+
+            "reported.")
+    parser.add_argument("--stages", default=None,
+        help="A comma-separated list of the stages to run. Defaults to all "+
+            "of them.")
+    parser.add_argument("--data_dir", default=None,
+        help="The directory to write the synthetic result files to. Files "+
+            "written by an earlier run with the same settings are reused. "+
+            "Defaults to a temporary directory, which is deleted "+
+            "afterwards.")
+    parser.add_argument("--output", default="benchmark_results.json",
+        help="The file to save the results to.")
+    parser.add_argument("--baseline", default=None,
+        help="Results saved by an earlier run, to compare against.")
+    synthetic_results.add_arguments(parser)
+    args = parser.parse_args()
+    if args.stages is not None:
+        args.stages = args.stages.split(",")
+    directory = args.data_dir
+    if directory is None:
+        directory = tempfile.mkdtemp(prefix="benchmark_")
+    results = {
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "numpy": numpy.__version__,
+        "settings": vars(args),
+        "results": [],
+    }
+    try:
+        for size in args.sizes.split(","):
+            size = int(float(size) * 1e6)
+            print("%.1f MB:" % (size / 1e6))
+            results["results"].append(run_size(directory, size, args))
+    finally:
+        if args.data_dir is None:
+            shutil.rmtree(directory)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print("Saved the results to " + args.output)
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            print_comparison(results, json.load(f))
@@ -0,0 +1,184 @@
+# This script regenerates the paper's figures and tables (Table 1 and its CDF
+# plots, Figure 7, Figure 9 and Table 2) as files in an output directory,
+# without displaying anything. It uses the same code as the scripts in each
+# subdirectory, but remembers the summary of each result file and the inputs
+# of each output, so running it again only redoes the work affected by result
+# files (or code) that changed since the last run. See common/build_graph.py
+# for details.
+#
+# Usage: python build_figures.py [--output_dir ./output] [--format pdf,png]
+#     [--jobs N]
+import argparse
+import glob
+import os
+import sys
+
+TOP_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+for d in ["worst_case_experiment", "cutting_ahead_timelines",
+    "cu_mask_scatterplot", "striping_vs_not_table"]:
+    sys.path.append(os.path.join(TOP_DIRECTORY, d))
+from common import build_graph
+from common import plot_utils
+# Only write files; never open any windows.
+plot_utils.use_headless_backend()
+import generate_plots_and_table
+import generate_table
+import view_scatterplots
+import view_timelines
+
+def get_figure_paths(args, name):
+    """Returns the list of paths that plot_utils.save_figure will write for a
+    figure with the given name."""
+    return [os.path.join(args.output_dir, name + "." + f)
+        for f in args.formats]
+
+def save_figure(args, figure, name):
+    plot_utils.save_figure(figure, args.output_dir, name, args.formats)
+
+def write_table(path, print_function, *args):
+    """Calls a script's print_table function with the given arguments,
+    writing the table to the given path instead of stdout."""
+    with open(path, "w") as f:
+        print_function(*args, output=f)
+
+def find_missing(filenames):
+    """Returns the list of the given files that don't exist."""
+    return [name for name in filenames if not os.path.exists(name)]
+
+def build_table_1(state, args, used_keys):
+    """Builds Table 1 and its 4 CDF plots."""
+    module = generate_plots_and_table
+    directory = os.path.join(TOP_DIRECTORY, "worst_case_experiment")
+    data = module.get_file_list()
+    present = []
+    for d in data:
+        d["file"] = os.path.join(directory, d["file"])
+        if os.path.exists(d["file"]):
+            present.append(d)
+    keys, summaries = state.get_summaries(module.summarize_file,
+        [(d["file"], args.max_cdf_points) for d in present], args.jobs)
+    used_keys.update(keys)
+    for d, key, summary in zip(present, keys, summaries):
+        d["key"] = key
+        d.update(summary)
+    code_hash = state.hash_code(module)
+
+    missing = find_missing([d["file"] for d in data])
+    if len(missing) != 0:
+        print("Skipping Table 1: missing " + ", ".join(missing))
+    else:
+        path = os.path.join(args.output_dir, "table_1.tex")
+        built = state.build_target("Table 1", [path],
+            [code_hash] + [d["key"] for d in data],
+            lambda: write_table(path, module.print_table, data))
+        print_target_status("Table 1", built)
+
+    for name, indices in module.get_plot_list():
+        plot_data = [data[i] for i in indices]
+        target = "Table 1 CDF: " + name
+        missing = find_missing([d["file"] for d in plot_data])
+        if len(missing) != 0:
+            print("Skipping %s: missing %s" % (target, ", ".join(missing)))
+            continue
+        output_name = "table_1_cdf_" + plot_utils.get_output_name(name)
+        built = state.build_target(target, get_figure_paths(args, output_name),
+            [code_hash] + [d["key"] for d in plot_data],
+            lambda: save_figure(args, module.generate_plot(plot_data, name),
+                output_name))
+        print_target_status(target, built)
+
+def build_figure_7(state, args, used_keys):
+    """Builds one timeline plot per scenario in the cutting_ahead_timelines
+    directory."""
+    module = view_timelines
+    directory = os.path.join(TOP_DIRECTORY, "cutting_ahead_timelines")
+    filenames = sorted(glob.glob(os.path.join(directory, "*.json")))
+    keys, summaries = state.get_summaries(module.summarize_file,
+        [(name,) for name in filenames], args.jobs)
+    used_keys.update(keys)
+    code_hash = state.hash_code(module)
+    for summary, key in zip(summaries, keys):
+        summary["key"] = key
+    scenarios = module.group_by_scenario(summaries)
+    for scenario in scenarios:
+        plugins = scenarios[scenario]
+        target = "Figure 7: " + scenario
+        output_name = "figure_7_" + plot_utils.get_output_name(scenario)
+        built = state.build_target(target, get_figure_paths(args, output_name),
+            [code_hash] + sorted([p["key"] for p in plugins]),
+            lambda: save_figure(args, module.plot_scenario(plugins, scenario,
+                True), output_name))
+        print_target_status(target, built)
+
+def build_figure_9(state, args, used_keys):
+    """Builds the CU partition size scatterplot."""
+    module = view_scatterplots
+    directory = os.path.join(TOP_DIRECTORY, "cu_mask_scatterplot")
+    filenames = sorted(glob.glob(os.path.join(directory, "*.json")))
+    keys, summaries = state.get_summaries(module.summarize_file,
+        [(name, "execute_times") for name in filenames], args.jobs)
+    used_keys.update(keys)
+    built = state.build_target("Figure 9", get_figure_paths(args, "figure_9"),
+        [state.hash_code(module)] + keys,
+        lambda: save_figure(args, module.plot_scenarios(
+            module.group_summaries(summaries)), "figure_9"))
+    print_target_status("Figure 9", built)
+
+def build_table_2(state, args, used_keys):
+    """Builds the table comparing striped and unstriped CU masks."""
+    module = generate_table
+    directory = os.path.join(TOP_DIRECTORY, "striping_vs_not_table")
+    rows = module.get_row_list()
+    for row in rows:
+        row["file"] = os.path.join(directory, row["file"])
+    missing = find_missing([row["file"] for row in rows])
+    if len(missing) != 0:
+        print("Skipping Table 2: missing " + ", ".join(missing))
+        return
+    keys, summaries = state.get_summaries(module.summarize_file,
+        [(row["file"],) for row in rows], args.jobs)
+    used_keys.update(keys)
+    path = os.path.join(args.output_dir, "table_2.tex")
+    built = state.build_target("Table 2", [path],
+        [state.hash_code(module)] + keys,
+        lambda: write_table(path, module.print_table, rows, summaries))
+    print_target_status("Table 2", built)
+
+def print_target_status(name, built):
+    if built:
+        print("Built " + name)
+    else:
+        print(name + " is up to date")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output_dir", default="./output",
+        help="The directory in which to write the figures and tables. The "+
+            "build state is kept in a .build_state directory inside it.")
+    parser.add_argument("--max_cdf_points",
+        type=generate_plots_and_table.parse_max_cdf_points, default=2000,
+        help="The maximum number of points to plot in each CDF, at least "+
+            str(generate_plots_and_table.MIN_CDF_POINTS) + ". Set to 0 to "+
+            "plot every point.")
+    parser.add_argument("--format", default="pdf",
+        help="A comma-separated list of file formats to save figures in, "+
+            "e.g. pdf,png.")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+        help="The number of processes to use when summarizing result files.")
+    args = parser.parse_args()
+    args.formats = plot_utils.parse_formats(args.format)
+    if args.max_cdf_points == 0:
+        args.max_cdf_points = None
+    if not os.path.exists(args.output_dir):
+        os.makedirs(args.output_dir)
+    state = build_graph.BuildState(os.path.join(args.output_dir,
+        ".build_state"))
+    used_keys = set()
+    build_table_1(state, args, used_keys)
+    build_figure_7(state, args, used_keys)
+    build_figure_9(state, args, used_keys)
+    build_table_2(state, args, used_keys)
+    state.remove_unused_summaries(used_keys)
+    state.save()
+    print("Summarized %d result files, reused %d saved summaries." % (
+        state.summaries_computed, state.summaries_loaded))
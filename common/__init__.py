@@ -0,0 +1,4 @@
+# Modules shared by the scripts in this repository's subdirectories. The
+# scripts are meant to be run from within their own directories, so each of
+# them adds the top-level directory of this repository to sys.path before
+# importing anything from here.
@@ -0,0 +1,133 @@
+# This module builds an index over the "block_times" of every kernel in a
+# result file, for answering questions like "how many threads were running at
+# time t" or "which blocks were resident between t0 and t1" without rebuilding
+# a whole timeline.
+#
+# Blocks are stored sorted by start time. Point queries use prefix sums of the
+# thread counts in start-time and end-time order, and window queries use a
+# segment tree holding the latest end time among each power-of-two-sized range
+# of blocks (in start-time order), so only the subtrees containing matching
+# blocks are visited. Both take logarithmic time, plus the number of blocks
+# returned.
+import numpy
+
+class BlockIndex:
+    """An index over a set of blocks, each with a start time, end time, thread
+    count, and the index of the kernel (i.e. the record in the result file's
+    "times" array) it belonged to. A block is considered to be running at time
+    t if start <= t < end."""
+    __slots__ = ["starts", "ends", "thread_counts", "kernels",
+        "start_thread_sums", "sorted_ends", "end_thread_sums", "max_end_tree"]
+
+    def __init__(self, starts, ends, thread_counts, kernels):
+        """Takes four equal-length numpy arrays, with one element per
+        block."""
+        order = numpy.argsort(starts, kind="stable")
+        self.starts = numpy.asarray(starts, dtype=numpy.float64)[order]
+        self.ends = numpy.asarray(ends, dtype=numpy.float64)[order]
+        self.thread_counts = numpy.asarray(thread_counts,
+            dtype=numpy.int64)[order]
+        self.kernels = numpy.asarray(kernels, dtype=numpy.int64)[order]
+        # start_thread_sums[i] is the number of threads in the first i blocks
+        # to start, and end_thread_sums[i] is the number of threads in the
+        # first i blocks to end.
+        self.start_thread_sums = numpy.zeros(len(order) + 1, dtype=numpy.int64)
+        numpy.cumsum(self.thread_counts, out=self.start_thread_sums[1:])
+        end_order = numpy.argsort(self.ends, kind="stable")
+        self.sorted_ends = self.ends[end_order]
+        self.end_thread_sums = numpy.zeros(len(order) + 1, dtype=numpy.int64)
+        numpy.cumsum(self.thread_counts[end_order],
+            out=self.end_thread_sums[1:])
+        self.max_end_tree = self._build_max_end_tree()
+
+    def _build_max_end_tree(self):
+        """Returns a list of numpy arrays, one per level of the segment tree.
+        Level 0 holds the end time of each block (padded to a power of two
+        with -inf), and element i of level j holds the latest end time of
+        blocks i * 2^j through (i + 1) * 2^j - 1. The last level contains only
+        the root."""
+        size = 1
+        while size < len(self.ends):
+            size *= 2
+        level = numpy.full(size, -numpy.inf)
+        level[:len(self.ends)] = self.ends
+        to_return = [level]
+        while len(level) > 1:
+            level = level.reshape((-1, 2)).max(axis=1)
+            to_return.append(level)
+        return to_return
+
+    def get_block_count(self):
+        return len(self.starts)
+
+    def get_first_start_time(self):
+        """Returns the time at which the first block started, or None if
+        there are no blocks."""
+        if len(self.starts) == 0:
+            return None
+        return self.starts[0]
+
+    def get_last_end_time(self):
+        """Returns the time at which the last block ended, or None if there
+        are no blocks."""
+        if len(self.starts) == 0:
+            return None
+        return self.max_end_tree[-1][0]
+
+    def get_thread_count(self, t):
+        """Returns the number of threads running at time t. t may also be a
+        numpy array of times, in which case this returns an array of
+        counts."""
+        started = numpy.searchsorted(self.starts, t, side="right")
+        ended = numpy.searchsorted(self.sorted_ends, t, side="right")
+        return self.start_thread_sums[started] - self.end_thread_sums[ended]
+
+    def get_window_indices(self, start_time, end_time, kernel=None):
+        """Returns a sorted numpy array of the indices (in this index's
+        start-time order) of the blocks that were running at any point in the
+        window [start_time, end_time), i.e. blocks with start < end_time and
+        end > start_time. If kernel is given, only that kernel's blocks are
+        returned."""
+        # Only the blocks before this one started before the window ended.
+        limit = numpy.searchsorted(self.starts, end_time, side="left")
+        if limit == 0:
+            return numpy.zeros(0, dtype=numpy.int64)
+        # Walk down the tree, keeping the nodes containing at least one block
+        # that started before the window ended and ended after it started.
+        nodes = numpy.zeros(1, dtype=numpy.int64)
+        level_count = len(self.max_end_tree)
+        for level in range(level_count - 1, -1, -1):
+            if level != (level_count - 1):
+                nodes = numpy.stack((nodes * 2, nodes * 2 + 1), axis=1)
+                nodes = nodes.reshape(-1)
+            first_blocks = nodes << level
+            keep = (first_blocks < limit) & \
+                (self.max_end_tree[level][nodes] > start_time)
+            nodes = nodes[keep]
+            if len(nodes) == 0:
+                break
+        if kernel is not None:
+            nodes = nodes[self.kernels[nodes] == kernel]
+        return nodes
+
+    def get_window_blocks(self, start_time, end_time, kernel=None):
+        """Returns a dict of numpy arrays describing the blocks returned by
+        get_window_indices: their "starts", "ends", "thread_counts" and
+        "kernels"."""
+        indices = self.get_window_indices(start_time, end_time, kernel)
+        return {
+            "starts": self.starts[indices],
+            "ends": self.ends[indices],
+            "thread_counts": self.thread_counts[indices],
+            "kernels": self.kernels[indices],
+        }
+
+def build_block_index(trace):
+    """Takes a result_trace.Trace, and returns a BlockIndex over every block of
+    every kernel in it. Each kernel's "thread_count" is used as the thread
+    count of each of its blocks."""
+    pairs = trace.get_block_intervals()
+    blocks_per_kernel = trace.get_blocks_per_kernel()
+    return BlockIndex(pairs[:, 0], pairs[:, 1],
+        numpy.repeat(trace.thread_counts, blocks_per_kernel),
+        numpy.repeat(trace.kernel_records, blocks_per_kernel))
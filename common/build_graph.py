@@ -0,0 +1,203 @@
+# This module tracks the dependencies between result files, the per-file
+# summaries computed from them, and the figures and tables built from those
+# summaries, so that regenerating the paper's outputs only redoes the work
+# whose inputs actually changed.
+#
+# Every summary depends on a single result file, identified by the SHA1 hash
+# of its contents, along with the code used to compute it and any other
+# arguments. Summaries are pickled into a "summaries/" directory, named after
+# the hash of all of those things, so a summary is only recomputed when one of
+# them changes. Each output (a "target") depends on a list of summary keys and
+# options, and is only rebuilt when that list changes or its files are
+# missing. The hash of each result file, and the dependencies each target was
+# last built from, are kept in "state.json".
+import glob
+import hashlib
+import json
+import os
+import pickle
+import sys
+import types
+
+from common import parallel
+from common import result_cache
+
+# Increment this whenever the layout of the state directory changes.
+STATE_VERSION = 1
+
+def get_code_files(module):
+    """Returns the sorted list of source files that the given module's
+    summaries and outputs depend on: every module in common/, plus the
+    module's own file and that of every other module in this repository it
+    imports, directly or through other modules it imports (e.g.
+    worst_case_experiment.py, which defines the files and labels used by
+    generate_plots_and_table.py)."""
+    common_directory = os.path.dirname(os.path.abspath(__file__))
+    top_directory = os.path.dirname(common_directory)
+    files = set(glob.glob(os.path.join(common_directory, "*.py")))
+    visited = set()
+    to_visit = [module]
+    while len(to_visit) > 0:
+        m = to_visit.pop()
+        path = getattr(m, "__file__", None)
+        if (path is None) or (m.__name__ in visited):
+            continue
+        visited.add(m.__name__)
+        path = os.path.abspath(path)
+        if not path.startswith(top_directory + os.sep):
+            continue
+        files.add(path)
+        # Follow both imported modules and names imported from modules.
+        for value in vars(m).values():
+            if isinstance(value, types.ModuleType):
+                to_visit.append(value)
+            elif getattr(value, "__module__", None) in sys.modules:
+                to_visit.append(sys.modules[value.__module__])
+    return sorted(files)
+
+def hash_strings(strings):
+    """Returns a SHA1 hash of a list of strings, as a hex string."""
+    h = hashlib.sha1()
+    for s in strings:
+        h.update(s.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+class BuildState:
+    """Holds the content hashes of result files, and the dependencies of each
+    target, for the state directory with the given path. Call save to write
+    changes back to disk."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.state_path = os.path.join(directory, "state.json")
+        self.summary_directory = os.path.join(directory, "summaries")
+        self.file_hashes = {}
+        self.targets = {}
+        self.code_hashes = {}
+        # Counts of the work done, for reporting.
+        self.summaries_loaded = 0
+        self.summaries_computed = 0
+        if os.path.exists(self.state_path):
+            with open(self.state_path) as f:
+                state = json.loads(f.read())
+            if state.get("version") == STATE_VERSION:
+                self.file_hashes = state["file_hashes"]
+                self.targets = state["targets"]
+
+    def save(self):
+        """Writes the file hashes and target dependencies to state.json."""
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        state = {
+            "version": STATE_VERSION,
+            "file_hashes": self.file_hashes,
+            "targets": self.targets,
+        }
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(json.dumps(state, indent=1, sort_keys=True))
+        os.replace(tmp_path, self.state_path)
+
+    def hash_file(self, filename):
+        """Returns the SHA1 hash of the file's contents. The hash is
+        remembered along with the file's size and modification time, so the
+        file is only read again if either of them changes."""
+        path = os.path.abspath(filename)
+        info = os.stat(path)
+        entry = self.file_hashes.get(path)
+        if (entry is not None) and (entry["size"] == info.st_size) and \
+            (entry["mtime_ns"] == info.st_mtime_ns):
+            return entry["sha1"]
+        digest = result_cache.hash_file(path)
+        self.file_hashes[path] = {
+            "size": info.st_size,
+            "mtime_ns": info.st_mtime_ns,
+            "sha1": digest,
+        }
+        return digest
+
+    def hash_code(self, module):
+        """Returns a hash of the source files returned by get_code_files for
+        the module, so that changing the code invalidates everything computed
+        using it."""
+        name = module.__name__
+        if name not in self.code_hashes:
+            files = get_code_files(module)
+            self.code_hashes[name] = hash_strings([result_cache.hash_file(f)
+                for f in files])
+        return self.code_hashes[name]
+
+    def get_summary_key(self, function, args):
+        """Returns the key identifying the result of calling the summary
+        function with the given tuple of arguments. The first argument must
+        be the name of a result file."""
+        module = sys.modules[function.__module__]
+        strings = [function.__module__, function.__qualname__,
+            self.hash_code(module), self.hash_file(args[0])]
+        strings += [repr(a) for a in args]
+        return hash_strings(strings)
+
+    def _summary_path(self, key):
+        return os.path.join(self.summary_directory, key + ".pickle")
+
+    def get_summaries(self, function, arguments, jobs=1):
+        """Takes a function that summarizes a single result file, and a list
+        of argument tuples for it, where the first argument is always the name
+        of a result file. Returns a list of two lists: the key of each
+        summary, and each summary. Summaries that were already computed are
+        loaded from disk, and the rest are computed using the given number of
+        worker processes and saved."""
+        keys = [self.get_summary_key(function, args) for args in arguments]
+        summaries = [None] * len(keys)
+        stale = []
+        for i in range(len(keys)):
+            path = self._summary_path(keys[i])
+            if not os.path.exists(path):
+                stale.append(i)
+                continue
+            with open(path, "rb") as f:
+                summaries[i] = pickle.load(f)
+            self.summaries_loaded += 1
+        if len(stale) == 0:
+            return [keys, summaries]
+        if not os.path.exists(self.summary_directory):
+            os.makedirs(self.summary_directory)
+        results = parallel.map_in_processes(function,
+            [arguments[i] for i in stale], jobs)
+        for i, summary in zip(stale, results):
+            path = self._summary_path(keys[i])
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(summary, f)
+            os.replace(tmp_path, path)
+            summaries[i] = summary
+            self.summaries_computed += 1
+        return [keys, summaries]
+
+    def build_target(self, name, outputs, dependencies, function):
+        """Calls function() to build the target with the given name, which
+        must write every file in the outputs list, unless the outputs already
+        exist and were built from the same dependencies. The dependencies are
+        a JSON-serializable list, usually of summary keys and code hashes.
+        Returns True if the target was rebuilt."""
+        fingerprint = hash_strings([json.dumps(dependencies, sort_keys=True)])
+        up_to_date = self.targets.get(name) == fingerprint
+        for path in outputs:
+            if not os.path.exists(path):
+                up_to_date = False
+        if up_to_date:
+            return False
+        function()
+        self.targets[name] = fingerprint
+        # Save after every target, so an interrupted build keeps its progress.
+        self.save()
+        return True
+
+    def remove_unused_summaries(self, used_keys):
+        """Deletes every saved summary whose key isn't in the given set."""
+        paths = glob.glob(os.path.join(self.summary_directory, "*.pickle"))
+        for path in paths:
+            key = os.path.basename(path)[:-len(".pickle")]
+            if key not in used_keys:
+                os.remove(path)
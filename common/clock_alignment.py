@@ -0,0 +1,106 @@
+# This module converts "block_times", which are measured using the GPU's clock,
+# into the CPU timebase used by "kernel_launch_times", "execute_times", and the
+# other CPU-side times in a result file, so that block-level and job-level
+# events can be compared directly.
+#
+# The conversion is a linear function of the GPU time (an offset and a scale,
+# to account for drift between the clocks), fitted separately for each result
+# file. Each kernel contributes two pairs of times: its first block's start
+# time paired with the CPU time at which the kernel launch started, and its
+# last block's end time paired with the CPU time at which the kernel was
+# found to have completed. The fit minimizes the squared error over every
+# pair. The header's "clock_rate" isn't used, since it doesn't always hold a
+# usable value (e.g. if it overflowed).
+import numpy
+
+def get_clock_pairs(trace):
+    """Takes a result_trace.Trace, and returns a list of two numpy arrays: GPU
+    times and the corresponding CPU times, with two pairs for each kernel
+    containing both block times and launch times. See the comment at the top
+    of this file."""
+    blocks_per_kernel = trace.get_blocks_per_kernel()
+    not_empty = blocks_per_kernel > 0
+    if not not_empty.any():
+        return [numpy.zeros(0), numpy.zeros(0)]
+    # The non-empty kernels' blocks are contiguous, so the first start and
+    # last end of each can be found with a single reduceat.
+    blocks = trace.get_block_intervals()
+    kernel_starts = trace.block_time_offsets[:-1][not_empty] // 2
+    first_starts = numpy.minimum.reduceat(blocks[:, 0], kernel_starts)
+    last_ends = numpy.maximum.reduceat(blocks[:, 1], kernel_starts)
+    records = trace.kernel_records[not_empty]
+
+    # Find each kernel's first and last launch times, skipping kernels without
+    # at least two of them.
+    launches = trace.get_intervals("kernel_launch_times")
+    launch_records = trace.get_interval_records("kernel_launch_times")
+    first = numpy.searchsorted(launch_records, records, side="left")
+    last = numpy.searchsorted(launch_records, records, side="right") - 1
+    valid = last >= first
+    first = first[valid]
+    last = last[valid]
+    launch_starts = launches[first, 0]
+    launch_ends = launches[last, 1]
+    has_pair = launch_ends > launch_starts
+    gpu_times = numpy.concatenate((first_starts[valid][has_pair],
+        last_ends[valid][has_pair]))
+    cpu_times = numpy.concatenate((launch_starts[has_pair],
+        launch_ends[has_pair]))
+    return [gpu_times, cpu_times]
+
+def can_fit_clock_alignment(gpu_times):
+    """Returns True if fit_clock_alignment can fit an alignment using the
+    given numpy array of GPU times, which requires at least two different
+    times."""
+    return (len(gpu_times) >= 2) and (gpu_times.min() != gpu_times.max())
+
+def fit_clock_alignment(gpu_times, cpu_times):
+    """Takes numpy arrays of corresponding GPU and CPU times, and returns a
+    dict describing the least-squares linear fit from GPU to CPU times, which
+    can be passed to gpu_to_cpu. The dict contains the "scale" (CPU time per
+    unit of GPU time), the mean GPU and CPU times that the fit passes through
+    ("gpu_reference" and "cpu_reference"), and the "max_error" of the fit on
+    the given times, in CPU time. A line always passes through two points
+    exactly, so max_error is None if there are fewer than three pairs of
+    times. Raises an exception if can_fit_clock_alignment returns False."""
+    gpu_times = numpy.asarray(gpu_times, dtype=numpy.float64)
+    cpu_times = numpy.asarray(cpu_times, dtype=numpy.float64)
+    if not can_fit_clock_alignment(gpu_times):
+        raise Exception("At least two different GPU times are needed to " +
+            "align the clocks")
+    # Fit relative to the means to avoid losing precision on large times.
+    gpu_reference = gpu_times.mean()
+    cpu_reference = cpu_times.mean()
+    gpu_deltas = gpu_times - gpu_reference
+    scale = numpy.dot(gpu_deltas, cpu_times - cpu_reference) / \
+        numpy.dot(gpu_deltas, gpu_deltas)
+    to_return = {
+        "scale": scale,
+        "gpu_reference": gpu_reference,
+        "cpu_reference": cpu_reference,
+    }
+    to_return["max_error"] = None
+    if len(gpu_times) >= 3:
+        errors = gpu_to_cpu(gpu_times, to_return) - cpu_times
+        to_return["max_error"] = numpy.abs(errors).max()
+    return to_return
+
+def get_clock_alignment(trace):
+    """Returns the clock alignment (see fit_clock_alignment) for a
+    result_trace.Trace, fitted using its own kernels."""
+    gpu_times, cpu_times = get_clock_pairs(trace)
+    return fit_clock_alignment(gpu_times, cpu_times)
+
+def gpu_to_cpu(times, alignment):
+    """Converts a number or numpy array of GPU times into CPU times, using an
+    alignment returned by fit_clock_alignment."""
+    return (numpy.asarray(times) - alignment["gpu_reference"]) * \
+        alignment["scale"] + alignment["cpu_reference"]
+
+def get_cpu_block_intervals(trace, alignment=None):
+    """Returns an (n, 2) numpy array of the [start, end] times of every block
+    in the trace, like trace.get_block_intervals(), but converted to CPU time.
+    Uses the trace's own alignment if none is given."""
+    if alignment is None:
+        alignment = get_clock_alignment(trace)
+    return gpu_to_cpu(trace.get_block_intervals(), alignment)
@@ -0,0 +1,184 @@
+# This module creates and parses compute unit (CU) masks for GPUs of any size.
+# Masks are represented as bitsets (Python ints), where bit i is set if CU i
+# is enabled. They can be converted to and from the two textual forms used by
+# the experiments:
+#
+#  - Strings of 0 and 1 characters, as in the "compute_unit_mask" field of a
+#    hip_plugin_framework config, where the first character is CU 0.
+#
+#  - Hexadecimal numbers, as in the names of the files written by
+#    hip_plugin_framework/scripts/test_cu_mask.py (e.g.
+#    "cu_mask_sw4_7777777ffffffff.json"), where the lowest bit is CU 0.
+#
+# On AMD GPUs, consecutive CUs in a mask belong to different shader engines
+# (SEs): CU i is on SE (i % SE count). So a mask of consecutive CUs is spread
+# evenly across the SEs, while taking every SE-count-th CU packs the mask into
+# as few SEs as possible. The Radeon VII used in the paper has 60 CUs in 4 SEs.
+import os
+import re
+
+# The number of SEs on the Radeon VII, used by default.
+DEFAULT_SE_COUNT = 4
+
+# Matches the names of the files written by test_cu_mask.py, containing the
+# stripe width and the hexadecimal mask.
+_MASK_FILENAME_RE = re.compile(r"^cu_mask_sw(\d+)_([0-9a-fA-F]+)\.json$")
+
+def from_string(s):
+    """Takes a CU mask given as a string of 0 and 1 characters, with CU 0
+    first, and returns it as a bitset."""
+    if (len(s) == 0) or (len(s.replace("0", "").replace("1", "")) != 0):
+        raise Exception("Invalid CU mask: %s" % (s))
+    # int() expects the highest bit first.
+    return int(s[::-1], 2)
+
+def to_string(mask, cu_count):
+    """Takes a CU mask bitset and returns it as a string of cu_count 0 and 1
+    characters, with CU 0 first."""
+    if mask >= (1 << cu_count):
+        raise Exception("CU mask %x doesn't fit in %d CUs" % (mask, cu_count))
+    return format(mask, "0%db" % (cu_count))[::-1]
+
+def from_hex(s):
+    """Takes a CU mask given as a hexadecimal string, with or without a "0x"
+    prefix, and returns it as a bitset."""
+    try:
+        return int(s, 16)
+    except ValueError:
+        raise Exception("Invalid CU mask: %s" % (s))
+
+def to_hex(mask):
+    """Returns the CU mask bitset as a hexadecimal string, padded to at least
+    8 digits, as in test_cu_mask.py's file names."""
+    return "%08x" % (mask)
+
+def parse_mask(s):
+    """Takes a CU mask given either as a string of 0 and 1 characters, or as a
+    hexadecimal string starting with "0x", and returns it as a bitset."""
+    if s.lower().startswith("0x"):
+        return from_hex(s)
+    return from_string(s)
+
+def get_cu_count(mask):
+    """Returns the number of CUs enabled by the CU mask bitset."""
+    return bin(mask).count("1")
+
+def get_cu_list(mask):
+    """Returns a sorted list of the indices of the CUs enabled by the CU mask
+    bitset."""
+    to_return = []
+    i = 0
+    while mask != 0:
+        if (mask & 1) != 0:
+            to_return.append(i)
+        mask >>= 1
+        i += 1
+    return to_return
+
+def from_cu_list(cus):
+    """Takes a list of CU indices and returns a CU mask bitset enabling
+    them."""
+    to_return = 0
+    for cu in cus:
+        to_return |= 1 << cu
+    return to_return
+
+def get_range_mask(first_cu, count):
+    """Returns a CU mask bitset enabling count consecutive CUs, starting with
+    first_cu."""
+    return ((1 << count) - 1) << first_cu
+
+def get_se_layout(mask, cu_count, se_count=DEFAULT_SE_COUNT):
+    """Takes a CU mask bitset for a GPU with cu_count CUs in se_count SEs, and
+    returns a list containing the number of enabled CUs in each SE."""
+    if (cu_count % se_count) != 0:
+        raise Exception("%d CUs can't be split between %d SEs" % (cu_count,
+            se_count))
+    to_return = [0] * se_count
+    for cu in get_cu_list(mask):
+        if cu >= cu_count:
+            raise Exception("CU mask %x doesn't fit in %d CUs" % (mask,
+                cu_count))
+        to_return[cu % se_count] += 1
+    return to_return
+
+def get_packed_partitions(sizes, first_cu=0):
+    """Takes a list of partition sizes, and returns a list of CU mask bitsets,
+    one per partition, where each partition gets the given number of
+    consecutive CUs, following the previous partition. The first partition
+    starts with first_cu."""
+    to_return = []
+    for size in sizes:
+        to_return.append(get_range_mask(first_cu, size))
+        first_cu += size
+    return to_return
+
+def get_striped_partitions(sizes, first_cu=0):
+    """Like get_packed_partitions, but the CUs are assigned to the partitions
+    in turn (e.g. every other CU, for two partitions of the same size). Once a
+    partition has its CUs, the remaining CUs are striped across the rest."""
+    to_return = [0] * len(sizes)
+    remaining = list(sizes)
+    cu = first_cu
+    while sum(remaining) > 0:
+        for i in range(len(sizes)):
+            if remaining[i] == 0:
+                continue
+            to_return[i] |= 1 << cu
+            remaining[i] -= 1
+            cu += 1
+    return to_return
+
+def add_last_cu(mask, other):
+    """Returns the CU mask bitset with the last (highest-numbered) CU in the
+    other mask added to it, so that the two masks share one CU."""
+    if other == 0:
+        raise Exception("The other CU mask is empty")
+    return mask | (1 << (other.bit_length() - 1))
+
+def get_sweep_order(cu_count, stripe_width):
+    """Returns a list of the CU indices, in the order in which test_cu_mask.py
+    enables them when given the stripe width. The CUs are split into groups
+    of stripe_width consecutive CUs, and the first CU of every group is
+    enabled before the second CU of any group, and so on. So a stripe width
+    of 1 enables consecutive CUs (spreading them across SEs), and a stripe
+    width equal to the number of SEs fills one SE at a time."""
+    if (stripe_width < 1) or ((cu_count % stripe_width) != 0):
+        raise Exception("Invalid stripe width for %d CUs: %d" % (cu_count,
+            stripe_width))
+    group_count = cu_count // stripe_width
+    to_return = []
+    for position in range(stripe_width):
+        for group in range(group_count):
+            to_return.append(group * stripe_width + position)
+    return to_return
+
+def get_sweep_masks(cu_count, stripe_width):
+    """Returns a list of the CU mask bitsets used by test_cu_mask.py with the
+    given stripe width. Element i enables i + 1 CUs."""
+    to_return = []
+    mask = 0
+    for cu in get_sweep_order(cu_count, stripe_width):
+        mask |= 1 << cu
+        to_return.append(mask)
+    return to_return
+
+def parse_mask_filename(filename):
+    """Takes the name (or path) of a file written by test_cu_mask.py, and
+    returns a dict containing its "stripe_width", its CU "mask" bitset and
+    the number of CUs it enables ("cu_count"). Returns None if the name
+    isn't in the expected format."""
+    match = _MASK_FILENAME_RE.match(os.path.basename(filename))
+    if match is None:
+        return None
+    mask = from_hex(match.group(2))
+    return {
+        "stripe_width": int(match.group(1)),
+        "mask": mask,
+        "cu_count": get_cu_count(mask),
+    }
+
+def get_mask_filename(mask, stripe_width):
+    """Returns the name of the file test_cu_mask.py writes for the given CU
+    mask bitset and stripe width."""
+    return "cu_mask_sw%d_%s.json" % (stripe_width, to_hex(mask))
@@ -0,0 +1,187 @@
+# This module decides when an experiment has run for long enough. It follows
+# the result files of a run while they're being written (as watch_results.py
+# does), and tracks confidence intervals for the statistics reported in the
+# paper's tables. Once every interval is narrower than the requested
+# precision, the remaining time in the run would no longer change the
+# reported numbers, so the run can be stopped.
+#
+# The tracked statistics, all computed from each file's execute times (by
+# default), are:
+#
+#  - "mean": Uses the normal approximation (the central limit theorem), with
+#    a half-width of z * std / sqrt(n).
+#  - "std": Uses the normal approximation of the standard deviation's
+#    standard error, std / sqrt(2 * (n - 1)).
+#  - "median" and "p99": Use distribution-free intervals between two order
+#    statistics (see stats.get_percentile_confidence_indices), which are valid
+#    for the skewed, heavy-tailed distributions seen in the experiments. The
+#    order statistics are only estimated (see online_stats.LogHistogram), so
+#    each bound is widened by the estimates' relative accuracy. Otherwise,
+#    both bounds could be estimated as the same value, making the interval
+#    look precise long before it is. For the same reason, the precision must
+#    be larger than the relative accuracy.
+#
+# The min and max can't be bounded this way, since a longer run can always
+# produce a new extreme, so they aren't used to decide when to stop.
+import math
+import threading
+
+from common import online_stats
+from common import result_loader
+from common import stats
+from common import watch_results
+
+# The names of the statistics that must be precise before a run is stopped.
+TRACKED_STATISTICS = ["mean", "std", "median", "p99"]
+
+def get_confidence_intervals(accumulator, confidence):
+    """Takes an OnlineStats and returns a dict mapping each name in
+    TRACKED_STATISTICS to a list of three values: the statistic's estimate,
+    and the lower and upper bounds of its confidence interval. The bounds
+    are None if there aren't enough samples to compute them."""
+    n = accumulator.count
+    z = stats.get_z_score(confidence)
+    to_return = {}
+    std = accumulator.get_std()
+    if n < 2:
+        to_return["mean"] = [accumulator.mean, None, None]
+        to_return["std"] = [std, None, None]
+    else:
+        error = z * std / math.sqrt(n)
+        to_return["mean"] = [accumulator.mean, accumulator.mean - error,
+            accumulator.mean + error]
+        error = z * std / math.sqrt(2.0 * (n - 1))
+        to_return["std"] = [std, max(std - error, 0.0), std + error]
+    for name, percentile in [["median", 50], ["p99", 99]]:
+        if n == 0:
+            to_return[name] = [None, None, None]
+            continue
+        estimate = accumulator.get_percentiles([percentile])[0]
+        indices = stats.get_percentile_confidence_indices(n, percentile,
+            confidence)
+        if indices is None:
+            to_return[name] = [estimate, None, None]
+            continue
+        lower, upper = accumulator.get_sorted_values(indices)
+        accuracy = accumulator.histogram.relative_accuracy
+        to_return[name] = [estimate, lower - abs(lower) * accuracy,
+            upper + abs(upper) * accuracy]
+    return to_return
+
+def get_relative_error(interval):
+    """Takes an [estimate, lower, upper] list, as returned by
+    get_confidence_intervals, and returns the largest distance from the
+    estimate to either bound, relative to the estimate. Returns infinity if
+    the bounds are unknown."""
+    estimate, lower, upper = interval
+    if (lower is None) or (upper is None):
+        return math.inf
+    error = max(upper - estimate, estimate - lower)
+    if error == 0.0:
+        return 0.0
+    if estimate == 0.0:
+        return math.inf
+    return error / abs(estimate)
+
+def is_precise(intervals, precision):
+    """Returns True if every interval returned by get_confidence_intervals is
+    within the given relative precision (e.g. 0.01 for 1%) of its
+    estimate."""
+    for name in TRACKED_STATISTICS:
+        if get_relative_error(intervals[name]) > precision:
+            return False
+    return True
+
+class EarlyStopper:
+    """Follows the result files written by a single run, in background
+    threads, and reports when the statistics in every file are precise
+    enough. The files don't need to exist yet, but any existing file with the
+    same name must be removed before the run starts, or its old contents
+    will be counted."""
+
+    def __init__(self, filenames, precision, confidence=0.95,
+        min_samples=1000, times_key="execute_times", timeout=60.0):
+        """Starts following the files. The precision is the maximum relative
+        error allowed in every tracked statistic, at the given confidence
+        level, and must be larger than
+        online_stats.DEFAULT_RELATIVE_ACCURACY. At least min_samples samples
+        are always required from each file. Each file stops being followed if
+        it hasn't changed for timeout seconds."""
+        if precision <= online_stats.DEFAULT_RELATIVE_ACCURACY:
+            raise Exception("The precision must be larger than the relative "
+                "accuracy of the percentile estimates (%g)" %
+                (online_stats.DEFAULT_RELATIVE_ACCURACY))
+        self.filenames = filenames
+        self.precision = precision
+        self.confidence = confidence
+        self.min_samples = min_samples
+        self.lock = threading.Lock()
+        self.accumulators = []
+        # Contains the message of any error (other than the file being cut
+        # short) that stopped a file from being followed, or None.
+        self.errors = [None] * len(filenames)
+        for i in range(len(filenames)):
+            self.accumulators.append(online_stats.OnlineStats())
+        for i in range(len(filenames)):
+            t = threading.Thread(target=self._follow_file,
+                args=(i, times_key, timeout), daemon=True)
+            t.start()
+
+    def _follow_file(self, index, times_key, timeout):
+        """Runs watch_results.follow_file on the file with the given index.
+        Errors caused by the file being cut short when its run is stopped are
+        ignored, but any other error is saved in self.errors. Intended to be
+        run in its own thread."""
+        try:
+            watch_results.follow_file(self.filenames[index], times_key,
+                self.accumulators[index], self.lock, timeout)
+        except result_loader.TruncatedFileError:
+            pass
+        except Exception as e:
+            with self.lock:
+                self.errors[index] = "%s: %s" % (type(e).__name__, str(e))
+
+    def get_errors(self):
+        """Returns a list of the messages of any errors that stopped the files
+        from being followed, each prefixed with the file's name."""
+        to_return = []
+        with self.lock:
+            for name, error in zip(self.filenames, self.errors):
+                if error is not None:
+                    to_return.append("%s: %s" % (name, error))
+        return to_return
+
+    def is_done(self):
+        """Returns True if every file has at least min_samples samples, and
+        every tracked statistic is within the requested precision. Always
+        returns False if an error stopped any file from being followed."""
+        with self.lock:
+            for error in self.errors:
+                if error is not None:
+                    return False
+            for a in self.accumulators:
+                if a.count < self.min_samples:
+                    return False
+                intervals = get_confidence_intervals(a, self.confidence)
+                if not is_precise(intervals, self.precision):
+                    return False
+        return True
+
+    def get_summary(self):
+        """Returns a list containing a dict for each file, with its
+        "filename", the number of "samples", the "intervals" returned by
+        get_confidence_intervals (converted to plain floats, so it can be
+        written to the journal), and the "error" that stopped the file from
+        being followed, or None."""
+        to_return = []
+        with self.lock:
+            for i in range(len(self.filenames)):
+                a = self.accumulators[i]
+                intervals = get_confidence_intervals(a, self.confidence)
+                for k in intervals:
+                    intervals[k] = [None if v is None else float(v)
+                        for v in intervals[k]]
+                to_return.append({"filename": self.filenames[i],
+                    "samples": a.count, "intervals": intervals,
+                    "error": self.errors[i]})
+        return to_return
@@ -0,0 +1,280 @@
+# This module expands a declarative description of an experiment (a "matrix")
+# into both the hip_plugin_framework configs that need to be run, and a
+# manifest describing each resulting file for the scripts that analyze them,
+# so both always come from the same place.
+#
+# A matrix is a dict containing:
+#
+#  - "base_config": The top-level config shared by every experiment. Its
+#    "name" and "plugins" are replaced in each experiment.
+#  - "workloads": A list of [name, short name, plugin config] lists. The short
+#    name is used in file names.
+#  - "isolated": A list of workload names to run on their own.
+#  - "competitors": A dict mapping workload names to a list of competitor
+#    workload names to run each of them against, in order.
+#  - "partitionings": A list of the keys in PARTITIONINGS to use for each
+#    workload/competitor pair.
+#  - "gpu_cu_count" and "cu_counts": The number of CUs on the GPU, and a list
+#    of the number of CUs to use in each experiment. If fewer than all of the
+#    GPU's CUs are used, the first ones are used.
+#  - "results_directory": The directory the runner should write files to.
+#  - "competitor_label": The label given to competitors, or None to keep the
+#    label in the workload's plugin config.
+#  - "file_name", "scenario_name", "label" and "category": Each is a list of
+#    two format strings, used for isolated and shared experiments
+#    respectively. They may use the fields returned by get_name_fields.
+#
+# The experiments are numbered in order: for each CU count, the isolated
+# experiments, followed by each workload's competitors and partitionings.
+# Any experiment can be generated directly from its index, so large sweeps
+# can be expanded lazily and split into shards.
+import copy
+import json
+
+from common import cu_mask
+
+def _get_uneven_masks(masks):
+    """Takes a workload's and its competitor's CU masks, and returns them with
+    the competitor's last CU added to the workload's mask."""
+    return [cu_mask.add_last_cu(masks[0], masks[1]), masks[1]]
+
+# The ways a GPU can be shared between a workload and its competitor. Each
+# "masks" function takes the number of CUs to use, and returns the CU mask
+# bitsets (or None, for no mask) of the workload and competitor, covering
+# those CUs.
+PARTITIONINGS = {
+    "isolated": {
+        "label": "Isolated",
+        "file_suffix": "isolated",
+        "masks": lambda n: [None, None],
+    },
+    "full": {
+        "label": "Full GPU Sharing",
+        "file_suffix": "full_shared",
+        "masks": lambda n: [None, None],
+    },
+    # Striped masks, with every other CU given to each workload.
+    "even": {
+        "label": "Evenly Partitioned",
+        "file_suffix": "evenly_partitioned",
+        "masks": lambda n: cu_mask.get_striped_partitions([n // 2, n // 2]),
+    },
+    # The same, except that the workload also gets the competitor's last CU.
+    "uneven": {
+        "label": "Partitioned, w/ Additional Shared CU",
+        "file_suffix": "unevenly_partitioned",
+        "masks": lambda n: _get_uneven_masks(cu_mask.get_striped_partitions(
+            [n // 2, n // 2])),
+    },
+    # Unstriped masks, giving the first half of the CUs to the workload.
+    "packed_even": {
+        "label": "Unstriped Even Partitions",
+        "file_suffix": "unstriped_even",
+        "masks": lambda n: cu_mask.get_packed_partitions([n // 2, n // 2]),
+    },
+    "packed_uneven": {
+        "label": "Unstriped Uneven Partitions",
+        "file_suffix": "unstriped_uneven",
+        "masks": lambda n: _get_uneven_masks(cu_mask.get_packed_partitions(
+            [n // 2, n // 2])),
+    },
+}
+
+def get_partition_masks(partitioning, cu_count, gpu_cu_count):
+    """Returns a list of the CU masks, as strings for the configs'
+    "compute_unit_mask", to give a workload and its competitor under the
+    given partitioning, using the first cu_count of the GPU's CUs. Either mask
+    is None if the plugin may use the entire GPU."""
+    if (cu_count < 1) or (cu_count > gpu_cu_count):
+        raise Exception("Invalid CU count: %d" % (cu_count))
+    if (partitioning not in ("isolated", "full")) and ((cu_count % 2) != 0):
+        raise Exception("Partitioning %s needs an even number of CUs" %
+            (partitioning))
+    masks = PARTITIONINGS[partitioning]["masks"](cu_count)
+    to_return = []
+    for m in masks:
+        if (m is None) and (cu_count < gpu_cu_count):
+            m = cu_mask.get_range_mask(0, cu_count)
+        if m is not None:
+            m = cu_mask.to_string(m, gpu_cu_count)
+        to_return.append(m)
+    return to_return
+
+def _get_workload(matrix, name):
+    """Returns the [name, short name, plugin config] list for the workload
+    with the given name."""
+    for w in matrix["workloads"]:
+        if w[0] == name:
+            return w
+    raise Exception("Unknown workload: %s" % (name))
+
+def _get_block_size(matrix):
+    """Returns the number of experiments using each CU count."""
+    to_return = len(matrix["isolated"])
+    for w in matrix["competitors"]:
+        to_return += len(matrix["competitors"][w]) * \
+            len(matrix["partitionings"])
+    return to_return
+
+def get_experiment_count(matrix):
+    """Returns the total number of experiments in the matrix."""
+    return _get_block_size(matrix) * len(matrix["cu_counts"])
+
+def get_name_fields(matrix, workload, competitor, partitioning, cu_count):
+    """Returns the dict of fields that can be used in the matrix's format
+    strings: the "workload" and "competitor" names and their "short_name" and
+    "competitor_short_name", the "partitioning" key and its
+    "partitioning_label" and "file_suffix", the "cu_count", and "cu_suffix",
+    which is empty if every CU is used and "_<count>cu" otherwise."""
+    p = PARTITIONINGS[partitioning]
+    to_return = {
+        "workload": workload,
+        "short_name": _get_workload(matrix, workload)[1],
+        "competitor": "",
+        "competitor_short_name": "",
+        "partitioning": partitioning,
+        "partitioning_label": p["label"],
+        "file_suffix": p["file_suffix"],
+        "cu_count": cu_count,
+        "cu_suffix": "",
+    }
+    if competitor is not None:
+        to_return["competitor"] = competitor
+        to_return["competitor_short_name"] = _get_workload(matrix,
+            competitor)[1]
+    if cu_count != matrix["gpu_cu_count"]:
+        to_return["cu_suffix"] = "_%dcu" % (cu_count)
+    return to_return
+
+def get_experiment(matrix, index):
+    """Returns a dict describing the experiment with the given index: its
+    "index", "workload", "competitor" (None if isolated), "partitioning",
+    "cu_count", the "file" name of its results, the "log_name" the runner
+    writes them to, the "scenario_name", the plugin's "label", and the
+    "category" it's reported under."""
+    block_size = _get_block_size(matrix)
+    if (index < 0) or (index >= get_experiment_count(matrix)):
+        raise Exception("Experiment %d is out of range" % (index))
+    cu_count = matrix["cu_counts"][index // block_size]
+    i = index % block_size
+    competitor = None
+    if i < len(matrix["isolated"]):
+        workload = matrix["isolated"][i]
+        partitioning = "isolated"
+    else:
+        i -= len(matrix["isolated"])
+        partitioning_count = len(matrix["partitionings"])
+        for workload in matrix["competitors"]:
+            competitors = matrix["competitors"][workload]
+            if i < len(competitors) * partitioning_count:
+                competitor = competitors[i // partitioning_count]
+                partitioning = matrix["partitionings"][i % partitioning_count]
+                break
+            i -= len(competitors) * partitioning_count
+    fields = get_name_fields(matrix, workload, competitor, partitioning,
+        cu_count)
+    # The first format string is for isolated experiments.
+    shared = int(competitor is not None)
+    file_name = matrix["file_name"][shared].format(**fields)
+    return {
+        "index": index,
+        "workload": workload,
+        "competitor": competitor,
+        "partitioning": partitioning,
+        "cu_count": cu_count,
+        "file": file_name,
+        "log_name": matrix["results_directory"] + "/" + file_name,
+        "scenario_name": matrix["scenario_name"][shared].format(**fields),
+        "label": matrix["label"][shared].format(**fields),
+        "category": matrix["category"][shared].format(**fields),
+    }
+
+def _set_mask(plugin, mask):
+    """Sets the plugin config's CU mask, or removes it if mask is None. An
+    existing mask keeps its position in the config."""
+    if mask is None:
+        plugin.pop("compute_unit_mask", None)
+    else:
+        plugin["compute_unit_mask"] = mask
+
+def get_config(matrix, experiment):
+    """Takes an experiment returned by get_experiment, and returns its
+    config, as a JSON string."""
+    masks = get_partition_masks(experiment["partitioning"],
+        experiment["cu_count"], matrix["gpu_cu_count"])
+    plugin = copy.deepcopy(_get_workload(matrix, experiment["workload"])[2])
+    plugin["label"] = experiment["label"]
+    plugin["log_name"] = experiment["log_name"]
+    _set_mask(plugin, masks[0])
+    plugins = [plugin]
+    if experiment["competitor"] is not None:
+        competitor = copy.deepcopy(_get_workload(matrix,
+            experiment["competitor"])[2])
+        if matrix["competitor_label"] is not None:
+            competitor["label"] = matrix["competitor_label"]
+        competitor["log_name"] = "/dev/null"
+        _set_mask(competitor, masks[1])
+        plugins.append(competitor)
+    config = copy.deepcopy(matrix["base_config"])
+    config["name"] = experiment["scenario_name"]
+    config["plugins"] = plugins
+    return json.dumps(config)
+
+def iterate_experiments(matrix, shard_index=0, shard_count=1):
+    """Yields each experiment in the matrix, as returned by get_experiment.
+    If shard_count is greater than 1, only every shard_count-th experiment
+    is yielded, starting with experiment shard_index, so that the matrix can
+    be split between shard_count workers."""
+    if (shard_index < 0) or (shard_index >= shard_count):
+        raise Exception("Invalid shard %d of %d" % (shard_index, shard_count))
+    for i in range(shard_index, get_experiment_count(matrix), shard_count):
+        yield get_experiment(matrix, i)
+
+def generate_configs(matrix, shard_index=0, shard_count=1):
+    """Returns a list of the JSON configs of the experiments yielded by
+    iterate_experiments."""
+    to_return = []
+    for e in iterate_experiments(matrix, shard_index, shard_count):
+        to_return.append(get_config(matrix, e))
+    return to_return
+
+def get_manifest(matrix):
+    """Returns a list of every experiment in the matrix, as returned by
+    get_experiment."""
+    return list(iterate_experiments(matrix))
+
+def get_file_masks(matrix):
+    """Returns a dict mapping the file name of each experiment in the matrix
+    to the CU mask bitset the workload (the only plugin whose results are
+    written) was limited to, or None if it could use the entire GPU."""
+    to_return = {}
+    for e in iterate_experiments(matrix):
+        mask = get_partition_masks(e["partitioning"], e["cu_count"],
+            matrix["gpu_cu_count"])[0]
+        if mask is not None:
+            mask = cu_mask.from_string(mask)
+        to_return[e["file"]] = mask
+    return to_return
+
+def find_experiment(manifest, workload, competitor, partitioning,
+    cu_count=None):
+    """Returns the index, in the manifest, of the experiment with the given
+    parameters. The CU count may be None if the manifest only uses one."""
+    for i in range(len(manifest)):
+        e = manifest[i]
+        if (e["workload"] == workload) and (e["competitor"] == competitor) \
+            and (e["partitioning"] == partitioning) and \
+            ((cu_count is None) or (e["cu_count"] == cu_count)):
+            return i
+    raise Exception("No experiment runs %s vs. %s, partitioned %s" % (
+        workload, competitor, partitioning))
+
+def add_arguments(parser):
+    """Adds the --shard_index and --shard_count arguments to an
+    argparse.ArgumentParser."""
+    parser.add_argument("--shard_count", type=int, default=1,
+        help="Split the experiments into this many shards, and only run "+
+            "one of them. This can be used to split experiments between "+
+            "machines that don't share a filesystem.")
+    parser.add_argument("--shard_index", type=int, default=0,
+        help="The shard to run, from 0 to --shard_count - 1.")
@@ -0,0 +1,431 @@
+# This module runs a list of hip_plugin_framework configs (e.g. as returned by
+# generate_configs() in the experiment scripts) using a pool of worker slots.
+# Each slot runs one config at a time, so configs assigned to different slots
+# run concurrently. A slot is usually a GPU on the local machine, but slots can
+# also run configs on other hosts using a different launcher.
+#
+# Every finished config is recorded in a journal file (one JSON object per
+# line), and configs already recorded as finished are skipped, so an
+# interrupted campaign can be resumed by simply re-running the same command.
+# Runs that take too long, or that stop writing results (e.g. because the GPU
+# hung), are killed and retried.
+#
+# Optionally, runs can also be stopped early, once the statistics reported in
+# the paper's tables have converged to within a requested precision (see
+# early_stopping.py). The runner is terminated at that point, and its
+# partially-written result files are closed so that they can be used as
+# usual. The config's max_time still limits runs that never converge.
+import argparse
+import hashlib
+import json
+import os
+import queue
+import shlex
+import subprocess
+import threading
+import time
+
+from common import early_stopping
+from common import online_stats
+from common import result_writer
+
+class LocalLauncher:
+    """Starts the runner as a process on this machine."""
+    # Result files are written to the local filesystem, so they can be used to
+    # detect hung runs.
+    can_monitor_logs = True
+
+    def __init__(self, runner):
+        self.runner = runner
+
+    def start(self, slot, config_text):
+        """Starts running the given config on the given slot, returning the
+        subprocess.Popen object."""
+        process = subprocess.Popen([self.runner, "-"], stdin=subprocess.PIPE)
+        process.stdin.write(config_text.encode("utf-8"))
+        process.stdin.close()
+        return process
+
+class SSHLauncher:
+    """Starts the runner on the host named in each slot's "host" field using
+    ssh. The runner is run from the given directory on the remote host, and
+    results are left on the remote host."""
+    can_monitor_logs = False
+
+    def __init__(self, runner, directory):
+        self.runner = runner
+        self.directory = directory
+
+    def start(self, slot, config_text):
+        command = "cd %s && %s -" % (shlex.quote(self.directory),
+            shlex.quote(self.runner))
+        process = subprocess.Popen(["ssh", slot["host"], command],
+            stdin=subprocess.PIPE)
+        process.stdin.write(config_text.encode("utf-8"))
+        process.stdin.close()
+        return process
+
+def get_config_key(config_text):
+    """Returns the key identifying a config in the journal. This is a hash of
+    the config's contents, so changing a config causes it to be re-run."""
+    return hashlib.sha1(config_text.encode("utf-8")).hexdigest()
+
+def read_journal(journal_path):
+    """Returns the set of keys of configs that finished successfully,
+    according to the journal. Returns an empty set if the journal doesn't
+    exist yet."""
+    to_return = set()
+    if not os.path.exists(journal_path):
+        return to_return
+    with open(journal_path) as f:
+        for line in f:
+            line = line.strip()
+            if line == "":
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # Ignore a partial line left by an interrupted write.
+                continue
+            if entry.get("status") == "done":
+                to_return.add(entry["key"])
+    return to_return
+
+def get_log_names(config):
+    """Returns a list of the result files that the config's plugins write,
+    excluding /dev/null."""
+    to_return = []
+    for plugin in config["plugins"]:
+        log_name = plugin.get("log_name", "/dev/null")
+        if log_name != "/dev/null":
+            to_return.append(log_name)
+    return to_return
+
+def get_total_log_size(log_names):
+    """Returns the total size of all of the given files that exist."""
+    total = 0
+    for name in log_names:
+        try:
+            total += os.path.getsize(name)
+        except OSError:
+            pass
+    return total
+
+def get_default_timeout(config):
+    """Returns the default number of seconds to allow a config to run: twice
+    its max_time, plus a minute for initialization and warmup. Returns None
+    (no limit) for configs without a max_time."""
+    max_time = config.get("max_time", 0.0)
+    if max_time <= 0:
+        return None
+    return max_time * 2.0 + 60.0
+
+class Scheduler:
+    """Runs configs on a list of slots. Each slot is a dict which may contain
+    a "gpu_device_id" (which replaces the device ID in every config run on the
+    slot) and a "host" (used by SSHLauncher), along with a "name" used in
+    messages and the journal."""
+
+    def __init__(self, slots, launcher, journal_path, timeout=None,
+        hang_timeout=60.0, retries=1, cooldown=2.0, poll_interval=0.5,
+        precision=None, confidence=0.95, min_samples=1000):
+        """The timeout is the number of seconds after which a run is killed,
+        or None to use get_default_timeout. A run is considered hung, and
+        killed, if none of its result files have changed for hang_timeout
+        seconds (if the launcher allows checking them; 0 disables this).
+        Failed runs are retried up to retries times. After each run, a slot
+        waits cooldown seconds before starting its next run. If precision is
+        given, runs are stopped once their results are precise enough; see
+        early_stopping.EarlyStopper for the meaning of the precision,
+        confidence and min_samples. This requires a launcher that allows
+        checking the result files."""
+        self.slots = slots
+        self.launcher = launcher
+        self.journal_path = journal_path
+        self.timeout = timeout
+        self.hang_timeout = hang_timeout
+        self.retries = retries
+        self.cooldown = cooldown
+        self.poll_interval = poll_interval
+        self.precision = precision
+        self.confidence = confidence
+        self.min_samples = min_samples
+        self.lock = threading.Lock()
+        self.results = {}
+
+    def _log(self, message):
+        with self.lock:
+            print(message, flush=True)
+
+    def _record(self, entry):
+        """Appends an entry to the journal."""
+        with self.lock:
+            directory = os.path.dirname(self.journal_path)
+            if (directory != "") and not os.path.exists(directory):
+                os.makedirs(directory)
+            with open(self.journal_path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _uses_early_stopping(self, config):
+        """Returns True if runs of the config may be stopped early."""
+        return (self.precision is not None) and \
+            self.launcher.can_monitor_logs and \
+            (len(get_log_names(config)) > 0)
+
+    def _stop(self, process, log_names):
+        """Stops a run whose results are precise enough, and closes its
+        result files."""
+        process.terminate()
+        try:
+            process.wait(10.0)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+        for name in log_names:
+            if os.path.exists(name):
+                result_writer.close_truncated_file(name)
+
+    def _wait(self, process, config, timeout, stopper):
+        """Waits for the process to exit, killing it if it times out or
+        hangs, or stopping it if the EarlyStopper (which may be None) says
+        its results are precise enough. Returns the run's status: "done",
+        "stopped" (i.e. done early), "failed", "timeout" or "hung"."""
+        log_names = get_log_names(config)
+        check_hangs = self.launcher.can_monitor_logs and \
+            (self.hang_timeout > 0) and (len(log_names) > 0)
+        start_time = time.time()
+        last_progress_time = start_time
+        last_size = get_total_log_size(log_names)
+        while process.poll() is None:
+            time.sleep(self.poll_interval)
+            now = time.time()
+            status = None
+            if (timeout is not None) and ((now - start_time) > timeout):
+                status = "timeout"
+            elif (stopper is not None) and stopper.is_done():
+                self._stop(process, log_names)
+                return "stopped"
+            elif check_hangs:
+                size = get_total_log_size(log_names)
+                if size != last_size:
+                    last_size = size
+                    last_progress_time = now
+                elif (now - last_progress_time) > self.hang_timeout:
+                    status = "hung"
+            if status is not None:
+                process.kill()
+                process.wait()
+                return status
+        if process.returncode != 0:
+            return "failed"
+        return "done"
+
+    def _start_and_wait(self, slot, config, timeout, stopper):
+        """Starts a run of the config on the slot and waits for it, as
+        described in _wait. Returns the run's status. If anything goes wrong
+        while waiting, the process is killed before the exception is
+        raised."""
+        process = self.launcher.start(slot, json.dumps(config))
+        try:
+            return self._wait(process, config, timeout, stopper)
+        except Exception:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            raise
+
+    def _run_one(self, slot, index, count, config_text):
+        """Runs a single config on the slot, retrying it if necessary.
+        Returns the final status."""
+        config = json.loads(config_text)
+        if "gpu_device_id" in slot:
+            config["gpu_device_id"] = slot["gpu_device_id"]
+        timeout = self.timeout
+        if timeout is None:
+            timeout = get_default_timeout(config)
+        attempt = 0
+        while True:
+            attempt += 1
+            self._log("Running experiment %d of %d on %s (attempt %d)" %
+                (index + 1, count, slot["name"], attempt))
+            stopper = None
+            if self._uses_early_stopping(config):
+                # The runner replaces the result files anyway, but old ones
+                # must be removed first, so that they aren't mistaken for
+                # this run's results.
+                for name in get_log_names(config):
+                    if os.path.exists(name):
+                        os.remove(name)
+                stopper = early_stopping.EarlyStopper(get_log_names(config),
+                    self.precision, self.confidence, self.min_samples)
+            start_time = time.time()
+            error = None
+            try:
+                status = self._start_and_wait(slot, config, timeout, stopper)
+            except Exception as e:
+                status = "failed"
+                error = "%s: %s" % (type(e).__name__, str(e))
+            stopped_early = status == "stopped"
+            if stopped_early:
+                status = "done"
+            entry = {
+                "key": get_config_key(config_text),
+                "index": index,
+                "name": config.get("name", ""),
+                "log_names": get_log_names(config),
+                "slot": slot["name"],
+                "attempt": attempt,
+                "status": status,
+                "elapsed": time.time() - start_time,
+            }
+            if error is not None:
+                entry["error"] = error
+                self._log("Experiment %d of %d on %s: error: %s" % (
+                    index + 1, count, slot["name"], error))
+            if stopper is not None:
+                entry["stopped_early"] = stopped_early
+                entry["precision"] = stopper.get_summary()
+                for error in stopper.get_errors():
+                    self._log("Experiment %d of %d on %s: unable to follow "
+                        "%s" % (index + 1, count, slot["name"], error))
+            self._record(entry)
+            if stopped_early:
+                self._log("Experiment %d of %d on %s: done early, after "
+                    "%.1f seconds" % (index + 1, count, slot["name"],
+                    entry["elapsed"]))
+            else:
+                self._log("Experiment %d of %d on %s: %s" % (index + 1,
+                    count, slot["name"], status))
+            if (status == "done") or (attempt > self.retries):
+                return status
+            time.sleep(self.cooldown)
+
+    def _slot_worker(self, slot, work, count):
+        """Runs configs from the work queue on the slot until it's empty."""
+        while True:
+            try:
+                index, config_text = work.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                status = self._run_one(slot, index, count, config_text)
+            except Exception as e:
+                # Record the failure, rather than losing this slot's thread
+                # (and the rest of the work queue along with it).
+                self._log("Experiment %d of %d on %s: error: %s" % (
+                    index + 1, count, slot["name"], str(e)))
+                status = "failed"
+            with self.lock:
+                self.results[index] = status
+            time.sleep(self.cooldown)
+
+    def run(self, configs):
+        """Runs every config (a list of JSON strings) that hasn't already
+        finished according to the journal. Returns a dict mapping the index of
+        each config to its status: "done", "skipped" (already finished in an
+        earlier run), or the reason its last attempt failed. A run that can't
+        be started counts as "failed"."""
+        finished = read_journal(self.journal_path)
+        work = queue.Queue()
+        self.results = {}
+        for i in range(len(configs)):
+            if get_config_key(configs[i]) in finished:
+                self._log("Skipping experiment %d of %d: already done" %
+                    (i + 1, len(configs)))
+                self.results[i] = "skipped"
+                continue
+            work.put((i, configs[i]))
+        threads = []
+        for slot in self.slots:
+            t = threading.Thread(target=self._slot_worker,
+                args=(slot, work, len(configs)))
+            t.start()
+            threads.append(t)
+        for t in threads:
+            t.join()
+        return self.results
+
+def _parse_precision(text):
+    """Parses the value of the --precision argument, which must be larger
+    than the relative accuracy of the percentile estimates used to decide
+    when to stop (see early_stopping.py)."""
+    value = float(text)
+    if value <= online_stats.DEFAULT_RELATIVE_ACCURACY:
+        raise argparse.ArgumentTypeError("must be larger than %g" %
+            (online_stats.DEFAULT_RELATIVE_ACCURACY))
+    return value
+
+def add_arguments(parser, default_journal):
+    """Adds the command-line arguments used by run_from_args to an
+    argparse.ArgumentParser. Each experiment script should use a different
+    default journal file."""
+    parser.add_argument("--runner", default="./bin/runner",
+        help="The path to hip_plugin_framework's runner program.")
+    parser.add_argument("--gpus", default="0",
+        help="A comma-separated list of GPU device IDs to run experiments "+
+            "on. One experiment runs on each GPU at a time.")
+    parser.add_argument("--hosts", default=None,
+        help="A comma-separated list of host:gpu_device_id pairs to run "+
+            "experiments on using ssh, instead of using local GPUs.")
+    parser.add_argument("--remote_directory", default=".",
+        help="The hip_plugin_framework directory on remote hosts.")
+    parser.add_argument("--journal", default=default_journal,
+        help="The file recording which experiments have finished. Finished "+
+            "experiments are skipped; delete this file to re-run them.")
+    parser.add_argument("--timeout", type=float, default=None,
+        help="Kill runs that take longer than this many seconds. Defaults "+
+            "to twice the config's max_time plus one minute.")
+    parser.add_argument("--hang_timeout", type=float, default=60.0,
+        help="Kill runs whose result files haven't changed for this many "+
+            "seconds. 0 disables this check.")
+    parser.add_argument("--retries", type=int, default=1,
+        help="The number of times to retry a failed or hung run.")
+    parser.add_argument("--cooldown", type=float, default=2.0,
+        help="The number of seconds to wait between runs on the same GPU.")
+    parser.add_argument("--precision", type=_parse_precision, default=None,
+        help="If set, stop each run once the mean, std. dev., median and "+
+            "99th percentile of every result file's execute times are known "+
+            "to within this relative error (e.g. 0.01 for 1%%). Must be "+
+            ("larger than %g, " % (online_stats.DEFAULT_RELATIVE_ACCURACY))+
+            "the relative accuracy of the percentile estimates. Only "+
+            "supported for local GPUs.")
+    parser.add_argument("--confidence", type=float, default=0.95,
+        help="The confidence level used with --precision.")
+    parser.add_argument("--min_samples", type=int, default=1000,
+        help="The minimum number of samples from each result file before a "+
+            "run can be stopped early.")
+
+def run_from_args(configs, args):
+    """Runs the configs using the options parsed from the arguments added by
+    add_arguments. Returns the result of Scheduler.run if every config
+    finished, otherwise exits with an error."""
+    slots = []
+    if args.hosts is not None:
+        launcher = SSHLauncher(args.runner, args.remote_directory)
+        for h in args.hosts.split(","):
+            host, device = h.rsplit(":", 1)
+            slots.append({"name": h, "host": host,
+                "gpu_device_id": int(device)})
+    else:
+        launcher = LocalLauncher(args.runner)
+        for device in args.gpus.split(","):
+            slots.append({"name": "GPU " + device,
+                "gpu_device_id": int(device)})
+    if (args.precision is not None) and not launcher.can_monitor_logs:
+        print("Warning: --precision is ignored when using --hosts.")
+    scheduler = Scheduler(slots, launcher, args.journal, args.timeout,
+        args.hang_timeout, args.retries, args.cooldown,
+        precision=args.precision, confidence=args.confidence,
+        min_samples=args.min_samples)
+    results = scheduler.run(configs)
+    # A config missing from the results never ran at all.
+    unfinished = 0
+    for i in range(len(configs)):
+        if results.get(i) not in ("done", "skipped"):
+            unfinished += 1
+    print("%d of %d experiments didn't finish." % (unfinished, len(configs)))
+    if unfinished > 0:
+        exit(1)
+    return results
@@ -0,0 +1,70 @@
+# This module extracts [start, end] intervals, such as "execute_times" or
+# "copy_in_times", from a result_trace.Trace, and summarizes their durations.
+# Each record's list of times for a key may contain any number of start/end
+# pairs; all of them are included. Lists that don't consist of start/end pairs
+# raise an exception (except for the keys in result_trace.FIRST_LAST_KEYS).
+#
+# It also converts sets of intervals, such as block start and end times, into
+# sorted start and end events, which are used to compute how many intervals
+# (or threads) are running over time.
+import numpy
+
+from common import stats
+
+def get_intervals(trace, times_key):
+    """Takes a result_trace.Trace and a key, and returns an (n, 2) numpy array
+    containing every [start, end] pair of times in the records containing the
+    key, in the order they appear in the file. Raises an exception if a
+    record's list for the key doesn't consist of start/end pairs. The returned
+    array shares memory with the trace, so it must not be modified."""
+    return trace.get_intervals(times_key)
+
+def get_durations(trace, times_key):
+    """Returns a numpy array containing the duration of every interval for the
+    given key, in seconds. See get_intervals."""
+    intervals = get_intervals(trace, times_key)
+    return intervals[:, 1] - intervals[:, 0]
+
+def summarize_durations(durations):
+    """Takes a numpy array of durations and returns a dict containing their
+    "count", "min", "max", "mean", "median" and "std", as computed by
+    stats.compute_stats. The durations array isn't modified."""
+    minimum, maximum, median, mean, std = stats.compute_stats(durations)
+    return {
+        "count": len(durations),
+        "min": minimum,
+        "max": maximum,
+        "mean": mean,
+        "median": median,
+        "std": std,
+    }
+
+def sort_events(all_events):
+    """Takes a list of event lists, as returned by get_interval_events, and
+    returns a single event list containing every event. Events are sorted by
+    time, and at equal times, starts always come before ends."""
+    if len(all_events) == 0:
+        return [numpy.zeros(0), numpy.zeros(0, dtype=numpy.int64),
+            numpy.zeros(0, dtype=numpy.int64)]
+    arrays = []
+    for i in range(3):
+        arrays.append(numpy.concatenate([e[i] for e in all_events]))
+    # lexsort is stable and sorts by the last key first, so this orders events
+    # by time, placing starts (positive count changes) before ends at equal
+    # times.
+    order = numpy.lexsort((arrays[2] < 0, arrays[0]))
+    return [a[order] for a in arrays]
+
+def get_interval_events(starts, ends, weights):
+    """Takes numpy arrays of the start and end times of a set of intervals,
+    and the amount each interval adds while it's running (e.g. a block's
+    thread count). Returns a list of three numpy arrays: the time of every
+    start and end event, the change in the total weight at each event, and
+    the change in the number of running intervals at each event (1 or -1).
+    Events are sorted as described in sort_events."""
+    times = numpy.concatenate((starts, ends))
+    weight_deltas = numpy.concatenate((weights, -weights))
+    count = len(starts)
+    count_deltas = numpy.ones(2 * count, dtype=numpy.int64)
+    count_deltas[count:] = -1
+    return sort_events([[times, weight_deltas, count_deltas]])
@@ -0,0 +1,196 @@
+# This module contains accumulators for computing statistics incrementally,
+# e.g. while an experiment is still running, without keeping every sample in
+# memory. Accumulators for separate files (or separate threads) can be merged
+# together, giving the same result as if every sample had been added to a
+# single accumulator.
+import math
+import numpy
+
+from common import stats
+
+# The default relative accuracy of the percentile estimates.
+DEFAULT_RELATIVE_ACCURACY = 0.001
+
+class LogHistogram:
+    """A mergeable quantile sketch. Positive samples are counted in buckets
+    whose boundaries grow geometrically, so any quantile can be estimated to
+    within the given relative accuracy using a fixed amount of memory per
+    order of magnitude spanned by the samples. Samples that are zero or
+    negative are all counted as zero."""
+    __slots__ = ["relative_accuracy", "gamma", "log_gamma", "counts",
+        "offset", "zero_count"]
+
+    def __init__(self, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1.0 + relative_accuracy) / (1.0 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        # counts[i] holds the number of samples in bucket i + offset, where
+        # bucket j contains samples in (gamma^(j - 1), gamma^j].
+        self.counts = numpy.zeros(0, dtype=numpy.int64)
+        self.offset = 0
+        self.zero_count = 0
+
+    def _add_bucket_counts(self, offset, counts):
+        """Adds an array of counts, starting at bucket number offset, to this
+        histogram's counts, growing the histogram if necessary."""
+        if len(counts) == 0:
+            return
+        if len(self.counts) == 0:
+            self.counts = numpy.array(counts, dtype=numpy.int64)
+            self.offset = offset
+            return
+        new_offset = min(self.offset, offset)
+        new_end = max(self.offset + len(self.counts), offset + len(counts))
+        if (new_offset != self.offset) or \
+            (new_end != self.offset + len(self.counts)):
+            new_counts = numpy.zeros(new_end - new_offset, dtype=numpy.int64)
+            start = self.offset - new_offset
+            new_counts[start:start + len(self.counts)] = self.counts
+            self.counts = new_counts
+            self.offset = new_offset
+        start = offset - self.offset
+        self.counts[start:start + len(counts)] += counts
+
+    def add_array(self, values):
+        """Adds every sample in the given 1-D array to the histogram."""
+        values = numpy.asarray(values, dtype=numpy.float64)
+        positive = values[values > 0.0]
+        self.zero_count += len(values) - len(positive)
+        if len(positive) == 0:
+            return
+        buckets = numpy.ceil(numpy.log(positive) / self.log_gamma)
+        buckets = buckets.astype(numpy.int64)
+        offset = buckets.min()
+        self._add_bucket_counts(offset, numpy.bincount(buckets - offset))
+
+    def add(self, value):
+        """Adds a single sample to the histogram."""
+        self.add_array([value])
+
+    def merge(self, other):
+        """Adds all of the samples counted by another LogHistogram, which must
+        have the same relative accuracy, to this one."""
+        if other.gamma != self.gamma:
+            raise Exception("Can't merge histograms with different accuracy")
+        self.zero_count += other.zero_count
+        self._add_bucket_counts(other.offset, other.counts)
+
+    def get_count(self):
+        """Returns the total number of samples in the histogram."""
+        return int(self.counts.sum()) + self.zero_count
+
+    def get_percentiles(self, percentiles):
+        """Returns a list containing an estimate of each of the given
+        percentiles. Percentiles are defined in the same way as in
+        stats.get_percentile_indices, and each estimate is within the
+        histogram's relative accuracy of the exact value."""
+        count = self.get_count()
+        if count == 0:
+            raise Exception("Can't compute percentiles of an empty histogram")
+        return self.get_sorted_values(stats.get_percentile_indices(count,
+            percentiles))
+
+    def get_sorted_values(self, indices):
+        """Returns a list containing an estimate of the element at each of the
+        given indices in a sorted list of every sample, to within the
+        histogram's relative accuracy."""
+        cumulative = numpy.cumsum(self.counts) + self.zero_count
+        to_return = []
+        for index in indices:
+            if index < self.zero_count:
+                to_return.append(0.0)
+                continue
+            bucket = numpy.searchsorted(cumulative, index, side="right")
+            # Return the point in the bucket with the smallest relative error
+            # from either of its boundaries.
+            upper = self.gamma ** (bucket + self.offset)
+            to_return.append(2.0 * upper / (self.gamma + 1.0))
+        return to_return
+
+class OnlineStats:
+    """Tracks the count, min, max, mean and standard deviation of a stream of
+    samples, using Welford's algorithm for individual samples and Chan et
+    al.'s algorithm for arrays of samples and merging. Percentiles are
+    estimated using a LogHistogram."""
+    __slots__ = ["count", "minimum", "maximum", "mean", "m2", "histogram"]
+
+    def __init__(self, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+        self.count = 0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self.mean = 0.0
+        # The sum of squared differences from the mean.
+        self.m2 = 0.0
+        self.histogram = LogHistogram(relative_accuracy)
+
+    def add(self, value):
+        """Adds a single sample."""
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.minimum = min(self.minimum, value)
+        self.maximum = max(self.maximum, value)
+        self.histogram.add(value)
+
+    def _combine(self, count, minimum, maximum, mean, m2):
+        """Combines the summary of another group of samples into this one."""
+        if count == 0:
+            return
+        new_count = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / new_count
+        self.m2 += m2 + delta * delta * self.count * count / new_count
+        self.count = new_count
+        self.minimum = min(self.minimum, minimum)
+        self.maximum = max(self.maximum, maximum)
+
+    def add_array(self, values):
+        """Adds every sample in a 1-D array."""
+        if len(values) == 0:
+            return
+        minimum, maximum, mean, std = stats.get_moments(values)
+        self._combine(len(values), minimum, maximum, mean,
+            std * std * len(values))
+        self.histogram.add_array(values)
+
+    def merge(self, other):
+        """Adds every sample tracked by another OnlineStats to this one."""
+        self._combine(other.count, other.minimum, other.maximum, other.mean,
+            other.m2)
+        self.histogram.merge(other.histogram)
+
+    def get_std(self):
+        """Returns the (population) standard deviation of the samples."""
+        if self.count == 0:
+            return 0.0
+        return math.sqrt(self.m2 / self.count)
+
+    def get_percentiles(self, percentiles):
+        """Returns estimates of the given percentiles. The exact min and max
+        are returned for the 0th and 100th percentiles, and no estimate falls
+        outside of them."""
+        if self.count == 0:
+            raise Exception("Can't compute percentiles of an empty histogram")
+        return self.get_sorted_values(stats.get_percentile_indices(self.count,
+            percentiles))
+
+    def get_sorted_values(self, indices):
+        """Returns estimates of the elements at the given indices in a sorted
+        list of every sample, clamped to the exact min and max. The first and
+        last elements are the exact min and max."""
+        to_return = []
+        estimates = self.histogram.get_sorted_values(indices)
+        for i, v in zip(indices, estimates):
+            if i == 0:
+                v = self.minimum
+            elif i == (self.count - 1):
+                v = self.maximum
+            to_return.append(min(max(v, self.minimum), self.maximum))
+        return to_return
+
+    def compute_stats(self):
+        """Returns the min, max, med, mean, and stddev (in that order), like
+        stats.compute_stats, except that the median is an estimate."""
+        med = self.get_percentiles([50])[0]
+        return self.minimum, self.maximum, med, self.mean, self.get_std()
@@ -0,0 +1,25 @@
+# This module contains helpers for spreading independent per-file work across
+# multiple processes.
+import multiprocessing
+
+def _apply(function_and_args):
+    """Calls a function with a tuple of arguments. Used to pass the function
+    and its arguments to pool workers as a single picklable object."""
+    function, args = function_and_args
+    return function(*args)
+
+def map_in_processes(function, arguments, jobs):
+    """Takes a function, a list of argument tuples, and a number of jobs, and
+    yields the result of calling the function with each tuple of arguments,
+    in the same order as the arguments. If jobs is greater than 1, the calls
+    are made in a pool of that many worker processes, so the function and its
+    results must be picklable (i.e., the function must be defined at the top
+    level of a module). Otherwise, the calls are made in this process."""
+    if jobs <= 1:
+        for args in arguments:
+            yield function(*args)
+        return
+    work = [(function, args) for args in arguments]
+    with multiprocessing.Pool(jobs) as pool:
+        for result in pool.imap(_apply, work):
+            yield result
@@ -0,0 +1,207 @@
+# This module parses a single large result file using multiple processes.
+# hip_plugin_framework writes one "times" record per line, so the file's
+# record index (see record_index.py) is used to split the times array into
+# byte ranges that start and end on record boundaries, with roughly the same
+# number of bytes in each. Each range is parsed by a pool worker into the
+# columns described in result_cache.py, which the worker copies into a block
+# of shared memory rather than sending back through a pipe. The parent copies
+# each range's columns out of the shared memory (and removes it) as soon as
+# the range arrives, then concatenates every range's columns, in order, into
+# the same result that result_cache.convert_to_columns would have returned.
+#
+# Usually this is used through result_cache.load_result or
+# result_trace.load_trace, by passing jobs > 1.
+import numpy
+import os
+import secrets
+from multiprocessing import resource_tracker
+from multiprocessing import shared_memory
+
+from common import parallel
+from common import record_index
+from common import result_cache
+from common import result_loader
+
+# The number of ranges to split a file into for each worker process. Using
+# more than one evens out the time each worker spends.
+CHUNKS_PER_JOB = 4
+
+# Files aren't split into ranges smaller than this many bytes, since parsing
+# a small range takes less time than starting to parse it in another process.
+MIN_CHUNK_SIZE = 1 << 20
+
+def get_chunk_ranges(offsets, chunk_count):
+    """Takes a record index returned by record_index.build_record_index, and
+    returns a list of up to chunk_count [first record, end record) ranges,
+    covering every record, each containing roughly the same number of
+    bytes."""
+    record_count = len(offsets) - 1
+    targets = numpy.linspace(offsets[0], offsets[-1], chunk_count + 1)
+    boundaries = numpy.searchsorted(offsets[:-1], targets)
+    boundaries[0] = 0
+    boundaries[-1] = record_count
+    boundaries = numpy.unique(boundaries)
+    to_return = []
+    for i in range(len(boundaries) - 1):
+        to_return.append([int(boundaries[i]), int(boundaries[i + 1])])
+    return to_return
+
+def _copy_to_shared_memory(columns, name):
+    """Copies every array in the columns into a new block of shared memory
+    with the given name. Returns a dict containing the block's "name", the
+    "layout" of the arrays within it, as a list of [key, array name, dtype,
+    length, byte offset] lists, and the "strings" of any string-valued
+    columns."""
+    layout = []
+    strings = {}
+    size = 0
+    for k in columns:
+        for array_name in columns[k]:
+            if array_name == "strings":
+                strings[k] = columns[k]["strings"]
+                continue
+            a = columns[k][array_name]
+            layout.append([k, array_name, a.dtype.str, len(a), size])
+            size += a.nbytes
+    memory = shared_memory.SharedMemory(name=name, create=True,
+        size=max(size, 1))
+    try:
+        for k, array_name, dtype, length, offset in layout:
+            view = numpy.ndarray(length, dtype=dtype, buffer=memory.buf,
+                offset=offset)
+            view[:] = columns[k][array_name]
+            del view
+    except:
+        memory.close()
+        memory.unlink()
+        raise
+    memory.close()
+    return {"name": name, "layout": layout, "strings": strings}
+
+def parse_chunk(filename, offsets, first_record, memory_name):
+    """Parses the records in the given file starting at first_record, using
+    offsets, the part of the file's record index covering those records (with
+    one more offset than the number of records). Returns the description of
+    the shared memory, with the given name, holding the records' columns,
+    from _copy_to_shared_memory. The record indices in the columns are
+    relative to the start of the file. This is run in worker processes."""
+    builder = result_cache.ColumnBuilder()
+    reader = record_index.RecordReader(filename, offsets)
+    for i in range(reader.get_record_count()):
+        builder.add_record(reader.get_record(i), first_record + i)
+    reader.close()
+    return _copy_to_shared_memory(builder.get_columns(), memory_name)
+
+def _read_shared_memory(description):
+    """Takes a description returned by parse_chunk, and returns a dict
+    mapping each key to its column, copied out of the shared memory. The
+    shared memory is always released, so no view into it outlives it."""
+    memory = shared_memory.SharedMemory(name=description["name"])
+    try:
+        to_return = {}
+        for k, array_name, dtype, length, offset in description["layout"]:
+            if k not in to_return:
+                to_return[k] = {}
+            view = numpy.ndarray(length, dtype=dtype, buffer=memory.buf,
+                offset=offset)
+            to_return[k][array_name] = numpy.array(view)
+            del view
+        for k in description["strings"]:
+            to_return[k]["strings"] = description["strings"][k]
+    finally:
+        memory.close()
+        memory.unlink()
+    return to_return
+
+def _unlink_shared_memory(name):
+    """Removes the block of shared memory with the given name, if a worker
+    created it."""
+    try:
+        memory = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return
+    memory.close()
+    memory.unlink()
+
+def _merge_column(parts):
+    """Takes a list of one column's dicts of arrays, from consecutive ranges
+    of the file, and returns the combined column."""
+    to_return = {}
+    if "strings" in parts[0]:
+        # Each range numbers its strings separately, in order of their first
+        # appearance, so renumber them in order of their first appearance in
+        # the whole file.
+        strings = []
+        string_ids = {}
+        all_values = []
+        for p in parts:
+            for s in p["strings"]:
+                if s not in string_ids:
+                    string_ids[s] = len(strings)
+                    strings.append(s)
+            new_ids = numpy.array([string_ids[s] for s in p["strings"]],
+                dtype=numpy.int64)
+            all_values.append(new_ids[p["values"]])
+        to_return["values"] = numpy.concatenate(all_values)
+        to_return["strings"] = strings
+    else:
+        to_return["values"] = numpy.concatenate([p["values"] for p in parts])
+    to_return["records"] = numpy.concatenate([p["records"] for p in parts])
+    if "offsets" in parts[0]:
+        # Shift each range's offsets past the values from earlier ranges.
+        all_offsets = [numpy.zeros(1, dtype=numpy.int64)]
+        value_count = 0
+        for p in parts:
+            all_offsets.append(p["offsets"][1:] + value_count)
+            value_count += len(p["values"])
+        to_return["offsets"] = numpy.concatenate(all_offsets)
+    return to_return
+
+def convert_to_columns(filename, jobs):
+    """Parses the given result file using the given number of processes, and
+    returns the same dict as result_cache.convert_to_columns."""
+    offsets = record_index.load_record_index(filename)
+    chunk_count = min(jobs * CHUNKS_PER_JOB,
+        (offsets[-1] - offsets[0]) // MIN_CHUNK_SIZE)
+    ranges = get_chunk_ranges(offsets, max(chunk_count, 1))
+    if len(ranges) <= 1:
+        jobs = 1
+    # The shared memory blocks are named by the parent, so that any blocks
+    # created by workers whose results weren't read (e.g. because another
+    # worker failed) can still be removed.
+    prefix = "rtns_%d_%s_" % (os.getpid(), secrets.token_hex(4))
+    names = [prefix + str(i) for i in range(len(ranges))]
+    arguments = []
+    for i in range(len(ranges)):
+        start, end = ranges[i]
+        arguments.append((filename, offsets[start:end + 1], start, names[i]))
+    # Make sure the parent process starts the resource tracker before the
+    # workers are created, so the workers share it. Otherwise, each worker
+    # would start its own, which would remove the worker's shared memory when
+    # the worker exits.
+    resource_tracker.ensure_running()
+    read_count = 0
+    all_parts = {}
+    results = parallel.map_in_processes(parse_chunk, arguments, jobs)
+    try:
+        for description in results:
+            parts = _read_shared_memory(description)
+            read_count += 1
+            for k in parts:
+                if k not in all_parts:
+                    all_parts[k] = []
+                all_parts[k].append(parts[k])
+    except:
+        # Closing the generator shuts down the pool, so no more blocks will
+        # be created.
+        results.close()
+        for name in names[read_count:]:
+            _unlink_shared_memory(name)
+        raise
+    columns = {}
+    for k in all_parts:
+        columns[k] = _merge_column(all_parts[k])
+    to_return = result_loader.read_header(filename)
+    to_return["record_count"] = len(offsets) - 1
+    to_return["columns"] = columns
+    return to_return
@@ -0,0 +1,87 @@
+# This module contains small matplotlib helpers shared by the plotting scripts,
+# including saving figures to files rather than displaying them. It doesn't
+# import matplotlib until it's needed, so it's safe to import before a backend
+# has been chosen.
+import os
+import re
+
+from common import parallel
+
+def set_window_title(figure, title):
+    """Sets the title of the window the figure will be shown in. Newer
+    versions of matplotlib only support this through the figure's manager,
+    which doesn't exist for figures that are only saved to files, in which
+    case this does nothing."""
+    manager = getattr(figure.canvas, "manager", None)
+    if manager is not None:
+        manager.set_window_title(title)
+
+def use_headless_backend():
+    """Selects matplotlib's non-interactive Agg backend, so figures can be
+    saved without a display, and without importing any GUI toolkit. This must
+    be called before any figures are created."""
+    import matplotlib
+    matplotlib.use("Agg")
+
+def get_output_name(name):
+    """Converts a figure's title into a name that can be used in a
+    filename."""
+    return re.sub("[^a-z0-9]+", "_", name.lower()).strip("_")
+
+def parse_formats(formats):
+    """Takes a comma-separated list of file formats, e.g. "pdf,png", and
+    returns a list of the formats."""
+    to_return = []
+    for f in formats.split(","):
+        f = f.strip().lower()
+        if f != "":
+            to_return.append(f)
+    if len(to_return) == 0:
+        raise Exception("No output formats were given")
+    return to_return
+
+def save_figure(figure, output_dir, name, formats):
+    """Saves the figure as output_dir/name.<format> for each of the given
+    formats, then closes it. Returns a list of the paths that were written."""
+    import matplotlib.pyplot as plot
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    to_return = []
+    for f in formats:
+        path = os.path.join(output_dir, name + "." + f)
+        figure.savefig(path, format=f)
+        to_return.append(path)
+    plot.close(figure)
+    return to_return
+
+def export_figure(function, args, output_dir, name, formats):
+    """Calls function with the tuple of arguments, which must return a
+    figure, and saves the figure using save_figure. Returns the list of paths
+    written. This is run in worker processes by export_figures."""
+    use_headless_backend()
+    return save_figure(function(*args), output_dir, name, formats)
+
+def export_figures(figure_list, output_dir, formats, jobs):
+    """Takes a list of [function, args, name] lists, and saves the figure
+    returned by each function to output_dir, in each of the formats, under
+    the given name. The figures are drawn and saved in the given number of
+    worker processes, so each function must be defined at the top level of a
+    module, and its arguments must be picklable. Returns a list of every path
+    that was written."""
+    arguments = []
+    for function, args, name in figure_list:
+        arguments.append((function, args, output_dir, name, formats))
+    to_return = []
+    for paths in parallel.map_in_processes(export_figure, arguments, jobs):
+        to_return += paths
+    return to_return
+
+def add_output_arguments(parser):
+    """Adds the --output_dir and --format arguments to an
+    argparse.ArgumentParser."""
+    parser.add_argument("--output_dir", default=None,
+        help="If set, save the figures in this directory instead of "+
+            "displaying them. No display is needed in this case.")
+    parser.add_argument("--format", default="pdf",
+        help="A comma-separated list of file formats to save figures in "+
+            "when --output_dir is set, e.g. pdf,png.")
@@ -0,0 +1,246 @@
+# This module builds an index of the byte offset of every record in a result
+# file's "times" array, so that any record (or range of records) can be
+# decoded without parsing the rest of the file. This relies on the
+# one-record-per-line layout written by hip_plugin_framework (see
+# result_loader.py): the first, empty, record follows the "[" that opens the
+# times array, and every following line starts with a record, until the line
+# that closes the array.
+#
+# The index is found using a single pass over the memory-mapped file, looking
+# only for newlines, and is saved to "dir/.result_cache/name.json.records.npz"
+# next to the columnar cache, so it only needs to be rebuilt when the file
+# changes. The index contains one more offset than the number of records:
+# record i is stored in bytes offsets[i] through offsets[i + 1] - 1, possibly
+# followed by a comma, whitespace, or the end of the array.
+#
+# This can also be run as a script to print records from a file, e.g. to look
+# at an outlier found in one of the plots:
+#
+#   python record_index.py <result file> <first record> [-n count] [--job]
+import argparse
+import json
+import mmap
+import numpy
+import os
+import sys
+
+# This may be run as a script from the common/ directory, so add the directory
+# above it to the module search path, as the other scripts do.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import result_cache
+from common import result_trace
+
+# Increment this whenever the index's layout changes, to invalidate old
+# indices.
+INDEX_VERSION = 1
+
+# The number of bytes of the file to search for newlines at a time.
+SCAN_CHUNK_SIZE = 1 << 24
+
+_decoder = json.JSONDecoder()
+
+def get_index_path(filename):
+    """Returns the path to the file containing the record index for the given
+    result file."""
+    directory, name = os.path.split(os.path.abspath(filename))
+    return os.path.join(directory, result_cache.CACHE_DIRECTORY,
+        name + ".records.npz")
+
+def _find_times_array(data, filename):
+    """Takes a memory-mapped result file and returns the offset of the first
+    record in its times array. Raises an exception if the file doesn't use
+    the one-record-per-line layout."""
+    line = data.readline()
+    if line.strip() != b"{":
+        raise Exception("%s isn't in the expected format" % (filename))
+    while True:
+        line_start = data.tell()
+        line = data.readline()
+        if line == b"":
+            raise Exception("%s doesn't contain a times array" % (filename))
+        if line.strip().startswith(b"\"times\""):
+            break
+    # The first (empty) record always starts right after the "[".
+    start = line.find(b"[")
+    if (start < 0) or not line[start + 1:].startswith(b"{"):
+        raise Exception("%s isn't in the expected format" % (filename))
+    return line_start + start + 1
+
+def build_record_index(filename):
+    """Scans the given result file and returns a numpy array containing the
+    byte offset of every record in its times array (including the initial
+    empty record), followed by the offset of the end of the last record's
+    line. If the times array hasn't been closed (e.g. the file is still being
+    written), the final offset is the end of the file."""
+    with open(filename, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise Exception("%s is empty" % (filename))
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            first_record = _find_times_array(data, filename)
+            content = numpy.frombuffer(data, dtype=numpy.uint8)
+            # Search for newlines in chunks, to limit the size of the
+            # temporary arrays.
+            all_starts = [numpy.zeros(0, dtype=numpy.int64)]
+            chunk = None
+            for i in range(first_record, len(content), SCAN_CHUNK_SIZE):
+                chunk = content[i:i + SCAN_CHUNK_SIZE]
+                all_starts.append(numpy.flatnonzero(chunk == ord("\n")) + i +
+                    1)
+            line_starts = numpy.concatenate(all_starts)
+            line_starts = line_starts[line_starts < len(content)]
+            first_bytes = content[line_starts]
+            del chunk, content
+        finally:
+            data.close()
+    # Every line after the first is either a record or the end of the array.
+    is_end = first_bytes == ord("]")
+    end_offset = os.path.getsize(filename)
+    if is_end.any():
+        end_line = numpy.argmax(is_end)
+        end_offset = line_starts[end_line]
+        line_starts = line_starts[:end_line]
+        first_bytes = first_bytes[:end_line]
+    if numpy.any(first_bytes != ord("{")):
+        raise Exception("%s doesn't contain one record per line" % (filename))
+    to_return = numpy.empty(len(line_starts) + 2, dtype=numpy.int64)
+    to_return[0] = first_record
+    to_return[1:-1] = line_starts
+    to_return[-1] = end_offset
+    return to_return
+
+def _index_is_valid(filename, index_path, saved):
+    """Returns True if the saved index, loaded from the given path, is up to
+    date with the result file. As with result_cache, an index is considered
+    valid if the file's size and mtime are unchanged, or if its size is
+    unchanged and its contents hash to the same value, in which case the
+    saved mtime is updated."""
+    s = os.stat(filename)
+    if int(saved["index_version"]) != INDEX_VERSION:
+        return False
+    if int(saved["source_size"]) != s.st_size:
+        return False
+    if int(saved["source_mtime_ns"]) == s.st_mtime_ns:
+        return True
+    if result_cache.hash_file(filename) != str(saved["source_sha1"]):
+        return False
+    try:
+        _save_index(filename, index_path, saved["offsets"],
+            str(saved["source_sha1"]))
+    except OSError:
+        pass
+    return True
+
+def _save_index(filename, index_path, offsets, sha1=None):
+    """Atomically replaces the saved index for the given result file. Hashes
+    the file if sha1 isn't given."""
+    # Get the file's size and mtime before hashing it, so that a modification
+    # during this function will invalidate the index.
+    s = os.stat(filename)
+    if sha1 is None:
+        sha1 = result_cache.hash_file(filename)
+    directory = os.path.dirname(index_path)
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    tmp_path = index_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        numpy.savez(f, offsets=offsets, index_version=INDEX_VERSION,
+            source_size=s.st_size, source_mtime_ns=s.st_mtime_ns,
+            source_sha1=sha1)
+    os.replace(tmp_path, index_path)
+
+def load_record_index(filename, use_cache=True):
+    """Returns the record index of the given result file, as returned by
+    build_record_index. Uses the saved index if it's up to date, and otherwise
+    builds the index and saves it. If use_cache is False, the saved index is
+    neither read nor written."""
+    if not use_cache:
+        return build_record_index(filename)
+    index_path = get_index_path(filename)
+    try:
+        with numpy.load(index_path) as saved:
+            if _index_is_valid(filename, index_path, saved):
+                return saved["offsets"]
+    except (OSError, ValueError, KeyError):
+        pass
+    offsets = build_record_index(filename)
+    try:
+        _save_index(filename, index_path, offsets)
+    except OSError as e:
+        print("Unable to save the record index for %s: %s" % (filename,
+            str(e)))
+    return offsets
+
+class RecordReader:
+    """Decodes individual records from a result file's times array, using its
+    record index. Records are numbered in the same way as the record indices
+    in result_cache and result_trace, so record 0 is the initial empty record.
+    Call close when done."""
+    __slots__ = ["filename", "f", "data", "offsets"]
+
+    def __init__(self, filename, offsets=None):
+        """Opens the file. Loads (or builds) its record index if offsets
+        isn't given."""
+        if offsets is None:
+            offsets = load_record_index(filename)
+        self.filename = filename
+        self.offsets = offsets
+        self.f = open(filename, "rb")
+        self.data = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def get_record_count(self):
+        return len(self.offsets) - 1
+
+    def get_record(self, i):
+        """Returns the record with the given index, as a dict."""
+        if (i < 0) or (i >= self.get_record_count()):
+            raise Exception("Record %d is out of range; %s contains %d" % (i,
+                self.filename, self.get_record_count()))
+        text = self.data[self.offsets[i]:self.offsets[i + 1]].decode()
+        return _decoder.raw_decode(text)[0]
+
+    def get_records(self, start, end):
+        """Returns a list of the records with indices from start up to, but
+        not including, end."""
+        end = min(end, self.get_record_count())
+        return [self.get_record(i) for i in range(start, end)]
+
+    def close(self):
+        self.data.close()
+        self.f.close()
+
+def get_job_records(filename, job):
+    """Returns the [start, end) range of record indices belonging to the job
+    with the given index (numbered from 0, as in a result_trace.Trace): the
+    job's own record, followed by the records of its kernels."""
+    job_records = result_trace.load_trace(filename).job_records
+    if (job < 0) or (job >= len(job_records)):
+        raise Exception("Job %d is out of range; %s contains %d" % (job,
+            filename, len(job_records)))
+    if (job + 1) < len(job_records):
+        return [job_records[job], job_records[job + 1]]
+    return [job_records[job], None]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("filename", help="The result file to read.")
+    parser.add_argument("index", type=int,
+        help="The index of the first record to print. Record 0 is the empty "+
+            "record at the start of the times array.")
+    parser.add_argument("-n", "--count", type=int, default=1,
+        help="The number of records (or jobs, with --job) to print.")
+    parser.add_argument("--job", action="store_true",
+        help="Treat the index as a job number (counting from 0), and print "+
+            "each job's record along with its kernels' records.")
+    args = parser.parse_args()
+    reader = RecordReader(args.filename)
+    start = args.index
+    end = args.index + args.count
+    if args.job:
+        start = get_job_records(args.filename, args.index)[0]
+        end = get_job_records(args.filename, args.index + args.count - 1)[1]
+        if end is None:
+            end = reader.get_record_count()
+    for i in range(start, end):
+        print("%d: %s" % (i, json.dumps(reader.get_record(i))))
+    reader.close()
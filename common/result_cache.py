@@ -0,0 +1,304 @@
+# This module converts hip_plugin_framework result files into a columnar cache
+# of numpy arrays, so that figures can be regenerated without re-parsing the
+# JSON every time. Each result file "dir/name.json" is cached in the directory
+# "dir/.result_cache/name.json/", containing:
+#
+#  - meta.json: The file's header fields, the number of records in its "times"
+#    array, the list of cached columns, and the size, modification time and
+#    SHA1 hash of the source file when it was cached.
+#
+#  - One set of .npy files per key found in the "times" records. For keys
+#    containing lists of times (e.g. "execute_times" or "block_times"),
+#    <key>.npy holds every record's list concatenated into a single flat
+#    float64 array, and <key>.offsets.npy holds the CSR-style offsets of each
+#    record's list, so record i's values are values[offsets[i]:offsets[i+1]].
+#    For keys containing single numbers (e.g. "thread_count"), <key>.npy holds
+#    one value per record. In both cases, <key>.records.npy holds the index of
+#    each record in the original "times" array. For keys containing strings
+#    (e.g. "kernel_name"), <key>.npy holds the index of each record's string
+#    in a list of the key's distinct strings, which is kept in meta.json.
+#
+# The arrays are loaded using numpy.load(mmap_mode="r"), so loading a cached
+# file only reads the columns that are actually used.
+import array
+import hashlib
+import json
+import numpy
+import os
+import shutil
+
+from common import result_loader
+
+CACHE_DIRECTORY = ".result_cache"
+
+# Increment this whenever the cache's layout changes, to invalidate old caches.
+CACHE_VERSION = 2
+
+def get_cache_path(filename):
+    """Returns the path to the directory containing the cache for the given
+    result file."""
+    directory, name = os.path.split(os.path.abspath(filename))
+    return os.path.join(directory, CACHE_DIRECTORY, name)
+
+def hash_file(filename):
+    """Returns the SHA1 hash of the given file's contents, as a hex string."""
+    h = hashlib.sha1()
+    with open(filename, "rb") as f:
+        while True:
+            chunk = f.read(1 << 20)
+            if len(chunk) == 0:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+class ColumnBuilder:
+    """Accumulates the columns described at the top of this file from
+    records passed to add_record, one at a time."""
+    __slots__ = ["list_columns", "scalar_columns", "string_columns"]
+
+    def __init__(self):
+        self.list_columns = {}
+        self.scalar_columns = {}
+        self.string_columns = {}
+
+    def add_record(self, record, record_index):
+        """Adds every key in the record (a dict) to the columns. record_index
+        is the record's index in the "times" array."""
+        for k in record:
+            v = record[k]
+            if isinstance(v, list):
+                if k not in self.list_columns:
+                    self.list_columns[k] = [array.array("d"),
+                        array.array("q", [0]), array.array("q")]
+                column = self.list_columns[k]
+                column[0].extend(v)
+                column[1].append(len(column[0]))
+                column[2].append(record_index)
+            elif isinstance(v, (int, float)) and not isinstance(v, bool):
+                if k not in self.scalar_columns:
+                    # Start with an integer array, and switch to a float array
+                    # if any of the values are floating-point.
+                    self.scalar_columns[k] = [array.array("q"),
+                        array.array("q")]
+                column = self.scalar_columns[k]
+                if isinstance(v, float) and (column[0].typecode == "q"):
+                    column[0] = array.array("d", column[0])
+                column[0].append(v)
+                column[1].append(record_index)
+            elif isinstance(v, str):
+                if k not in self.string_columns:
+                    # Holds the string IDs, record indices, and a dict
+                    # mapping each distinct string to its ID.
+                    self.string_columns[k] = [array.array("q"),
+                        array.array("q"), {}]
+                column = self.string_columns[k]
+                if v not in column[2]:
+                    column[2][v] = len(column[2])
+                column[0].append(column[2][v])
+                column[1].append(record_index)
+
+    def get_columns(self):
+        """Returns a dict mapping each key to a dict of numpy arrays, as in
+        the "columns" field returned by load_result. The arrays share memory
+        with this builder, so no more records should be added."""
+        columns = {}
+        for k in self.list_columns:
+            c = self.list_columns[k]
+            columns[k] = {
+                "values": numpy.frombuffer(c[0], dtype=numpy.float64),
+                "offsets": numpy.frombuffer(c[1], dtype=numpy.int64),
+                "records": numpy.frombuffer(c[2], dtype=numpy.int64),
+            }
+        for k in self.scalar_columns:
+            c = self.scalar_columns[k]
+            dtype = numpy.int64
+            if c[0].typecode == "d":
+                dtype = numpy.float64
+            columns[k] = {
+                "values": numpy.frombuffer(c[0], dtype=dtype),
+                "records": numpy.frombuffer(c[1], dtype=numpy.int64),
+            }
+        for k in self.string_columns:
+            c = self.string_columns[k]
+            columns[k] = {
+                "values": numpy.frombuffer(c[0], dtype=numpy.int64),
+                "records": numpy.frombuffer(c[1], dtype=numpy.int64),
+                "strings": list(c[2].keys()),
+            }
+        return columns
+
+def convert_to_columns(filename):
+    """Parses the given result file and returns a dict in the same format as
+    load_result, but with the columns held in memory rather than memory-mapped
+    from the cache."""
+    builder = ColumnBuilder()
+    record_count = 0
+    for record in result_loader.iterate_times(filename):
+        builder.add_record(record, record_count)
+        record_count += 1
+    to_return = result_loader.read_header(filename)
+    to_return["record_count"] = record_count
+    to_return["columns"] = builder.get_columns()
+    return to_return
+
+def _source_info(filename):
+    """Returns the size and modification time of the given file."""
+    s = os.stat(filename)
+    return {"source_size": s.st_size, "source_mtime_ns": s.st_mtime_ns}
+
+def _read_meta(cache_path):
+    """Returns the parsed meta.json from the given cache directory, or None if
+    it doesn't exist or is from a different version of the cache."""
+    try:
+        with open(os.path.join(cache_path, "meta.json")) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get("cache_version") != CACHE_VERSION:
+        return None
+    return meta
+
+def _write_meta(cache_path, meta):
+    """Atomically replaces the meta.json file in the given cache directory."""
+    tmp_path = os.path.join(cache_path, "meta.json.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, os.path.join(cache_path, "meta.json"))
+
+def _cache_is_valid(filename, cache_path, meta):
+    """Returns True if the cache with the given metadata is up to date with the
+    source file. A cache is considered valid if the file's size and mtime are
+    unchanged, or if its size is unchanged and its contents hash to the same
+    value (e.g. after the file was copied). In the latter case, the cached
+    mtime is updated so the file doesn't need to be hashed next time."""
+    info = _source_info(filename)
+    if info["source_size"] != meta["source_size"]:
+        return False
+    if info["source_mtime_ns"] == meta["source_mtime_ns"]:
+        return True
+    if hash_file(filename) != meta["source_sha1"]:
+        return False
+    meta["source_mtime_ns"] = info["source_mtime_ns"]
+    try:
+        _write_meta(cache_path, meta)
+    except OSError:
+        pass
+    return True
+
+def is_cached(filename):
+    """Returns True if the result file's cache is up to date, so that
+    load_result won't need to parse the file."""
+    cache_path = get_cache_path(filename)
+    meta = _read_meta(cache_path)
+    return (meta is not None) and _cache_is_valid(filename, cache_path, meta)
+
+def write_cache(filename, result):
+    """Takes a result file's name and its contents as returned by
+    convert_to_columns, and writes the contents to the file's cache
+    directory, replacing any existing cache."""
+    # Get the source's size and mtime before hashing it, so that a
+    # modification during this function will invalidate the cache.
+    meta = _source_info(filename)
+    meta["source_sha1"] = hash_file(filename)
+    meta["cache_version"] = CACHE_VERSION
+    meta["header"] = {}
+    for k in result:
+        if k != "columns":
+            meta["header"][k] = result[k]
+    meta["columns"] = {}
+    meta["strings"] = {}
+    cache_path = get_cache_path(filename)
+    # Write everything to a temporary directory first, so that an interrupted
+    # write never leaves a partial cache in place.
+    tmp_path = cache_path + ".tmp"
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+    for k in result["columns"]:
+        column = result["columns"][k]
+        if "strings" in column:
+            meta["strings"][k] = column["strings"]
+        meta["columns"][k] = sorted([a for a in column if a != "strings"])
+        for array_name in meta["columns"][k]:
+            name = k + ".npy"
+            if array_name != "values":
+                name = k + "." + array_name + ".npy"
+            numpy.save(os.path.join(tmp_path, name), column[array_name])
+    _write_meta(tmp_path, meta)
+    if os.path.exists(cache_path):
+        shutil.rmtree(cache_path)
+    os.replace(tmp_path, cache_path)
+
+def _load_cache(cache_path, meta):
+    """Returns a result dict with columns memory-mapped from the given cache
+    directory."""
+    to_return = dict(meta["header"])
+    columns = {}
+    for k in meta["columns"]:
+        column = {}
+        for array_name in meta["columns"][k]:
+            name = k + ".npy"
+            if array_name != "values":
+                name = k + "." + array_name + ".npy"
+            column[array_name] = numpy.load(os.path.join(cache_path, name),
+                mmap_mode="r")
+        if k in meta["strings"]:
+            column["strings"] = meta["strings"][k]
+        columns[k] = column
+    to_return["columns"] = columns
+    return to_return
+
+def _parse_file(filename, jobs):
+    """Returns the result of convert_to_columns, parsing the file in the
+    given number of processes."""
+    if jobs <= 1:
+        return convert_to_columns(filename)
+    # Imported here, since parallel_parser imports this module.
+    from common import parallel_parser
+    return parallel_parser.convert_to_columns(filename, jobs)
+
+def load_result(filename, use_cache=True, jobs=1):
+    """Takes the name of a result file and returns a dict containing the
+    file's header fields, plus two additional keys: "record_count", the number
+    of records in the "times" array (including the initial empty record), and
+    "columns", a dict mapping each key in the times records to a dict of numpy
+    arrays as described at the top of this file. Uses the cached copy of the
+    file if it's up to date, and otherwise parses the file and updates the
+    cache. If use_cache is False, the cache is neither read nor written. If
+    jobs is greater than 1, the file is parsed in that many processes (see
+    parallel_parser.py), so this must not be called from a pool worker."""
+    if not use_cache:
+        return _parse_file(filename, jobs)
+    cache_path = get_cache_path(filename)
+    meta = _read_meta(cache_path)
+    if (meta is not None) and _cache_is_valid(filename, cache_path, meta):
+        return _load_cache(cache_path, meta)
+    result = _parse_file(filename, jobs)
+    try:
+        write_cache(filename, result)
+    except OSError as e:
+        print("Unable to cache %s: %s" % (filename, str(e)))
+    return result
+
+def get_record_values(result, key):
+    """Takes a result returned by load_result and the name of a list-valued
+    key, and returns a list of two numpy arrays: the flat array of every
+    record's values for the key, and the offsets of each record's values. If
+    no records contain the key, both arrays will be empty except for a single
+    0 offset."""
+    if key not in result["columns"]:
+        return [numpy.zeros(0), numpy.zeros(1, dtype=numpy.int64)]
+    column = result["columns"][key]
+    return [column["values"], column["offsets"]]
+
+def get_aligned_values(result, key, records):
+    """Takes a result returned by load_result, the name of a number-valued
+    key, and a numpy array of (sorted) record indices. Returns a numpy array
+    containing the key's value in each of the given records. Raises an
+    exception if any of the records doesn't contain the key."""
+    column = result["columns"][key]
+    indices = numpy.searchsorted(column["records"], records)
+    if (len(indices) > 0) and ((indices.max() >= len(column["records"])) or
+        not numpy.array_equal(column["records"][indices], records)):
+        raise Exception("Not all records contain the key %s" % (key))
+    return numpy.asarray(column["values"])[indices]
@@ -0,0 +1,202 @@
+# This module reads the JSON result files produced by hip_plugin_framework
+# without holding the entire file in memory. The framework writes the header
+# fields one per line, followed by a "times" array containing exactly one
+# record per line, for example:
+#
+#   {
+#   "scenario_name": "MM256 vs MM256",
+#   ...
+#   "times": [{},
+#   {"copy_in_times": [1.86, 1.86], "execute_times": [1.86, 1.87], ...},
+#   {"kernel_name": "matrix_multiply", ..., "block_times": []}
+#   ]}
+#
+# so the records can be decoded one line at a time. Files that don't follow
+# this layout are still supported, but are parsed all at once.
+import itertools
+import json
+import os
+import time
+
+_decoder = json.JSONDecoder()
+
+class TruncatedFileError(Exception):
+    """Raised when a result file ends, or is cut short, before the end of its
+    times array, e.g. because the runner writing it was stopped."""
+    pass
+
+def _filter_record(record, keys):
+    """Returns a copy of the record containing only the given keys, or None if
+    the record contains none of them. If keys is None, returns the record
+    unchanged."""
+    if keys is None:
+        return record
+    to_return = {}
+    for k in keys:
+        if k in record:
+            to_return[k] = record[k]
+    if len(to_return) == 0:
+        return None
+    return to_return
+
+def _read_header(lines, filename=None):
+    """Reads lines from the given iterator up to and including the start of
+    the "times" array. Returns a tuple containing the parsed header dict and
+    the remainder of the line following the "[" that opens the times array.
+    Returns None if the file doesn't follow the one-record-per-line layout.
+    If a filename is given, a TruncatedFileError is raised instead if the
+    lines run out before the times array starts."""
+    first_line = next(lines, None)
+    if (first_line is None) and (filename is not None):
+        raise TruncatedFileError("%s ended before its header" % (filename))
+    if (first_line is None) or (first_line.strip() != "{"):
+        return None
+    header_lines = []
+    for line in lines:
+        stripped = line.strip()
+        if stripped.startswith("\"times\""):
+            # The framework always places the first (empty) record on the
+            # same line as the start of the array.
+            start = stripped.find("[")
+            if (start < 0) or not stripped[start + 1:].startswith("{"):
+                return None
+            header_text = ",".join(header_lines)
+            header = json.loads("{" + header_text + "}")
+            return header, stripped[start + 1:]
+        if stripped != "":
+            header_lines.append(stripped.rstrip(","))
+    if filename is not None:
+        raise TruncatedFileError("%s ended before its header" % (filename))
+    return None
+
+def _iterate_records(lines, first_line, filename, allow_truncated=False):
+    """Yields each record in the times array, given an iterator over the
+    lines following the start of the array, and the text following the "["
+    on the array's first line. Raises a TruncatedFileError if the lines run out
+    before the end of the array, unless allow_truncated is True. If
+    allow_truncated is True, a line that can't be parsed is assumed to be a
+    record that was cut short, and also raises a TruncatedFileError."""
+    for line in itertools.chain([first_line], lines):
+        text = line.strip()
+        # Each line contains a record followed by a comma, or the end of the
+        # array. The final record may also be followed by the end of the array
+        # on the same line.
+        if text.startswith("{"):
+            try:
+                record, end = _decoder.raw_decode(text)
+            except json.JSONDecodeError:
+                if not allow_truncated:
+                    raise
+                raise TruncatedFileError("%s contains a partial record: %s"
+                    % (filename, text[:40]))
+            yield record
+            text = text[end:].strip()
+            if text == ",":
+                text = ""
+        if text.startswith("]"):
+            return
+        if text != "":
+            message = "Unexpected content in the times array of %s: %s" % (
+                filename, text[:40])
+            if allow_truncated:
+                raise TruncatedFileError(message)
+            raise Exception(message)
+    if not allow_truncated:
+        raise TruncatedFileError("%s ended before the end of its times array"
+            % (filename))
+
+def _follow_lines(f, poll_interval, timeout):
+    """Yields complete lines from the open file f as they're written, waiting
+    poll_interval seconds whenever no new data is available. Returns if no new
+    data has been written for timeout seconds, or never returns if timeout is
+    None. The result files don't end in a newline, so a partial line at the
+    end of the file is also yielded if it closes the times array."""
+    pending = ""
+    last_data_time = time.time()
+    while True:
+        line = f.readline()
+        if line != "":
+            pending += line
+            last_data_time = time.time()
+            if pending.endswith("\n"):
+                yield pending
+                pending = ""
+            continue
+        if pending.strip().startswith("]"):
+            yield pending
+            return
+        if (timeout is not None) and \
+            ((time.time() - last_data_time) > timeout):
+            return
+        time.sleep(poll_interval)
+
+def read_header(filename):
+    """Takes the name of a result file and returns a dict containing every
+    field in the file except for "times"."""
+    with open(filename) as f:
+        parsed = _read_header(iter(f))
+        if parsed is not None:
+            return parsed[0]
+        f.seek(0)
+        to_return = json.load(f)
+    del to_return["times"]
+    return to_return
+
+def iterate_times(filename, keys=None):
+    """Takes the name of a result file and yields the records in its "times"
+    array one at a time. If keys is None, every record is yielded unchanged
+    (including the empty record at the start of the array). Otherwise, keys
+    must be a list of key names, and each yielded record will contain only
+    those keys. Records containing none of the keys are skipped."""
+    with open(filename) as f:
+        lines = iter(f)
+        parsed = _read_header(lines)
+        if parsed is None:
+            f.seek(0)
+            records = json.load(f)["times"]
+        else:
+            records = _iterate_records(lines, parsed[1], filename)
+        for record in records:
+            record = _filter_record(record, keys)
+            if record is not None:
+                yield record
+
+def load_plugin(filename, keys=None):
+    """Takes the name of a result file and returns a dict in the same format
+    as parsing the entire file with json.loads. If a list of keys is given,
+    then the "times" list will only contain records with at least one of the
+    keys, and each record will contain only those keys. As in the original
+    files, the first entry in the returned "times" list is an empty object."""
+    to_return = read_header(filename)
+    times = list(iterate_times(filename, keys))
+    if keys is not None:
+        times.insert(0, {})
+    to_return["times"] = times
+    return to_return
+
+def follow_times(filename, keys=None, poll_interval=0.5, timeout=None):
+    """Similar to iterate_times, but for a result file that's still being
+    written, e.g. by hip_plugin_framework's runner. Waits for the file to be
+    created, then yields each record as soon as its line has been completely
+    written, and returns once the end of the times array has been written. If
+    timeout is given, this also returns after no new data has been written for
+    that many seconds (including while waiting for the file to be created).
+    The file must use the one-record-per-line layout that hip_plugin_framework
+    writes. A TruncatedFileError is raised if the file appears to have been
+    cut short, e.g. if its header is incomplete when the timeout expires, or
+    if a partially-written record is followed by other content."""
+    start_time = time.time()
+    while not os.path.exists(filename):
+        if (timeout is not None) and ((time.time() - start_time) > timeout):
+            return
+        time.sleep(poll_interval)
+    with open(filename) as f:
+        lines = _follow_lines(f, poll_interval, timeout)
+        parsed = _read_header(lines, filename)
+        if parsed is None:
+            raise Exception("%s isn't in the expected format" % (filename))
+        records = _iterate_records(lines, parsed[1], filename, True)
+        for record in records:
+            record = _filter_record(record, keys)
+            if record is not None:
+                yield record
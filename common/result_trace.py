@@ -0,0 +1,297 @@
+# This module defines Trace, a compact representation of a single
+# hip_plugin_framework result file. Rather than one dict per record, a Trace
+# holds the header fields as attributes and every record's data as a handful
+# of flat numpy arrays ("struct of arrays"):
+#
+#  - Intervals: Every [start, end] pair of CPU times (e.g. "execute_times" or
+#    "copy_in_times") in one table, grouped by key, with the record and job
+#    each interval belongs to. The keys in FIRST_LAST_KEYS, whose lists don't
+#    consist of start/end pairs (e.g. "kernel_launch_times", which holds three
+#    times), contribute one interval per record, from its first time to its
+#    last. Any other key with a list that isn't made of start/end pairs is
+#    left out of the table, and asking for its intervals raises an
+#    exception.
+#
+#  - Jobs: One row per record containing "execute_times", with its record
+#    index and "cpu_core".
+#
+#  - Kernels: One row per record describing a kernel, with its record index,
+#    job index, kernel name (as an index into a list of distinct names),
+#    "block_count", "thread_count" and "shared_memory", plus the kernel's
+#    "block_times" in CSR form: kernel i's flat [start, end, start, end, ...]
+#    list is block_times[block_time_offsets[i]:block_time_offsets[i + 1]].
+#
+# A Trace is built from the columns in result_cache, so the large arrays
+# (block_times in particular) stay memory-mapped from the cache, and loading a
+# Trace doesn't parse the JSON if the cache is up to date.
+import numpy
+
+from common import result_cache
+
+# The header fields set by hip_plugin_framework, which are stored as
+# attributes of a Trace. Any other header fields are kept in the Trace's
+# extra_header dict.
+HEADER_FIELDS = ["scenario_name", "plugin_name", "label", "release_time",
+    "compute_unit_count", "threads_per_compute_unit", "clock_rate",
+    "warp_size", "starting_clock", "PID", "TID"]
+
+# List-valued keys that aren't included in the intervals table, since they're
+# stored with the kernels instead.
+NON_INTERVAL_KEYS = ["block_times"]
+
+# List-valued keys that don't hold start/end pairs, and are instead included
+# in the intervals table as a single interval, from the first time in each
+# record's list to the last.
+FIRST_LAST_KEYS = ["kernel_launch_times"]
+
+class Trace:
+    """The contents of a result file. Header fields that weren't in the file
+    are None. Every array is a numpy array, and arrays describing records hold
+    indices into the file's "times" array. Jobs and kernels are numbered in
+    the order they appear in the file."""
+    __slots__ = HEADER_FIELDS + ["extra_header", "record_count", "key_names",
+        "key_offsets", "malformed_keys", "intervals", "interval_records",
+        "interval_jobs", "job_records", "cpu_cores", "kernel_records",
+        "kernel_jobs", "kernel_names", "kernel_name_ids", "block_counts",
+        "thread_counts", "shared_memory", "block_times", "block_time_offsets"]
+
+    def __init__(self):
+        """Creates an empty Trace. Use from_result or load_trace to create a
+        Trace from a result file."""
+        for k in HEADER_FIELDS:
+            setattr(self, k, None)
+        self.extra_header = {}
+        self.record_count = 0
+        # The intervals for key_names[i] are intervals[key_offsets[i]:
+        # key_offsets[i + 1]], in the order they appear in the file.
+        self.key_names = []
+        self.key_offsets = numpy.zeros(1, dtype=numpy.int64)
+        # Keys with a list that doesn't consist of start/end pairs, which
+        # aren't in the intervals table.
+        self.malformed_keys = []
+        self.intervals = numpy.zeros((0, 2))
+        self.interval_records = numpy.zeros(0, dtype=numpy.int64)
+        # The index of the job containing each interval: the last job record
+        # at or before the interval's record, or -1 if there isn't one.
+        self.interval_jobs = numpy.zeros(0, dtype=numpy.int64)
+        self.job_records = numpy.zeros(0, dtype=numpy.int64)
+        self.cpu_cores = numpy.zeros(0, dtype=numpy.int64)
+        self.kernel_records = numpy.zeros(0, dtype=numpy.int64)
+        self.kernel_jobs = numpy.zeros(0, dtype=numpy.int64)
+        self.kernel_names = []
+        self.kernel_name_ids = numpy.zeros(0, dtype=numpy.int64)
+        self.block_counts = numpy.zeros(0, dtype=numpy.int64)
+        self.thread_counts = numpy.zeros(0, dtype=numpy.int64)
+        self.shared_memory = numpy.zeros(0, dtype=numpy.int64)
+        self.block_times = numpy.zeros(0)
+        self.block_time_offsets = numpy.zeros(1, dtype=numpy.int64)
+
+    def get_header(self):
+        """Returns a dict of the header fields that were in the file."""
+        to_return = {}
+        for k in HEADER_FIELDS:
+            v = getattr(self, k)
+            if v is not None:
+                to_return[k] = v
+        to_return.update(self.extra_header)
+        return to_return
+
+    def get_name(self):
+        """Returns the plugin's label, or its plugin_name if it has no
+        label."""
+        if self.label is not None:
+            return self.label
+        return self.plugin_name
+
+    def get_job_count(self):
+        return len(self.job_records)
+
+    def get_kernel_count(self):
+        return len(self.kernel_records)
+
+    def _get_key_range(self, key):
+        """Returns the [start, end) range of the given key's rows in the
+        intervals table, which is empty if the key isn't present. Raises an
+        exception if the key's lists don't consist of start/end pairs."""
+        if key in self.malformed_keys:
+            raise Exception("A record's %s doesn't consist of start/end "
+                "pairs" % (key))
+        if key not in self.key_names:
+            return [0, 0]
+        i = self.key_names.index(key)
+        return [self.key_offsets[i], self.key_offsets[i + 1]]
+
+    def get_intervals(self, key):
+        """Returns an (n, 2) numpy array of every [start, end] pair of times
+        for the given key, in the order they appear in the file. The returned
+        array is a view into the trace, so it must not be modified."""
+        start, end = self._get_key_range(key)
+        return self.intervals[start:end]
+
+    def get_interval_records(self, key):
+        """Returns the record index of each interval returned by
+        get_intervals(key)."""
+        start, end = self._get_key_range(key)
+        return self.interval_records[start:end]
+
+    def get_interval_jobs(self, key):
+        """Returns the job index of each interval returned by
+        get_intervals(key)."""
+        start, end = self._get_key_range(key)
+        return self.interval_jobs[start:end]
+
+    def get_block_intervals(self):
+        """Returns an (n, 2) numpy array of the [start, end] times of every
+        block of every kernel, in the order they appear in the file."""
+        return self.block_times.reshape((-1, 2))
+
+    def get_blocks_per_kernel(self):
+        """Returns a numpy array holding the number of blocks recorded in each
+        kernel's block_times."""
+        return numpy.diff(self.block_time_offsets) // 2
+
+    def get_kernel_name(self, kernel):
+        """Returns the name of the kernel with the given index, or None if it
+        didn't have one."""
+        name_id = self.kernel_name_ids[kernel]
+        if name_id < 0:
+            return None
+        return self.kernel_names[name_id]
+
+    def get_nbytes(self):
+        """Returns the total size, in bytes, of the trace's arrays, including
+        those that are memory-mapped rather than held in memory."""
+        to_return = 0
+        for k in Trace.__slots__:
+            v = getattr(self, k)
+            if isinstance(v, numpy.ndarray):
+                to_return += v.nbytes
+        return to_return
+
+def _get_column_values(columns, key, records, default, dtype):
+    """Takes result_cache columns, the name of a number-valued (or
+    string-valued) key, and a sorted numpy array of record indices. Returns a
+    numpy array of the key's value in each record, with the default value for
+    records that don't contain the key."""
+    to_return = numpy.full(len(records), default, dtype=dtype)
+    if (key not in columns) or (len(records) == 0):
+        return to_return
+    column = columns[key]
+    if len(column["records"]) == 0:
+        return to_return
+    positions = numpy.searchsorted(column["records"], records)
+    positions = numpy.minimum(positions, len(column["records"]) - 1)
+    found = column["records"][positions] == records
+    to_return[found] = numpy.asarray(column["values"])[positions[found]]
+    return to_return
+
+def _get_job_indices(job_records, records):
+    """Returns the index of the job each of the given records belongs to: the
+    last job record at or before it, or -1 if there isn't one."""
+    return numpy.searchsorted(job_records, records, side="right") - 1
+
+def _build_intervals(trace, columns):
+    """Fills in the intervals table of the trace from result_cache
+    columns."""
+    all_intervals = []
+    all_records = []
+    offsets = [0]
+    key_names = []
+    for k in sorted(columns):
+        column = columns[k]
+        if ("offsets" not in column) or (k in NON_INTERVAL_KEYS):
+            continue
+        values = numpy.asarray(column["values"])
+        lengths = numpy.diff(column["offsets"])
+        if k in FIRST_LAST_KEYS:
+            not_empty = lengths > 0
+            pairs = numpy.stack((values[column["offsets"][:-1][not_empty]],
+                values[column["offsets"][1:][not_empty] - 1]), axis=1)
+            records = column["records"][not_empty]
+        elif numpy.all((lengths % 2) == 0):
+            pairs = values.reshape((-1, 2))
+            records = numpy.repeat(column["records"], lengths // 2)
+        else:
+            trace.malformed_keys.append(k)
+            continue
+        key_names.append(k)
+        all_intervals.append(pairs)
+        all_records.append(records)
+        offsets.append(offsets[-1] + len(pairs))
+    trace.key_names = key_names
+    trace.key_offsets = numpy.array(offsets, dtype=numpy.int64)
+    if len(key_names) == 0:
+        return
+    trace.intervals = numpy.concatenate(all_intervals)
+    trace.interval_records = numpy.concatenate(all_records).astype(
+        numpy.int64)
+    trace.interval_jobs = _get_job_indices(trace.job_records,
+        trace.interval_records)
+
+def _build_kernels(trace, columns):
+    """Fills in the kernel arrays of the trace from result_cache columns. Any
+    record with block_times, kernel_launch_times or a kernel_name is
+    considered to describe a kernel."""
+    records = numpy.zeros(0, dtype=numpy.int64)
+    for k in ["block_times", "kernel_launch_times", "kernel_name"]:
+        if k in columns:
+            records = numpy.union1d(records, columns[k]["records"])
+    records = records.astype(numpy.int64)
+    trace.kernel_records = records
+    trace.kernel_jobs = _get_job_indices(trace.job_records, records)
+    trace.kernel_name_ids = _get_column_values(columns, "kernel_name",
+        records, -1, numpy.int64)
+    if "kernel_name" in columns:
+        trace.kernel_names = list(columns["kernel_name"]["strings"])
+    trace.block_counts = _get_column_values(columns, "block_count", records,
+        0, numpy.int64)
+    trace.thread_counts = _get_column_values(columns, "thread_count", records,
+        0, numpy.int64)
+    trace.shared_memory = _get_column_values(columns, "shared_memory",
+        records, 0, numpy.int64)
+    if "block_times" not in columns:
+        trace.block_time_offsets = numpy.zeros(len(records) + 1,
+            dtype=numpy.int64)
+        return
+    # Kernels without block_times get empty ranges, so the cached flat array
+    # can be used as-is.
+    column = columns["block_times"]
+    lengths = numpy.zeros(len(records), dtype=numpy.int64)
+    lengths[numpy.searchsorted(records, column["records"])] = numpy.diff(
+        column["offsets"])
+    if numpy.any((lengths % 2) != 0):
+        raise Exception("A kernel's block_times don't consist of start/end " +
+            "pairs")
+    trace.block_time_offsets = numpy.zeros(len(records) + 1,
+        dtype=numpy.int64)
+    numpy.cumsum(lengths, out=trace.block_time_offsets[1:])
+    trace.block_times = column["values"]
+
+def from_result(result):
+    """Takes a result returned by result_cache.load_result and returns a
+    Trace containing the same data."""
+    trace = Trace()
+    for k in result:
+        if (k == "columns") or (k == "record_count"):
+            continue
+        if k in HEADER_FIELDS:
+            setattr(trace, k, result[k])
+        else:
+            trace.extra_header[k] = result[k]
+    trace.record_count = result["record_count"]
+    columns = result["columns"]
+    if "execute_times" in columns:
+        trace.job_records = numpy.asarray(columns["execute_times"]["records"],
+            dtype=numpy.int64)
+        trace.cpu_cores = _get_column_values(columns, "cpu_core",
+            trace.job_records, -1, numpy.int64)
+    _build_intervals(trace, columns)
+    _build_kernels(trace, columns)
+    return trace
+
+def load_trace(filename, use_cache=True, jobs=1):
+    """Takes the name of a result file and returns a Trace of its contents.
+    Uses (and updates) the file's result_cache, unless use_cache is False. If
+    the file needs to be parsed, it's parsed in the given number of processes;
+    see result_cache.load_result."""
+    return from_result(result_cache.load_result(filename, use_cache, jobs))
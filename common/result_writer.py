@@ -0,0 +1,78 @@
+# This module writes result files in the same layout as hip_plugin_framework:
+# one header field per line, followed by a "times" array containing one record
+# per line. Records are written as they're added, so the files can be followed
+# by result_loader.follow_times while they're still being written.
+import json
+import os
+
+from common import record_index
+
+class ResultWriter:
+    """Writes a single result file. Call add_record for each record in the
+    "times" array, then close to finish the file."""
+    __slots__ = ["f"]
+
+    def __init__(self, filename, header):
+        """Creates the file and writes the header fields, in order, followed
+        by the start of the times array and its initial empty record."""
+        self.f = open(filename, "w")
+        self.f.write("{\n")
+        for k in header:
+            self.f.write("%s: %s,\n" % (json.dumps(k), json.dumps(header[k])))
+        self.f.write("\"times\": [{}")
+
+    def add_record(self, record):
+        """Appends a record (a dict) to the times array. The separator is
+        written before each record, since the last record isn't followed by a
+        comma."""
+        self.f.write(",\n" + json.dumps(record))
+
+    def flush(self):
+        self.f.flush()
+
+    def close(self):
+        """Closes the times array and the file."""
+        self.f.write("\n]}")
+        self.f.close()
+
+def _decode_record_end(f, start, end):
+    """Returns the offset of the end of the record starting at the given
+    offset in the open file, or None if the bytes up to end don't contain a
+    complete record. Also returns the text following the record."""
+    f.seek(start)
+    text = f.read(end - start).decode("utf-8", errors="replace")
+    try:
+        record, record_end = json.JSONDecoder().raw_decode(text)
+    except ValueError:
+        return None, ""
+    return start + len(text[:record_end].encode("utf-8")), text[record_end:]
+
+def close_truncated_file(filename):
+    """Takes a result file whose writer was stopped before finishing it (e.g.
+    a runner that was terminated), and makes it a valid result file, by
+    removing any partially-written record and closing the times array.
+    Returns the number of records in the file, including the initial empty
+    record. Files that are already complete are left unchanged."""
+    offsets = record_index.build_record_index(filename)
+    if offsets[-1] < os.path.getsize(filename):
+        # The line closing the times array was found.
+        return len(offsets) - 1
+    with open(filename, "r+b") as f:
+        # Only the last record can be partially written.
+        i = len(offsets) - 2
+        end, remainder = _decode_record_end(f, offsets[i], offsets[i + 1])
+        if end is None:
+            i -= 1
+            if i >= 0:
+                end, remainder = _decode_record_end(f, offsets[i],
+                    offsets[i + 1])
+            if end is None:
+                raise Exception("Unable to find the last record in %s" %
+                    (filename))
+        elif remainder.strip().lstrip(",").strip().startswith("]"):
+            # The array was closed on the same line as the last record.
+            return len(offsets) - 1
+        f.seek(end)
+        f.truncate()
+        f.write(b"\n]}")
+    return i + 1
@@ -0,0 +1,98 @@
+# This module computes the summary statistics reported in the paper's tables,
+# without sorting or modifying the samples. Medians and other percentiles are
+# found using numpy.partition, which only needs linear time, and the min, max,
+# mean and standard deviation are all computed in a single pass over the data.
+import math
+import numpy
+import statistics
+
+# The number of samples processed at a time by get_moments. Small enough that
+# each chunk stays in cache while several reductions are run over it.
+CHUNK_SIZE = 1 << 16
+
+def get_moments(data):
+    """Takes a 1-D array of samples and returns a list containing their min,
+    max, arithmetic mean and (population) standard deviation. The data is read
+    in a single pass, one cache-sized chunk at a time, with each chunk's mean
+    and sum of squared differences combined using Chan et al.'s parallel
+    variance algorithm."""
+    data = numpy.asarray(data, dtype=numpy.float64)
+    if len(data) == 0:
+        raise Exception("Can't compute statistics of an empty list")
+    minimum = numpy.inf
+    maximum = -numpy.inf
+    count = 0
+    mean = 0.0
+    m2 = 0.0
+    for start in range(0, len(data), CHUNK_SIZE):
+        chunk = data[start:start + CHUNK_SIZE]
+        minimum = min(minimum, chunk.min())
+        maximum = max(maximum, chunk.max())
+        chunk_count = len(chunk)
+        chunk_mean = chunk.mean()
+        chunk_m2 = numpy.square(chunk - chunk_mean).sum()
+        new_count = count + chunk_count
+        delta = chunk_mean - mean
+        mean += delta * chunk_count / new_count
+        m2 += chunk_m2 + delta * delta * count * chunk_count / new_count
+        count = new_count
+    return [minimum, maximum, mean, numpy.sqrt(m2 / count)]
+
+def get_percentile_indices(count, percentiles):
+    """Returns a list containing the index of each percentile in a sorted list
+    of count samples. As with the median in the paper's tables, percentile p
+    is the element at index int(count * p / 100), so the 50th percentile of an
+    even number of samples is the upper of the two middle elements."""
+    to_return = []
+    for p in percentiles:
+        index = int(count * p / 100.0)
+        if index >= count:
+            index = count - 1
+        to_return.append(index)
+    return to_return
+
+def get_z_score(confidence):
+    """Returns the number of standard deviations on either side of the mean
+    of a normal distribution containing the given fraction (e.g. 0.95) of the
+    distribution."""
+    if (confidence <= 0.0) or (confidence >= 1.0):
+        raise Exception("Invalid confidence level: %f" % (confidence))
+    return statistics.NormalDist().inv_cdf(0.5 + confidence / 2.0)
+
+def get_percentile_confidence_indices(count, percentile, confidence):
+    """Returns a list containing the indices of two elements in a sorted list
+    of count samples, such that the given percentile of the distribution the
+    samples were drawn from lies between them with (approximately) the given
+    confidence. This doesn't depend on the shape of the distribution: the
+    number of samples below the true percentile is binomially distributed,
+    and is approximated using a normal distribution here. Returns None if
+    there aren't enough samples for the interval to fit within the list."""
+    p = percentile / 100.0
+    center = count * p
+    spread = get_z_score(confidence) * math.sqrt(count * p * (1.0 - p))
+    # These are ranks starting from 1, as in the usual definition.
+    lower = int(math.floor(center - spread))
+    upper = int(math.ceil(center + spread))
+    if (lower < 1) or (upper > count):
+        return None
+    return [lower - 1, upper - 1]
+
+def get_percentiles(data, percentiles):
+    """Takes a 1-D array of samples and a list of percentiles (e.g.
+    [50, 90, 99, 99.9]) and returns a list containing the value of each
+    percentile, as defined in get_percentile_indices. All of the percentiles
+    are selected in a single call to numpy.partition, which works on a
+    scratch copy, so the data is never sorted or modified."""
+    data = numpy.asarray(data)
+    if len(data) == 0:
+        raise Exception("Can't compute percentiles of an empty list")
+    indices = get_percentile_indices(len(data), percentiles)
+    partitioned = numpy.partition(data, sorted(set(indices)))
+    return [partitioned[i] for i in indices]
+
+def compute_stats(data):
+    """ Returns the min, max, med, mean, and stddev (in that order) of the
+    given data. The data isn't sorted or otherwise modified. """
+    minimum, maximum, mean, std = get_moments(data)
+    med = get_percentiles(data, [50])[0]
+    return minimum, maximum, med, mean, std
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# This script stands in for hip_plugin_framework's ./bin/runner, so that the
+# experiment scripts can be tried out without a GPU. It takes the same command
+# line (a config file, or "-" to read the config from stdin), and writes a
+# result file to each plugin's "log_name", containing synthetic job and kernel
+# records. The records are written as the "run" progresses, just like the real
+# runner.
+#
+# Its behavior can be changed using environment variables:
+#
+#  - STUB_RUNNER_TIME_SCALE: Multiplies the amount of real time the run takes.
+#    For example, 0.01 will run a config with "max_time": 60.0 in 0.6 seconds,
+#    though the times in the result files will still cover 60 seconds.
+#
+#  - STUB_RUNNER_MEAN_MS: The mean (simulated) duration of each job, in
+#    milliseconds. Defaults to 5.
+#
+#  - STUB_RUNNER_HANG_AFTER: If set, the runner stops writing results and
+#    sleeps forever after this many (real) seconds, as if the GPU had hung.
+#
+#  - STUB_RUNNER_EXIT_CODE: If set, the runner exits immediately with this
+#    exit code without writing anything.
+#
+# Usage: python stub_runner.py <config file | ->
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import result_writer
+from common import synthetic_results
+
+def get_float_env(name, default):
+    """Returns the value of an environment variable parsed as a float, or the
+    default if it isn't set."""
+    if name not in os.environ:
+        return default
+    return float(os.environ[name])
+
+def get_thread_count(plugin):
+    """Returns the total number of threads per block in the plugin config,
+    which may be a single number or a list of dimensions."""
+    thread_count = plugin.get("thread_count", 256)
+    if not isinstance(thread_count, list):
+        return thread_count
+    to_return = 1
+    for d in thread_count:
+        to_return *= d
+    return to_return
+
+def open_writers(config):
+    """Returns a list of ResultWriters, one for each plugin in the config
+    that isn't logging to /dev/null, paired with the plugin's config."""
+    to_return = []
+    for plugin in config["plugins"]:
+        log_name = plugin.get("log_name", "/dev/null")
+        if log_name == "/dev/null":
+            continue
+        directory = os.path.dirname(log_name)
+        if (directory != "") and not os.path.exists(directory):
+            os.makedirs(directory)
+        header = synthetic_results.get_header(config.get("name", ""),
+            plugin.get("label", ""))
+        to_return.append((result_writer.ResultWriter(log_name, header),
+            plugin))
+    return to_return
+
+def run(config):
+    """Simulates running the given config, writing each plugin's results."""
+    time_scale = get_float_env("STUB_RUNNER_TIME_SCALE", 1.0)
+    mean = get_float_env("STUB_RUNNER_MEAN_MS", 5.0) / 1000.0
+    hang_after = get_float_env("STUB_RUNNER_HANG_AFTER", None)
+    max_time = config.get("max_time", 0.0)
+    max_iterations = config.get("max_iterations", 0)
+    writers = open_writers(config)
+    start_time = time.time()
+    simulated_time = 1.0
+    iteration = 0
+    while True:
+        if (max_iterations > 0) and (iteration >= max_iterations):
+            break
+        if (max_time > 0) and ((simulated_time - 1.0) >= max_time):
+            break
+        if (hang_after is not None) and \
+            ((time.time() - start_time) >= hang_after):
+            while True:
+                time.sleep(60.0)
+        duration = random.lognormvariate(0.0, 0.05) * mean
+        for w, plugin in writers:
+            for r in synthetic_results.get_job_records(simulated_time,
+                duration, plugin.get("block_count", 1),
+                get_thread_count(plugin)):
+                w.add_record(r)
+            w.flush()
+        simulated_time += duration + 0.0001
+        iteration += 1
+        time.sleep((duration + 0.0001) * time_scale)
+    for w, plugin in writers:
+        w.close()
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python %s <config file | ->" % (sys.argv[0]))
+        exit(1)
+    if "STUB_RUNNER_EXIT_CODE" in os.environ:
+        exit(int(os.environ["STUB_RUNNER_EXIT_CODE"]))
+    if sys.argv[1] == "-":
+        config = json.loads(sys.stdin.read())
+    else:
+        with open(sys.argv[1]) as f:
+            config = json.loads(f.read())
+    run(config)
@@ -0,0 +1,232 @@
+# This module writes synthetic result files in hip_plugin_framework's format,
+# for testing and benchmarking the scripts with more (or different) data than
+# the experiments produced. Each scenario consists of one file per plugin, with
+# the plugins' jobs running at the same time. Each job contains any number of
+# kernels, which may include block times:
+#
+#  - The kernels split the job's execute time evenly.
+#
+#  - Each kernel's blocks run in waves, with as many blocks at once as fit on
+#    the GPU's CUs (based on the header's "threads_per_compute_unit"). Each
+#    block runs for most of its wave, with some random variation.
+#
+#  - Block times are recorded using a simulated GPU clock, which is offset
+#    from the CPU's clock by GPU_CLOCK_OFFSET seconds, as in real result files
+#    (see clock_alignment.py).
+#
+# The stub runner uses this module to create its records, too.
+#
+# Usage: python synthetic_results.py <output directory> [options]
+import argparse
+import json
+import math
+import numpy
+import os
+import sys
+
+# This may be run as a script from the common/ directory, so add the directory
+# above it to the module search path, as the other scripts do.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import result_writer
+
+# The number of seconds added to CPU times to get the simulated GPU times.
+GPU_CLOCK_OFFSET = 1000.0
+
+# The time between the end of one job and the start of the next, in seconds.
+JOB_GAP = 0.0001
+
+# The number of digits after the decimal point in the generated times, as in
+# real result files.
+TIME_DIGITS = 9
+
+def get_header(scenario_name, label, plugin_name="Stub Plugin",
+    compute_unit_count=60):
+    """Returns the header fields of a synthetic result file, using the values
+    reported for a Radeon VII."""
+    return {
+        "scenario_name": scenario_name,
+        "plugin_name": plugin_name,
+        "label": label,
+        "release_time": 0.0,
+        "compute_unit_count": compute_unit_count,
+        "threads_per_compute_unit": 2560,
+        "clock_rate": 1000000,
+        "warp_size": 64,
+        "starting_clock": 0,
+        "PID": os.getpid(),
+    }
+
+def _round_times(times):
+    """Returns the list of times rounded to TIME_DIGITS digits, so they don't
+    take up more space in the file than real times."""
+    return [round(t, TIME_DIGITS) for t in times]
+
+def get_block_times(rng, start_time, end_time, block_count, thread_count,
+    header):
+    """Returns a flat [start, end, start, end, ...] list of the simulated GPU
+    times of each block in a kernel running from start_time to end_time (in
+    CPU time). rng is a numpy.random.Generator."""
+    capacity = header["compute_unit_count"] * \
+        header["threads_per_compute_unit"]
+    concurrent = max(min(capacity // thread_count, block_count), 1)
+    wave_count = int(math.ceil(block_count / concurrent))
+    wave_length = (end_time - start_time) / wave_count
+    waves = numpy.arange(block_count) // concurrent
+    starts = start_time + (waves + rng.uniform(0.0, 0.1, block_count)) * \
+        wave_length
+    ends = starts + rng.uniform(0.75, 0.9, block_count) * wave_length
+    times = numpy.empty(2 * block_count)
+    times[0::2] = starts
+    times[1::2] = ends
+    return numpy.round(times + GPU_CLOCK_OFFSET, TIME_DIGITS).tolist()
+
+def get_job_records(start_time, duration, block_count, thread_count,
+    kernel_count=1, rng=None, header=None):
+    """Returns a list of the records for a single job, starting at start_time
+    and executing for the given duration (both in seconds): the job's record,
+    followed by a record for each of its kernels. The kernels' block times are
+    left empty, as if the config set "omit_block_times", unless a
+    numpy.random.Generator (rng) is given, in which case the header (from
+    get_header) must be given, too."""
+    launch = start_time + 0.00005
+    end = launch + duration
+    to_return = [{
+        "copy_in_times": _round_times([start_time, launch]),
+        "execute_times": _round_times([launch, end]),
+        "copy_out_times": _round_times([end, end + 0.00005]),
+        "cpu_times": _round_times([start_time, end + 0.00005]),
+        "cpu_core": 1,
+    }]
+    kernel_length = duration / kernel_count
+    for i in range(kernel_count):
+        kernel_start = launch + i * kernel_length
+        kernel_end = kernel_start + kernel_length
+        block_times = []
+        if rng is not None:
+            # The blocks run between the end of the kernel's launch and the
+            # time it's found to have completed.
+            block_times = get_block_times(rng, kernel_start + 0.000003,
+                kernel_end - 0.00001, block_count, thread_count, header)
+        to_return.append({
+            "kernel_name": "stub_kernel",
+            "block_count": block_count,
+            "thread_count": thread_count,
+            "shared_memory": 0,
+            "kernel_launch_times": _round_times([kernel_start,
+                kernel_start + 0.000003, kernel_end - 0.00001]),
+            "block_times": block_times,
+        })
+    return to_return
+
+def get_job_size(block_count, thread_count, kernel_count, block_times,
+    start_time=1.0):
+    """Returns the approximate number of bytes a single job, with the given
+    settings and starting at the given time, takes up in a result file."""
+    header = get_header("", "")
+    rng = None
+    if block_times:
+        rng = numpy.random.default_rng(0)
+    records = get_job_records(start_time + 0.0001234567, 0.0051234567,
+        block_count, thread_count, kernel_count, rng, header)
+    # Each record is followed by a comma and newline.
+    return sum(len(json.dumps(r)) + 2 for r in records)
+
+def write_result_file(filename, header, job_count, block_count, thread_count,
+    kernel_count=1, block_times=False, mean_ms=5.0, start_time=1.0, seed=0):
+    """Writes a result file containing job_count jobs, run back to back
+    starting at start_time. Job durations follow a lognormal distribution
+    with the given mean, in milliseconds. The output is the same for the same
+    seed."""
+    rng = numpy.random.default_rng(seed)
+    durations = rng.lognormal(0.0, 0.05, job_count) * mean_ms / 1000.0
+    block_rng = None
+    if block_times:
+        block_rng = rng
+    writer = result_writer.ResultWriter(filename, header)
+    t = start_time
+    for d in durations:
+        for r in get_job_records(t, d, block_count, thread_count,
+            kernel_count, block_rng, header):
+            writer.add_record(r)
+        t += d + JOB_GAP
+    writer.close()
+
+def write_scenario(directory, scenario_name, plugin_count, job_count,
+    block_count, thread_count, kernel_count=1, block_times=False,
+    mean_ms=5.0, seed=0):
+    """Writes one result file per plugin to the directory, for a scenario in
+    which every plugin runs job_count jobs at the same time. Returns the list
+    of file names."""
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    to_return = []
+    for i in range(plugin_count):
+        label = "Plugin %d" % (i + 1)
+        filename = os.path.join(directory, "synthetic_%d.json" % (i + 1))
+        # Start the plugins at slightly different times, so that their
+        # events aren't all at the same times.
+        write_result_file(filename, get_header(scenario_name, label),
+            job_count, block_count, thread_count, kernel_count, block_times,
+            mean_ms, 1.0 + i * 0.0001234, seed + i)
+        to_return.append(filename)
+    return to_return
+
+def get_job_count(size, plugin_count, block_count, thread_count,
+    kernel_count, block_times, mean_ms=5.0):
+    """Returns the number of jobs each plugin needs to run for a scenario's
+    result files to take up about the given total number of bytes."""
+    job_size = get_job_size(block_count, thread_count, kernel_count,
+        block_times)
+    job_count = max(int(size / plugin_count / job_size), 1)
+    # Later times have more digits, so estimate the size again using a job
+    # from the middle of the run.
+    middle = 1.0 + (job_count / 2.0) * (mean_ms / 1000.0 + JOB_GAP)
+    job_size = get_job_size(block_count, thread_count, kernel_count,
+        block_times, middle)
+    return max(int(size / plugin_count / job_size), 1)
+
+def add_arguments(parser):
+    """Adds the arguments describing a synthetic scenario to an
+    argparse.ArgumentParser."""
+    parser.add_argument("--plugins", type=int, default=2,
+        help="The number of plugins (result files) in the scenario.")
+    parser.add_argument("--kernels", type=int, default=1,
+        help="The number of kernels in each job.")
+    parser.add_argument("--blocks", type=int, default=1024,
+        help="The number of blocks in each kernel.")
+    parser.add_argument("--threads", type=int, default=256,
+        help="The number of threads in each block.")
+    parser.add_argument("--block_times", action="store_true",
+        help="Include the times of every block, as if the config didn't "+
+            "set omit_block_times.")
+    parser.add_argument("--mean_ms", type=float, default=5.0,
+        help="The mean duration of each job, in milliseconds.")
+    parser.add_argument("--seed", type=int, default=0,
+        help="The random seed. The same seed produces the same files.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("directory", help="The directory to write files to.")
+    parser.add_argument("--name", default="Synthetic Scenario",
+        help="The scenario name.")
+    parser.add_argument("--duration", type=float, default=None,
+        help="The number of (simulated) seconds the scenario runs for.")
+    parser.add_argument("--size", type=float, default=None,
+        help="The approximate total size of the files, in MB. Used instead "+
+            "of --duration.")
+    add_arguments(parser)
+    args = parser.parse_args()
+    if (args.duration is None) == (args.size is None):
+        print("Exactly one of --duration or --size must be given.")
+        exit(1)
+    if args.duration is not None:
+        job_count = max(int(args.duration /
+            (args.mean_ms / 1000.0 + JOB_GAP)), 1)
+    else:
+        job_count = get_job_count(args.size * 1e6, args.plugins,
+            args.blocks, args.threads, args.kernels, args.block_times,
+            args.mean_ms)
+    for name in write_scenario(args.directory, args.name, args.plugins,
+        job_count, args.blocks, args.threads, args.kernels, args.block_times,
+        args.mean_ms, args.seed):
+        print("Wrote %s (%.1f MB)" % (name, os.path.getsize(name) / 1e6))
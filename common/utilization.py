@@ -0,0 +1,107 @@
+# This module computes how much of the GPU a set of blocks actually used over
+# time, from the block start and end events in a BlockIndex. Result files don't
+# record which compute unit (CU) each block ran on, so usage is measured
+# relative to the capacity of the CUs a plugin was allowed to use: the number
+# of CUs times the header's "threads_per_compute_unit".
+import numpy
+
+from common import intervals
+
+def get_block_events(index):
+    """Takes a BlockIndex and returns a list of three numpy arrays: the time of
+    every block start and end event, the change in the number of running
+    threads at each event, and the change in the number of running blocks at
+    each event (1 or -1). Events are sorted as described in
+    intervals.sort_events."""
+    return intervals.get_interval_events(index.starts, index.ends,
+        index.thread_counts)
+
+def merge_block_events(all_events):
+    """Takes a list of event lists returned by get_block_events and returns a
+    single event list containing all of them, sorted in the same way."""
+    return intervals.sort_events(all_events)
+
+def get_capacity(header, cu_count=None):
+    """Returns the maximum number of threads that can run at once on the
+    given number of CUs, according to a result file's header. Uses the
+    header's "compute_unit_count" if cu_count is None."""
+    if cu_count is None:
+        cu_count = header["compute_unit_count"]
+    return cu_count * header["threads_per_compute_unit"]
+
+def summarize_events(events, capacity, start_time=None, end_time=None):
+    """Takes block events, as returned by get_block_events, and the number of
+    threads that can run at once, and returns a dict of statistics about the
+    window from start_time to end_time (by default, from the first event to
+    the last). The dict contains:
+
+     - "duration": The length of the window.
+     - "mean_threads" and "max_threads": The time-weighted average, and the
+       maximum, number of threads running during the window.
+     - "occupancy" and "max_occupancy": mean_threads and max_threads as a
+       fraction of the capacity.
+     - "busy_fraction": The fraction of the window during which any block was
+       running.
+     - "idle_gap_count", "idle_time" and "max_idle_gap": The number of
+       separate periods during which no blocks were running, their total
+       length, and the length of the longest one.
+     - "mean_blocks": The time-weighted average number of blocks running.
+     - "blocks_histogram": A numpy array where element i is the fraction of
+       the window during which exactly i blocks were running.
+    """
+    times, thread_deltas, block_deltas = events
+    if start_time is None:
+        start_time = times[0]
+    if end_time is None:
+        end_time = times[-1]
+    if end_time <= start_time:
+        raise Exception("Can't summarize an empty window")
+    # Segment i runs from boundaries[i] to boundaries[i + 1], with
+    # thread_counts[i] threads running. Nothing is running before the first
+    # event, and segments outside of the window are clipped to zero length.
+    boundaries = numpy.empty(len(times) + 2)
+    boundaries[0] = start_time
+    boundaries[1:-1] = numpy.clip(times, start_time, end_time)
+    boundaries[-1] = end_time
+    durations = numpy.diff(boundaries)
+    thread_counts = numpy.zeros(len(times) + 1, dtype=numpy.int64)
+    numpy.cumsum(thread_deltas, out=thread_counts[1:])
+    block_counts = numpy.zeros(len(times) + 1, dtype=numpy.int64)
+    numpy.cumsum(block_deltas, out=block_counts[1:])
+    total_time = end_time - start_time
+    in_window = durations > 0
+    mean_threads = numpy.dot(thread_counts, durations) / total_time
+    max_threads = 0
+    if in_window.any():
+        max_threads = int(thread_counts[in_window].max())
+
+    # Merge consecutive idle segments (which may be separated by zero-length
+    # segments) into gaps, and sum the length of each gap.
+    idle = (thread_counts == 0) | ~in_window
+    idle_segments = numpy.nonzero(idle)[0]
+    gap_lengths = numpy.zeros(0)
+    if len(idle_segments) > 0:
+        gap_starts = numpy.ones(len(idle_segments), dtype=bool)
+        gap_starts[1:] = numpy.diff(idle_segments) > 1
+        gap_lengths = numpy.add.reduceat(durations[idle_segments],
+            numpy.nonzero(gap_starts)[0])
+        gap_lengths = gap_lengths[gap_lengths > 0]
+    idle_time = gap_lengths.sum()
+    max_idle_gap = 0.0
+    if len(gap_lengths) > 0:
+        max_idle_gap = gap_lengths.max()
+
+    blocks_histogram = numpy.bincount(block_counts, weights=durations)
+    return {
+        "duration": total_time,
+        "mean_threads": mean_threads,
+        "max_threads": max_threads,
+        "occupancy": mean_threads / capacity,
+        "max_occupancy": max_threads / capacity,
+        "busy_fraction": 1.0 - (idle_time / total_time),
+        "idle_gap_count": len(gap_lengths),
+        "idle_time": idle_time,
+        "max_idle_gap": max_idle_gap,
+        "mean_blocks": numpy.dot(block_counts, durations) / total_time,
+        "blocks_histogram": blocks_histogram / total_time,
+    }
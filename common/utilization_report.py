@@ -0,0 +1,179 @@
+# This script prints, for each scenario in a directory of result files, how
+# much of the GPU's capacity each plugin (and all of the plugins together)
+# used while any of the scenario's blocks were running. See utilization.py for
+# a description of each statistic. Times are in the same units as the files'
+# "block_times".
+#
+# Each plugin's capacity is based on the CUs it was limited to. The CU mask
+# is taken from the file's name for files written by test_cu_mask.py, or from
+# the manifest of an experiment matrix given with --matrix (e.g. for the
+# worst-case experiment's files). Other plugins are assumed to have used the
+# entire GPU. The row combining all of the plugins uses the union of their
+# masks.
+#
+# Usage: python utilization_report.py [-d results directory] [options]
+import argparse
+import glob
+import importlib.util
+import os
+import sys
+
+# This script lives in the common/ directory, so add the directory above it to
+# the module search path, as the other scripts do.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import block_index
+from common import cu_mask
+from common import experiment_matrix
+from common import parallel
+from common import result_trace
+from common import utilization
+
+def summarize_file(filename):
+    """Takes the name of a result file and returns a dict containing the
+    "filename", the file's "header" fields, the number of blocks
+    ("block_count"), and its block "events", as returned by
+    utilization.get_block_events. This is run in worker processes."""
+    trace = result_trace.load_trace(filename)
+    index = block_index.build_block_index(trace)
+    return {
+        "filename": filename,
+        "header": trace.get_header(),
+        "block_count": index.get_block_count(),
+        "events": utilization.get_block_events(index),
+    }
+
+def load_file_masks(script_path):
+    """Takes the path to an experiment script defining get_matrix(), such as
+    worst_case_experiment.py, and returns a dict mapping the names of its
+    result files to their CU masks, as returned by
+    experiment_matrix.get_file_masks."""
+    spec = importlib.util.spec_from_file_location("experiment_script",
+        script_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return experiment_matrix.get_file_masks(module.get_matrix())
+
+def get_file_mask(filename, header, file_masks=None):
+    """Returns the CU mask bitset the plugin in the given result file was
+    limited to. The mask is parsed from the names of files written by
+    test_cu_mask.py, or looked up by the file's name in file_masks (as
+    returned by load_file_masks), if it's given. Otherwise, the plugin is
+    assumed to have used every CU in the header's "compute_unit_count"."""
+    parsed = cu_mask.parse_mask_filename(filename)
+    if parsed is not None:
+        return parsed["mask"]
+    if file_masks is not None:
+        mask = file_masks.get(os.path.basename(filename))
+        if mask is not None:
+            return mask
+    return cu_mask.get_range_mask(0, header["compute_unit_count"])
+
+def get_mask_capacity(summary, mask):
+    """Returns the number of threads that can run at once on the CUs enabled
+    by the mask, on the GPU the summary's file was recorded on."""
+    return utilization.get_capacity(summary["header"],
+        cu_mask.get_cu_count(mask))
+
+def get_plugin_name(summary):
+    header = summary["header"]
+    if "label" in header:
+        return header["label"]
+    return header["plugin_name"]
+
+def print_row(name, block_count, stats):
+    print("%-30s%10d%11.1f%%%11.1f%%%11.1f%%%8d%12.4f%12.4f%10.2f" % (
+        name[-30:], block_count, stats["occupancy"] * 100.0,
+        stats["max_occupancy"] * 100.0, stats["busy_fraction"] * 100.0,
+        stats["idle_gap_count"], stats["idle_time"], stats["max_idle_gap"],
+        stats["mean_blocks"]))
+
+def print_histogram(stats):
+    """Prints the fraction of time spent with each number of blocks running,
+    skipping numbers that never occurred."""
+    histogram = stats["blocks_histogram"]
+    for i in range(len(histogram)):
+        if histogram[i] > 0:
+            print("    %6d blocks: %6.2f%%" % (i, histogram[i] * 100.0))
+
+def print_scenario(name, summaries, show_histograms):
+    """Prints the utilization table for one scenario. Every plugin is
+    summarized over the same window: from the first block start to the last
+    block end in any of the scenario's files. Each summary must contain the
+    CU "mask" its plugin was limited to."""
+    summaries = [s for s in summaries if s["block_count"] > 0]
+    print("Scenario: " + name)
+    if len(summaries) == 0:
+        print("  (no block times)\n")
+        return
+    all_events = utilization.merge_block_events([s["events"]
+        for s in summaries])
+    start_time = all_events[0][0]
+    end_time = all_events[0][-1]
+    all_cus = 0
+    for s in summaries:
+        all_cus |= s["mask"]
+    capacity = get_mask_capacity(summaries[0], all_cus)
+    print("Window length: %f, capacity: %d threads on %d CUs" % (
+        end_time - start_time, capacity, cu_mask.get_cu_count(all_cus)))
+    print("%-30s%10s%12s%12s%12s%8s%12s%12s%10s" % ("Plugin", "Blocks",
+        "Occupancy", "Peak", "Busy", "Gaps", "Idle time", "Max gap",
+        "Mean blks"))
+    rows = []
+    for s in sorted(summaries, key=get_plugin_name):
+        stats = utilization.summarize_events(s["events"],
+            get_mask_capacity(s, s["mask"]), start_time, end_time)
+        rows.append((get_plugin_name(s), s["block_count"], stats))
+    if len(summaries) > 1:
+        stats = utilization.summarize_events(all_events, capacity,
+            start_time, end_time)
+        total_blocks = sum([s["block_count"] for s in summaries])
+        rows.append(("All plugins", total_blocks, stats))
+    for name, block_count, stats in rows:
+        print_row(name, block_count, stats)
+        if show_histograms:
+            print_histogram(stats)
+    print("")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-d", "--directory", default=".",
+        help="Directory containing result JSON files.")
+    parser.add_argument("--matrix", default=None,
+        help="An experiment script defining get_matrix(), e.g. "+
+            "worst_case_experiment/worst_case_experiment.py. The CU masks "+
+            "of the files it lists are looked up in its manifest.")
+    parser.add_argument("--cu_count", type=int, default=None,
+        help="Overrides every plugin's CU mask, limiting them to the first "+
+            "cu_count CUs.")
+    parser.add_argument("--cu_mask", default=None,
+        help="Overrides every plugin's CU mask with the given one, as a "+
+            "string of 0s and 1s or a hexadecimal number starting with 0x. "+
+            "Overrides --cu_count.")
+    parser.add_argument("--histograms", action="store_true",
+        help="Also print the fraction of time spent with each number of "+
+            "blocks running.")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+        help="The number of processes to use when parsing result files.")
+    args = parser.parse_args()
+    override_mask = None
+    if args.cu_mask is not None:
+        override_mask = cu_mask.parse_mask(args.cu_mask)
+    elif args.cu_count is not None:
+        override_mask = cu_mask.get_range_mask(0, args.cu_count)
+    file_masks = None
+    if args.matrix is not None:
+        file_masks = load_file_masks(args.matrix)
+    filenames = sorted(glob.glob(os.path.join(args.directory, "*.json")))
+    scenarios = {}
+    for summary in parallel.map_in_processes(summarize_file,
+        [(name,) for name in filenames], args.jobs):
+        summary["mask"] = override_mask
+        if override_mask is None:
+            summary["mask"] = get_file_mask(summary["filename"],
+                summary["header"], file_masks)
+        name = summary["header"].get("scenario_name", "")
+        if name not in scenarios:
+            scenarios[name] = []
+        scenarios[name].append(summary)
+    for name in scenarios:
+        print_scenario(name, scenarios[name], args.histograms)
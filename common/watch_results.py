@@ -0,0 +1,98 @@
+# This script follows one or more result files while hip_plugin_framework is
+# still writing them, and periodically prints a table of statistics for each
+# file, so you can see when the numbers have converged and stop a run early.
+# Only a fixed amount of memory is used per file, no matter how long the run.
+#
+# Usage: python watch_results.py [options] <result file> [<result file> ...]
+import argparse
+import numpy
+import os
+import sys
+import threading
+
+# This script lives in the common/ directory, so add the directory above it to
+# the module search path, as the other scripts do.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import online_stats
+from common import result_loader
+
+# The percentiles to print, in addition to the min, max, mean and std. dev.
+PERCENTILES = [50, 90, 99, 99.9]
+
+def get_record_durations(record, times_key):
+    """Returns a list of the durations of every start/end pair in the record's
+    times for the given key, converted to milliseconds."""
+    times = record[times_key]
+    to_return = []
+    for i in range(0, len(times) - 1, 2):
+        to_return.append((times[i + 1] - times[i]) * 1000.0)
+    return to_return
+
+def follow_file(filename, times_key, accumulator, lock, timeout):
+    """Adds the durations from each record in the given file to the
+    accumulator as they're written. Intended to be run in its own thread."""
+    records = result_loader.follow_times(filename, [times_key],
+        timeout=timeout)
+    for record in records:
+        durations = get_record_durations(record, times_key)
+        with lock:
+            accumulator.add_array(numpy.asarray(durations))
+
+def print_table(names, accumulators, lock):
+    """Prints a row of statistics (in milliseconds) for each accumulator, plus
+    a row combining all of them if there's more than one."""
+    columns = ["Samples", "Min", "Max", "Mean", "Std. Dev."]
+    for p in PERCENTILES:
+        columns.append("p%g" % (p))
+    print("%-40s" % ("File",) + "".join(["%12s" % (c) for c in columns]))
+    total = online_stats.OnlineStats()
+    rows = []
+    with lock:
+        for a in accumulators:
+            total.merge(a)
+        rows = list(zip(names, accumulators))
+        if len(accumulators) > 1:
+            rows.append(("All files", total))
+        for name, a in rows:
+            if a.count == 0:
+                print("%-40s%12d" % (name[-40:], 0))
+                continue
+            values = [a.minimum, a.maximum, a.mean, a.get_std()]
+            values += a.get_percentiles(PERCENTILES)
+            print("%-40s%12d" % (name[-40:], a.count) +
+                "".join(["%12.3f" % (v) for v in values]))
+    print("")
+
+def watch_files(filenames, times_key, interval, timeout):
+    """Follows every file in a separate thread, printing the table every
+    interval seconds until all of the files are complete (or timed out)."""
+    lock = threading.Lock()
+    accumulators = []
+    threads = []
+    for name in filenames:
+        a = online_stats.OnlineStats()
+        accumulators.append(a)
+        t = threading.Thread(target=follow_file,
+            args=(name, times_key, a, lock, timeout), daemon=True)
+        t.start()
+        threads.append(t)
+    while True:
+        for t in threads:
+            t.join(interval / len(threads))
+        print_table(filenames, accumulators, lock)
+        if not any([t.is_alive() for t in threads]):
+            break
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("filenames", nargs="+",
+        help="The result JSON files to watch. They don't need to exist yet.")
+    parser.add_argument("-k", "--times_key", default="execute_times",
+        help="JSON key name for the time property to summarize.")
+    parser.add_argument("--interval", type=float, default=2.0,
+        help="The number of seconds between printing updated statistics.")
+    parser.add_argument("--timeout", type=float, default=30.0,
+        help="Stop following a file if it hasn't changed for this many "+
+            "seconds.")
+    args = parser.parse_args()
+    watch_files(args.filenames, args.times_key, args.interval, args.timeout)
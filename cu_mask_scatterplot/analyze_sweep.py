@@ -0,0 +1,299 @@
+# This script analyzes a CU-mask sweep: the result files written by
+# hip_plugin_framework/scripts/test_cu_mask.py, one per stripe width and
+# number of CUs. Rather than plotting each file's mean, as view_scatterplots.py
+# does, it collects every file's statistics into a single numpy array, indexed
+# by [stripe width, CU count, statistic], and reports, for each stripe width
+# (i.e., way of packing the CUs into shader engines):
+#
+#  - An Amdahl's-law fit of the mean time vs. the number of CUs,
+#    time(n) = serial + parallel / n. The parallel fraction is the fraction of
+#    the time on one CU that's spread across the CUs, and the maximum speedup
+#    is the speedup with infinitely many CUs.
+#
+#  - The speedup at each CU count, relative to the smallest CU count, and the
+#    marginal speedup gained by each added CU.
+#
+# The sweep can be saved as a baseline (--save_baseline), and compared to a
+# previous baseline (--baseline). Any point whose statistic moved further than
+# the noise threshold is reported, and the script then exits with status 1,
+# so it can be used to check nightly sweeps for regressions.
+#
+# Usage: python analyze_sweep.py [-d directory] [--baseline file]
+#     [--save_baseline file] [options]
+import argparse
+import glob
+import json
+import math
+import numpy
+import os
+import sys
+# The shared modules live in the common/ directory at the top of this repo.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import cu_mask
+from common import intervals
+from common import parallel
+from common import result_trace
+from common import stats
+
+# The statistics stored for each file, in the order of the sweep array's last
+# axis. Times are in milliseconds.
+STATISTICS = ["count", "min", "max", "mean", "median", "std"]
+
+# The statistics that have a standard error, which is included in the noise
+# threshold when comparing to a baseline. The median's uses the mean's, which
+# underestimates it somewhat.
+STANDARD_ERROR_STATISTICS = ["mean", "median"]
+
+def summarize_file(filename, times_key):
+    """Takes the name of a file written by test_cu_mask.py and returns a dict
+    containing its "filename", "stripe_width", "cu_count", and the "values"
+    of each statistic in STATISTICS. If the file can't be used, the dict
+    contains a "skip_reason" instead. This is run in worker processes."""
+    to_return = {"filename": filename}
+    mask_info = cu_mask.parse_mask_filename(filename)
+    if mask_info is None:
+        to_return["skip_reason"] = "name doesn't contain a CU mask."
+        return to_return
+    durations = intervals.get_durations(result_trace.load_trace(filename),
+        times_key)
+    if len(durations) == 0:
+        to_return["skip_reason"] = "no recorded times in file."
+        return to_return
+    summary = intervals.summarize_durations(durations)
+    to_return["stripe_width"] = mask_info["stripe_width"]
+    to_return["cu_count"] = mask_info["cu_count"]
+    values = []
+    for k in STATISTICS:
+        if k == "count":
+            values.append(float(summary[k]))
+        else:
+            values.append(float(summary[k]) * 1000.0)
+    to_return["values"] = values
+    return to_return
+
+def build_sweep(summaries):
+    """Takes a list of dicts returned by summarize_file, and returns a dict
+    describing the sweep, containing sorted numpy arrays of the
+    "stripe_widths" and "cu_counts", the "statistics" names, and the
+    "values": a numpy array with shape (stripe width count, CU count count,
+    statistic count). Values that weren't in any file are NaN. Raises an
+    exception if two files have the same stripe width and CU count."""
+    summaries = [s for s in summaries if "skip_reason" not in s]
+    stripe_widths = numpy.unique([s["stripe_width"] for s in summaries])
+    cu_counts = numpy.unique([s["cu_count"] for s in summaries])
+    values = numpy.full((len(stripe_widths), len(cu_counts),
+        len(STATISTICS)), numpy.nan)
+    for s in summaries:
+        i = numpy.searchsorted(stripe_widths, s["stripe_width"])
+        j = numpy.searchsorted(cu_counts, s["cu_count"])
+        if not numpy.isnan(values[i, j, 0]):
+            raise Exception("More than one file has stripe width %d and %d "
+                "CUs, including %s" % (s["stripe_width"], s["cu_count"],
+                s["filename"]))
+        values[i, j] = s["values"]
+    return {
+        "stripe_widths": stripe_widths,
+        "cu_counts": cu_counts,
+        "statistics": list(STATISTICS),
+        "values": values,
+    }
+
+def get_statistic(sweep, name):
+    """Returns a (stripe width count, CU count count) numpy array containing
+    the given statistic from the sweep."""
+    return sweep["values"][:, :, sweep["statistics"].index(name)]
+
+def fit_amdahl(cu_counts, times):
+    """Takes numpy arrays of CU counts and the corresponding times, and fits
+    time(n) = serial + parallel / n, using least squares. NaN times are
+    ignored. Returns a dict containing the "serial" and "parallel" times, the
+    "parallel_fraction" of the fitted time on one CU, the "max_speedup" over
+    one CU (infinite if the serial time isn't positive), and "r_squared".
+    Returns None if there are fewer than two points."""
+    valid = ~numpy.isnan(times)
+    n = cu_counts[valid].astype(numpy.float64)
+    y = times[valid]
+    if len(y) < 2:
+        return None
+    a = numpy.stack((numpy.ones(len(n)), 1.0 / n), axis=1)
+    coefficients = numpy.linalg.lstsq(a, y, rcond=None)[0]
+    serial, parallel_time = coefficients
+    residuals = y - a.dot(coefficients)
+    total = numpy.square(y - y.mean()).sum()
+    r_squared = 1.0
+    if total > 0.0:
+        r_squared = 1.0 - numpy.square(residuals).sum() / total
+    one_cu = serial + parallel_time
+    max_speedup = math.inf
+    if serial > 0.0:
+        max_speedup = one_cu / serial
+    return {
+        "serial": float(serial),
+        "parallel": float(parallel_time),
+        "parallel_fraction": float(parallel_time / one_cu),
+        "max_speedup": float(max_speedup),
+        "r_squared": float(r_squared),
+    }
+
+def get_speedups(cu_counts, times):
+    """Takes numpy arrays of CU counts and times (possibly containing NaNs),
+    and returns a list of two numpy arrays, with one element per CU count:
+    the speedup over the time with the smallest CU count, and the marginal
+    speedup per CU added since the previous CU count. The marginal speedup is
+    NaN for the first CU count, and anywhere a time is missing."""
+    speedups = numpy.full(len(times), numpy.nan)
+    marginal = numpy.full(len(times), numpy.nan)
+    valid = numpy.flatnonzero(~numpy.isnan(times))
+    if len(valid) == 0:
+        return [speedups, marginal]
+    speedups[valid] = times[valid[0]] / times[valid]
+    marginal[valid[1:]] = numpy.diff(speedups[valid]) / numpy.diff(
+        cu_counts[valid])
+    return [speedups, marginal]
+
+def save_baseline(sweep, filename):
+    """Saves the sweep to the given JSON file, to be compared against by
+    later runs. Missing values are saved as null."""
+    values = sweep["values"].tolist()
+    for plane in values:
+        for row in plane:
+            for i in range(len(row)):
+                if math.isnan(row[i]):
+                    row[i] = None
+    to_save = {
+        "stripe_widths": sweep["stripe_widths"].tolist(),
+        "cu_counts": sweep["cu_counts"].tolist(),
+        "statistics": sweep["statistics"],
+        "values": values,
+    }
+    with open(filename, "w") as f:
+        json.dump(to_save, f)
+
+def load_baseline(filename):
+    """Loads a sweep saved by save_baseline."""
+    with open(filename) as f:
+        loaded = json.load(f)
+    return {
+        "stripe_widths": numpy.array(loaded["stripe_widths"]),
+        "cu_counts": numpy.array(loaded["cu_counts"]),
+        "statistics": loaded["statistics"],
+        "values": numpy.array(loaded["values"], dtype=numpy.float64),
+    }
+
+def _get_standard_errors(sweep):
+    """Returns a numpy array of the standard error of the mean at every point
+    in the sweep."""
+    return get_statistic(sweep, "std") / numpy.sqrt(get_statistic(sweep,
+        "count"))
+
+def find_deviations(sweep, baseline, statistic, threshold, confidence):
+    """Compares the given statistic at every stripe width and CU count in both
+    the sweep and the baseline. A point deviates if it differs from the
+    baseline by more than the threshold (relative to the baseline), and, for
+    statistics in STANDARD_ERROR_STATISTICS, by more than the combined
+    standard errors of both values at the given confidence. Returns a list of
+    dicts describing each deviation, containing its "stripe_width",
+    "cu_count", the "baseline" and "current" values, and the relative
+    "change"."""
+    stripe_widths, sweep_i, baseline_i = numpy.intersect1d(
+        sweep["stripe_widths"], baseline["stripe_widths"],
+        return_indices=True)
+    cu_counts, sweep_j, baseline_j = numpy.intersect1d(sweep["cu_counts"],
+        baseline["cu_counts"], return_indices=True)
+    index = numpy.ix_(sweep_i, sweep_j)
+    baseline_index = numpy.ix_(baseline_i, baseline_j)
+    current = get_statistic(sweep, statistic)[index]
+    previous = get_statistic(baseline, statistic)[baseline_index]
+    difference = numpy.abs(current - previous)
+    allowed = threshold * numpy.abs(previous)
+    if statistic in STANDARD_ERROR_STATISTICS:
+        noise = stats.get_z_score(confidence) * numpy.sqrt(
+            numpy.square(_get_standard_errors(sweep)[index]) +
+            numpy.square(_get_standard_errors(baseline)[baseline_index]))
+        allowed = numpy.maximum(allowed, noise)
+    # Comparisons with NaN are False, so missing points are never flagged.
+    to_return = []
+    for i, j in zip(*numpy.nonzero(difference > allowed)):
+        to_return.append({
+            "stripe_width": int(stripe_widths[i]),
+            "cu_count": int(cu_counts[j]),
+            "baseline": float(previous[i, j]),
+            "current": float(current[i, j]),
+            "change": float((current[i, j] - previous[i, j]) / previous[i, j]),
+        })
+    return to_return
+
+def print_analysis(sweep):
+    """Prints the Amdahl's-law fit, and a table of the mean time and speedups
+    at each CU count, for each stripe width in the sweep."""
+    cu_counts = sweep["cu_counts"]
+    means = get_statistic(sweep, "mean")
+    for i in range(len(sweep["stripe_widths"])):
+        print("Stripe width %d:" % (sweep["stripe_widths"][i]))
+        fit = fit_amdahl(cu_counts, means[i])
+        if fit is None:
+            print("  Not enough CU counts to fit a scaling model.")
+        else:
+            print("  Fit: time = %.3f + %.3f / CUs ms, parallel fraction "
+                "%.4f, max speedup %.2f, R^2 %.4f" % (fit["serial"],
+                fit["parallel"], fit["parallel_fraction"],
+                fit["max_speedup"], fit["r_squared"]))
+        speedups, marginal = get_speedups(cu_counts, means[i])
+        print("  %6s %12s %10s %14s" % ("CUs", "Mean (ms)", "Speedup",
+            "Marginal/CU"))
+        for j in range(len(cu_counts)):
+            if numpy.isnan(means[i, j]):
+                continue
+            print("  %6d %12.3f %10.3f %14.4f" % (cu_counts[j], means[i, j],
+                speedups[j], marginal[j]))
+        print("")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-d", "--directory", default=".",
+        help="Directory containing the result JSON files.")
+    parser.add_argument("-k", "--times_key", default="execute_times",
+        help="JSON key name for the times to analyze.")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+        help="The number of processes to use when parsing result files.")
+    parser.add_argument("--baseline", default=None,
+        help="A baseline saved by a previous run, using --save_baseline, to "+
+            "compare this sweep against.")
+    parser.add_argument("--save_baseline", default=None,
+        help="Save this sweep to the given file, as a baseline for later "+
+            "runs.")
+    parser.add_argument("--statistic", default="mean", choices=STATISTICS[1:],
+        help="The statistic to compare against the baseline.")
+    parser.add_argument("--threshold", type=float, default=0.05,
+        help="The relative change from the baseline, e.g. 0.05 for 5%%, "+
+            "beyond which a point is reported.")
+    parser.add_argument("--confidence", type=float, default=0.99,
+        help="Changes in the mean or median must also be outside this "+
+            "confidence interval, based on both sweeps' standard errors.")
+    args = parser.parse_args()
+    filenames = sorted(glob.glob(os.path.join(args.directory, "*.json")))
+    summaries = []
+    for summary in parallel.map_in_processes(summarize_file,
+        [(name, args.times_key) for name in filenames], args.jobs):
+        if "skip_reason" in summary:
+            print("Skipping %s: %s" % (summary["filename"],
+                summary["skip_reason"]))
+        summaries.append(summary)
+    sweep = build_sweep(summaries)
+    print_analysis(sweep)
+    if args.save_baseline is not None:
+        save_baseline(sweep, args.save_baseline)
+        print("Saved the baseline to " + args.save_baseline)
+    if args.baseline is None:
+        exit(0)
+    deviations = find_deviations(sweep, load_baseline(args.baseline),
+        args.statistic, args.threshold, args.confidence)
+    if len(deviations) == 0:
+        print("No points changed from the baseline.")
+        exit(0)
+    print("%d points changed from the baseline:" % (len(deviations)))
+    for d in deviations:
+        print("  Stripe width %d, %d CUs: %s %.3f -> %.3f ms (%+.1f%%)" % (
+            d["stripe_width"], d["cu_count"], args.statistic, d["baseline"],
+            d["current"], d["change"] * 100.0))
+    exit(1)
@@ -1,16 +1,26 @@
 # This scripts looks through JSON result files and uses matplotlib to display
 # scatterplots containing the min, max and arithmetic mean for distributions of
-# samples. In order for a distribution to be included in a plot, its "label"
+# samples. Each file's x value is the number of CUs enabled by the CU mask in
+# its name (e.g. cu_mask_sw1_0000ffff.json). For other files, the "label"
 # field must consist of a single number (may be floating-point). As with the
 # other scripts, one plot will be created for each "name" in the output files.
+# matplotlib is only imported by the functions that draw plots, so that a
+# non-interactive backend can be selected first when saving plots to files.
 import argparse
 import copy
 import itertools
 import glob
-import json
-import matplotlib.pyplot as plot
 import numpy
+import os
 import sys
+# The shared modules live in the common/ directory at the top of this repo.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import cu_mask
+from common import intervals
+from common import parallel
+from common import plot_utils
+from common import result_cache
+from common import result_trace
 
 def convert_to_float(s):
     """Takes a string s and parses it as a floating-point number. If s can not
@@ -23,32 +33,19 @@ def convert_to_float(s):
     return to_return
 
 def plugin_summary_values(plugin, times_key):
-    """Takes a single plugin results (one parsed output file) and returns
-    a list containing 3 elements: [min duration, max duration, mean duration].
-    Durations are converted to milliseconds."""
-    durations = []
-    for t in plugin["times"]:
-        if times_key not in t:
-            continue
-        times = t[times_key]
-        i = 0
-        while i < len(times):
-            duration = times[i + 1] - times[i]
-            durations.append(duration)
-            i += 2
-    minimum = min(durations) * 1000.0
-    maximum = max(durations) * 1000.0
-    average = numpy.mean(durations) * 1000.0
-    return [minimum, maximum, average]
+    """Takes a single plugin result (a result_trace.Trace)
+    and returns a list containing 3 elements: [min duration, max duration,
+    mean duration]. Durations are converted to milliseconds."""
+    durations = intervals.get_durations(plugin, times_key)
+    summary = intervals.summarize_durations(durations)
+    return [summary["min"] * 1000.0, summary["max"] * 1000.0,
+        summary["mean"] * 1000.0]
 
 def scenario_to_distribution(scenario):
     """Takes a scenario, mapping numbers to triplets, and re-shapes the data.
     Returns an array of 4 arrays: [[x values], [min y values], [max y values],
     [average y values]]."""
-    x_values = []
-    for k in scenario:
-        x_values.append(k)
-    x_values.sort()
+    x_values = sorted(scenario)
     min_y_values = []
     max_y_values = []
     mean_y_values = []
@@ -100,6 +97,7 @@ def get_marker_styles():
     return [style_2, base_style]
 
 def add_scenario_to_plot(axes, scenario, name, style_dict):
+    import matplotlib.pyplot as plot
     data = scenario_to_distribution(scenario)
     # data[0] = x vals, data[1] = min, data[2] = max, data[3] = avg
     if "stripe width" in name:
@@ -114,49 +112,113 @@ def add_scenario_to_plot(axes, scenario, name, style_dict):
     legend.set_draggable(True)
     return None
 
-def show_plots(filenames, times_key):
-    """ Takes a list of filenames and generates one plot. This differs from the
-    hip_plugin_framework script in that it only generates a single plot,
-    containing only the average times. It will show one distribution per named
-    scenario in the files. """
+def summarize_file(filename, times_key):
+    """Takes the name of a result file and returns a dict summarizing it. The
+    dict always contains a "filename" field, and a "cached" field, which is
+    True if the file was loaded from its cache rather than parsed. If the file
+    can't be plotted, it
+    will contain a "skip_reason" field explaining why. Otherwise, it will
+    contain the "scenario_name", the "x_value" (the number of CUs in the CU
+    mask in the file's name, or else the number in the file's label),
+    and the "summary_values" returned by plugin_summary_values. This is run in
+    worker processes, so it only returns the small amount of data needed for
+    the plot."""
+    to_return = {"filename": filename,
+        "cached": result_cache.is_cached(filename)}
+    parsed = result_trace.load_trace(filename)
+    if parsed.record_count < 2:
+        to_return["skip_reason"] = "no recorded times in file."
+        return to_return
+    # Files written by test_cu_mask.py contain their CU mask in their name, so
+    # use the number of CUs it actually enables.
+    mask_info = cu_mask.parse_mask_filename(filename)
+    if mask_info is not None:
+        float_value = float(mask_info["cu_count"])
+    elif parsed.label is None:
+        to_return["skip_reason"] = "no \"label\" field in file."
+        return to_return
+    else:
+        float_value = convert_to_float(parsed.label)
+    if float_value is None:
+        to_return["skip_reason"] = "label isn't a number."
+        return to_return
+    to_return["scenario_name"] = parsed.scenario_name
+    to_return["x_value"] = float_value
+    to_return["summary_values"] = plugin_summary_values(parsed, times_key)
+    return to_return
+
+def group_summaries(summaries):
+    """ Takes a list of summaries returned by summarize_file, and returns a
+    dict mapping each scenario name to a dict of x values to y-value triplets.
+    Prints a message for each file that's skipped. """
     # Maps plugin names to plugin data, where the plugin data is a map
     # of X-values to y-value triplets.
     all_scenarios = {}
-    counter = 1
-    for name in filenames:
-        print("Parsing file %d / %d: %s" % (counter, len(filenames), name))
-        counter += 1
-        with open(name) as f:
-            parsed = json.loads(f.read())
-            if "label" not in parsed:
-                print("Skipping %s: no \"label\" field in file." % (name))
-                continue
-            if len(parsed["times"]) < 2:
-                print("Skipping %s: no recorded times in file." % (name))
-                continue
-            float_value = convert_to_float(parsed["label"])
-            if float_value is None:
-                print("Skipping %s: label isn't a number." % (name))
-                continue
-            summary_values = plugin_summary_values(parsed, times_key)
-            name = parsed["scenario_name"]
-            if name not in all_scenarios:
-                all_scenarios[name] = {}
-            all_scenarios[name][float_value] = summary_values
+    for summary in summaries:
+        name = summary["filename"]
+        if "skip_reason" in summary:
+            print("Skipping %s: %s" % (name, summary["skip_reason"]))
+            continue
+        name = summary["scenario_name"]
+        if name not in all_scenarios:
+            all_scenarios[name] = {}
+        all_scenarios[name][summary["x_value"]] = summary["summary_values"]
+    return all_scenarios
 
-    # Add each scenario to the plot.
+def summarize_files(filenames, times_key, jobs):
+    """ Returns a list of the summaries returned by summarize_file for each of
+    the files, using the given number of worker processes. Prints a message as
+    each file is summarized, saying whether it was parsed or loaded from its
+    cache. """
+    to_return = []
+    summaries = parallel.map_in_processes(summarize_file,
+        [(name, times_key) for name in filenames], jobs)
+    for summary in summaries:
+        to_return.append(summary)
+        action = "Parsed"
+        if summary["cached"]:
+            action = "Loaded cached"
+        print("%s file %d / %d: %s" % (action, len(to_return),
+            len(filenames), summary["filename"]))
+    return to_return
+
+def plot_scenarios(all_scenarios):
+    """ Takes the dict returned by group_summaries and returns a figure
+    containing one distribution per scenario. """
+    import matplotlib.pyplot as plot
     style_cycler = itertools.cycle(get_marker_styles())
     figure = plot.figure()
-    figure.canvas.set_window_title("CU partition size vs. MM1024 Time")
+    plot_utils.set_window_title(figure, "CU partition size vs. MM1024 Time")
     axes = figure.add_subplot(1, 1, 1)
     axes.autoscale(enable=True, axis='both', tight=True)
     for name in all_scenarios:
         add_scenario_to_plot(axes, all_scenarios[name], name,
             next(style_cycler))
     add_plot_padding(axes)
-    plot.subplots_adjust(bottom=0.35)
+    figure.subplots_adjust(bottom=0.35)
+    return figure
+
+def show_plots(filenames, times_key, jobs):
+    """ Takes a list of filenames and generates one plot. This differs from the
+    hip_plugin_framework script in that it only generates a single plot,
+    containing only the average times. It will show one distribution per named
+    scenario in the files. The files are parsed using the given number of
+    worker processes. """
+    import matplotlib.pyplot as plot
+    summaries = summarize_files(filenames, times_key, jobs)
+    plot_scenarios(group_summaries(summaries))
     plot.show()
 
+def save_plot(filenames, times_key, jobs, output_dir, formats):
+    """ Like show_plots, but saves the plot to output_dir in each of the given
+    formats rather than displaying it. """
+    summaries = summarize_files(filenames, times_key, jobs)
+    figure = plot_scenarios(group_summaries(summaries))
+    paths = plot_utils.save_figure(figure, output_dir,
+        "cu_partition_size_vs_mm1024_time", formats)
+    for path in paths:
+        print("Saved " + path)
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("-d", "--directory",
@@ -164,7 +226,15 @@ if __name__ == "__main__":
     parser.add_argument("-k", "--times_key",
         help="JSON key name for the time property to be plot.",
         default="execute_times")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+        help="The number of processes to use when parsing result files.")
+    plot_utils.add_output_arguments(parser)
     args = parser.parse_args()
     filenames = glob.glob(args.directory + "/*.json")
-    show_plots(filenames, args.times_key)
+    if args.output_dir is None:
+        show_plots(filenames, args.times_key, args.jobs)
+    else:
+        plot_utils.use_headless_backend()
+        save_plot(filenames, args.times_key, args.jobs, args.output_dir,
+            plot_utils.parse_formats(args.format))
 
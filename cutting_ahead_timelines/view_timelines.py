@@ -2,224 +2,226 @@
 # timeline indicating when blocks and threads from multiple jobs were run on
 # GPU. For this to work, all result filenames must end in .json.
 #
+# matplotlib is only imported by the functions that draw plots, so that a
+# non-interactive backend can be selected first when saving plots to files.
+#
 # Usage: python view_timeline.py [results directory (default: ./results)]
 import argparse
 import glob
-import json
-import matplotlib.pyplot as plot
 import numpy
+import os
 import sys
+# The shared modules live in the common/ directory at the top of this repo.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import block_index
+from common import clock_alignment
+from common import intervals
+from common import parallel
+from common import plot_utils
+from common import result_trace
+
+# The number of columns per pixel of the plot's width used when decimating
+# timelines. Using more than one keeps the lines smooth in saved PDFs, which
+# may be viewed at a higher resolution.
+DECIMATION_OVERSAMPLING = 2
 
-def get_kernel_timeline(kernel_times):
-    """Takes a single kernel invocation's information from the plugin struct
-    and returns two lists. The first list contains times, and the second list
-    contains the number of threads running at each time."""
-    block_times = kernel_times["block_times"]
-    start_times = []
-    end_times = []
-    # Split block times into start and end times.
-    for i in range(len(block_times)):
-        if (i % 2) == 0:
-            start_times.append(block_times[i])
-        else:
-            end_times.append(block_times[i])
-    # Sort times in reverse order, so the earliest times will be popped first.
-    start_times.sort(reverse = True)
-    end_times.sort(reverse = True)
-    # Initialize the timeline to return so that 0 threads are running at time
-    # 0.
-    timeline_times = []
-    timeline_values = []
-    timeline_times.append(0.0)
-    timeline_values.append(0)
-    # Next, iterate over start and end times and keep a running count of how
-    # many threads are running.
-    current_thread_count = 0
-    while True:
-        if (len(start_times) == 0) and (len(end_times) == 0):
-            break
-        if len(end_times) == 0:
-            print("Error! The last block end time was before a start time.")
-            exit(1)
-        current_time = 0.0
-        previous_thread_count = current_thread_count
-        if len(start_times) != 0:
-            # Get the next closest time, be it a start or an end time. The <=
-            # is important, since we always want increment the block count
-            # before decrementing in the case when a block starts at the same
-            # time another ends.
-            if start_times[-1] == end_times[-1]:
-                # A block started and ended at the same time, don't change the
-                # current thread count.
-                current_time = start_times.pop()
-                end_times.pop()
-            elif start_times[-1] <= end_times[-1]:
-                # A block started, so increase the thread count
-                current_time = start_times.pop()
-                current_thread_count += kernel_times["thread_count"]
-            else:
-                # A block ended, so decrease the thread count
-                current_time = end_times.pop()
-                current_thread_count -= kernel_times["thread_count"]
-        else:
-            # Only end times are left, so keep decrementing the block count.
-            current_time = end_times.pop()
-            current_thread_count -= kernel_times["thread_count"]
-        # Make sure that changes between numbers of running threads are abrupt.
-        # Do this by only changing the number of blocks at the instant they
-        # actually change rather than interpolating between two values.
-        timeline_times.append(current_time)
-        timeline_values.append(previous_thread_count)
-        # Finally, append the new thread count.
-        timeline_times.append(current_time)
-        timeline_values.append(current_thread_count)
+def get_block_events(trace):
+    """Takes a plugin's result_trace.Trace and returns three numpy arrays. The
+    first array contains the time of every block start and end event from
+    every kernel, the second contains the change in the number of running
+    threads at each event, and the third contains the change in the number of
+    running blocks. Events are sorted as described in
+    intervals.sort_events."""
+    if len(trace.block_times) == 0:
+        return intervals.sort_events([])
+    # The trace ensures that every kernel's block times contain a start and
+    # end time for each block, but its last block can't end before its last
+    # block starts.
+    blocks = trace.get_block_intervals()
+    start_times = blocks[:, 0]
+    end_times = blocks[:, 1]
+    blocks_per_kernel = trace.get_blocks_per_kernel()
+    kernel_starts = trace.block_time_offsets[:-1][blocks_per_kernel > 0] // 2
+    if numpy.any(numpy.maximum.reduceat(end_times, kernel_starts) <
+        numpy.maximum.reduceat(start_times, kernel_starts)):
+        print("Error! The last block end time was before a start time.")
+        exit(1)
+    block_thread_counts = numpy.repeat(trace.thread_counts,
+        blocks_per_kernel)
+    return intervals.get_interval_events(start_times, end_times,
+        block_thread_counts)
+
+def events_to_timeline(times, deltas):
+    """Takes sorted event times and thread-count changes, as returned by
+    get_block_events, and returns a timeline: a list of two numpy arrays
+    containing times and the number of threads running at each time. As with
+    the original per-kernel timelines, the returned timeline starts with 0
+    threads running at time 0."""
+    counts = numpy.cumsum(deltas)
+    # Multiple events may occur at the same instant. Only keep the thread count
+    # after the last of them, so each distinct time produces a single step.
+    is_last = numpy.ones(len(times), dtype=bool)
+    is_last[:-1] = times[1:] != times[:-1]
+    change_times = times[is_last]
+    counts_after = counts[is_last]
+    counts_before = numpy.zeros(len(counts_after), dtype=numpy.int64)
+    counts_before[1:] = counts_after[:-1]
+    # Make sure that changes between numbers of running threads are abrupt.
+    # Do this by adding two points at each time: one with the previous count
+    # and one with the new count.
+    timeline_times = numpy.zeros(2 * len(change_times) + 1)
+    timeline_values = numpy.zeros(2 * len(change_times) + 1, dtype=numpy.int64)
+    timeline_times[1::2] = change_times
+    timeline_times[2::2] = change_times
+    timeline_values[1::2] = counts_before
+    timeline_values[2::2] = counts_after
     return [timeline_times, timeline_values]
 
-def merge_timelines(timeline_a, timeline_b):
-    """Takes two timelines, both of which must contain a list of times and a
-    list of values, and combines them into a single timeline containing a list
-    of times and added values, so that if an interval in both timelines
-    overlap, then the returned timeline will show the sum of the two values
-    during that interval."""
-    combined_times = []
-    combined_values = []
-    # Reverse the timelines so that we pop the earliest values first.
-    times_a = timeline_a[0]
-    values_a = timeline_a[1]
-    times_b = timeline_b[0]
-    values_b = timeline_b[1]
-    times_a.reverse()
-    values_a.reverse()
-    times_b.reverse()
-    values_b.reverse()
-    # Track the a and b values independently
-    current_a_value = 0
-    current_b_value = 0
+def summarize_file(filename):
+    """Takes the name of a result file and returns a dict containing the
+    file's header fields (e.g. "scenario_name" and "label"), along with a
+    "block_events" field containing the plugin's block events, as returned by
+    get_block_events, a "block_index" field containing a BlockIndex for
+    querying which blocks were running at any time, and a "clock_alignment"
+    field for converting its block times to CPU time (None if the file
+    doesn't contain enough kernels to fit one). This is all the information
+    needed to plot the file's timeline, so this is what's sent back from
+    worker processes."""
+    trace = result_trace.load_trace(filename)
+    to_return = trace.get_header()
+    to_return["block_events"] = get_block_events(trace)
+    to_return["block_index"] = block_index.build_block_index(trace)
+    to_return["clock_alignment"] = None
+    gpu_times, cpu_times = clock_alignment.get_clock_pairs(trace)
+    if clock_alignment.can_fit_clock_alignment(gpu_times):
+        to_return["clock_alignment"] = clock_alignment.fit_clock_alignment(
+            gpu_times, cpu_times)
+    return to_return
 
-    # Returns the next time from either timeline to appended to the output.
-    def get_next_smallest_time():
-        if (len(times_a) == 0) and (len(times_b) == 0):
-            raise Exception("Internal error combining timelines.")
-        if (len(times_a) == 0):
-            return times_b[-1]
-        if (len(times_b) == 0):
-            return times_a[-1]
-        if times_a[-1] <= times_b[-1]:
-            return times_a[-1]
-        return times_b[-1]
+def get_thread_timeline(plugin):
+    """"Takes a plugin summary, as returned by summarize_file, and returns
+    timeline data consisting of a list of two numpy arrays. The first array
+    will contain times, and the second array will contain the corresponding
+    number of threads running at each time."""
+    events = plugin["block_events"]
+    return events_to_timeline(events[0], events[1])
 
-    # Run the update_output() closure until all of the original timeline values
-    # have been combined into the output.
-    while (len(times_a) > 0) or (len(times_b) > 0):
-        t = get_next_smallest_time()
-        # It's possible that both timelines have a change in value at the same
-        # time.
-        if (len(times_a) != 0) and (times_a[-1] == t):
-            times_a.pop()
-            current_a_value = values_a.pop()
-        if (len(times_b) != 0) and (times_b[-1] == t):
-            times_b.pop()
-            current_b_value = values_b.pop()
-        combined_times.append(t)
-        combined_values.append(current_a_value + current_b_value)
+def sample_timeline(timeline, times, side):
+    """Takes a timeline returned by events_to_timeline and a sorted numpy array
+    of times, and returns a numpy array containing the number of threads
+    running at each of the given times. If side is "left", this returns the
+    count just before any change occurring at each time, and if side is
+    "right", this returns the count just after it."""
+    # Every change in a timeline produces two points at the same time, so the
+    # odd-indexed points are the distinct change times and the even-indexed
+    # points after them hold the new counts.
+    change_times = timeline[0][1::2]
+    counts = numpy.zeros(len(change_times) + 1, dtype=numpy.int64)
+    counts[1:] = timeline[1][2::2]
+    return counts[numpy.searchsorted(change_times, times, side=side)]
 
-    return [combined_times, combined_values]
+def decimate_timeline(timeline, min_time, max_time, columns):
+    """Takes a timeline returned by events_to_timeline and returns a timeline
+    that looks the same when drawn between min_time and max_time at a width
+    of the given number of columns (e.g. pixels), but contains at most 3
+    points per column. The range is split into equal-width columns, and each
+    column is replaced by its envelope: the number of threads at the start of
+    the column, followed by the lowest and highest numbers of threads at any
+    point within the column. If the range contains few enough points to plot
+    directly, they're returned as-is (along with the points just outside of
+    the range, so lines still reach its edges)."""
+    times, values = timeline
+    first = numpy.searchsorted(times, min_time, side="left")
+    last = numpy.searchsorted(times, max_time, side="right")
+    if (last - first) <= (3 * columns):
+        first = max(first - 1, 0)
+        last = min(last + 1, len(times))
+        return [times[first:last], values[first:last]]
+    # Don't draw past either end of the timeline.
+    min_time = max(min_time, times[0])
+    max_time = min(max_time, times[-1])
+    edges = numpy.linspace(min_time, max_time, columns + 1)
+    # starts[i] is the index of the first point after edge i, so the points
+    # in column i are starts[i]:starts[i + 1], and the number of threads at
+    # edge i is the value of the point before starts[i].
+    starts = numpy.searchsorted(times, edges, side="right")
+    edge_values = values[numpy.maximum(starts - 1, 0)]
+    entry_values = edge_values[:-1]
+    exit_values = edge_values[1:]
+    min_values = entry_values.copy()
+    max_values = entry_values.copy()
+    not_empty = starts[1:] > starts[:-1]
+    if not_empty.any():
+        # The non-empty columns are contiguous in the values array, so each
+        # column's min and max can be found with a single reduceat.
+        column_starts = starts[:-1][not_empty]
+        in_range = values[:starts[-1]]
+        min_values[not_empty] = numpy.minimum(min_values[not_empty],
+            numpy.minimum.reduceat(in_range, column_starts))
+        max_values[not_empty] = numpy.maximum(max_values[not_empty],
+            numpy.maximum.reduceat(in_range, column_starts))
+    # Visit the column's extremes in the order that ends closest to the next
+    # column's starting value, to avoid drawing extra diagonal lines.
+    rising = exit_values >= entry_values
+    new_times = numpy.empty(3 * columns + 1)
+    new_times[:-1] = numpy.repeat(edges[:-1], 3)
+    new_times[-1] = edges[-1]
+    new_values = numpy.empty(3 * columns + 1, dtype=values.dtype)
+    new_values[0:-1:3] = entry_values
+    new_values[1:-1:3] = numpy.where(rising, min_values, max_values)
+    new_values[2:-1:3] = numpy.where(rising, max_values, min_values)
+    new_values[-1] = exit_values[-1]
+    return [new_times, new_values]
 
-def get_thread_timeline(plugin):
-    """"Takes a parsed plugin dict and returns timeline data consisting of
-    a list of two lists. The first list will contain times, and the second list
-    will contain the corresponding number of threads running at each time."""
-    # Remember, the first entry in the times array is an empty object.
-    all_kernels = plugin["times"][1:]
-    to_return = [[], []]
-    # Combine all kernels' timelines into a single timeline.
-    for k in all_kernels:
-        if "cpu_times" in k:
-            continue
-        kernel_timeline = get_kernel_timeline(k)
-        to_return = merge_timelines(to_return, kernel_timeline)
-    return to_return
+def plot_decimated_timeline(axes, timeline, **kwargs):
+    """Plots the timeline on the axes, passing any keyword arguments to
+    axes.plot, and returns the Line2D. Rather than plotting every point, the
+    timeline is decimated (see decimate_timeline) to a few points per pixel
+    of the axes' current x range, and decimated again whenever the x range
+    changes, e.g. when zooming in. The axes' limits must already be set."""
+    line = axes.plot([], [], **kwargs)[0]
+
+    def update(axes):
+        min_time, max_time = axes.get_xlim()
+        columns = max(int(axes.bbox.width * DECIMATION_OVERSAMPLING), 1)
+        decimated = decimate_timeline(timeline, min_time, max_time, columns)
+        line.set_data(decimated[0], decimated[1])
+
+    update(axes)
+    axes.callbacks.connect("xlim_changed", update)
+    return line
 
 def get_stackplot_values(plugins):
-    """Takes a list of plugin results and returns a list of lists of data
-    that can be passed as arguments to stackplot (with a single list of
-    x-values followed by multiple lists of y-values)."""
+    """Takes a list of plugin summaries and returns a list of data that can be
+    passed as arguments to stackplot: a single numpy array of x-values followed
+    by a 2-D numpy array of y-values containing one row per plugin."""
     timelines = []
     for b in plugins:
         timelines.append(get_thread_timeline(b))
-    # Track indices into the list of times and values from each plugin as
-    # we build an aggregate list.
-    times_lists = []
-    values_lists = []
-    indices = []
-    new_times = []
-    new_values = []
-
+    # Build the sorted union of every plugin's change times, then sample each
+    # plugin's timeline at all of them rather than walking the timelines one
+    # point at a time.
+    all_change_times = [numpy.zeros(1)]
     for t in timelines:
-        times_lists.append(t[0])
-        values_lists.append(t[1])
-        indices.append(0)
-        new_values.append([])
-
-    # Selects the next smallest time we need to add to our output list.
-    def current_min_time():
-        current_min = 1e99
-        for i in range(len(indices)):
-            n = indices[i]
-            if n >= len(times_lists[i]):
-                continue
-            if times_lists[i][n] < current_min:
-                current_min = times_lists[i][n]
-        return current_min
-
-    # Returns true if we've seen all the times in every list.
-    def all_times_done():
-        for i in range(len(indices)):
-            if indices[i] < len(times_lists[i]):
-                return False
-        return True
-
-    # Moves to the next time for each input list if the current time is at the
-    # head of the list.
-    def update_indices(current_time):
-        for i in range(len(indices)):
-            n = indices[i]
-            if n >= len(times_lists[i]):
-                continue
-            if times_lists[i][n] == current_time:
-                indices[i] += 1
-
-    def update_values():
-        for i in range(len(indices)):
-            n = indices[i]
-            if n >= len(values_lists[i]):
-                new_values[i].append(0)
-                continue
-            new_values[i].append(values_lists[i][n])
-
-    while not all_times_done():
-        current_time = current_min_time()
-        new_times.append(current_time)
-        update_values()
-        update_indices(current_time)
-
-    to_return = []
-    to_return.append(new_times)
-    for v in new_values:
-        to_return.append(v)
-    return to_return
+        all_change_times.append(t[0][1::2])
+    change_times = numpy.unique(numpy.concatenate(all_change_times))
+    # As in the individual timelines, each change time gets two points: one
+    # with the values before the change, and one with the values after it.
+    new_times = numpy.repeat(change_times, 2)[1:]
+    new_values = numpy.zeros((len(timelines), len(new_times)),
+        dtype=numpy.int64)
+    for i in range(len(timelines)):
+        new_values[i, 1::2] = sample_timeline(timelines[i], change_times[1:],
+            "left")
+        new_values[i, 0::2] = sample_timeline(timelines[i], change_times,
+            "right")
+    return [new_times, new_values]
 
 def get_total_timeline(plugins):
-    """Similar to get_stackplot_values, but only returns a single list of
-    values, containing the total number of threads from all plugins."""
-    data = get_stackplot_values(plugins)
-    total_counts = []
-    for i in range(len(data[0])):
-        total_counts.append(0)
-    for i in range(len(data) - 1):
-        for j in range(len(data[i + 1])):
-            total_counts[j] += data[i + 1][j]
-    return [data[0], total_counts]
+    """Similar to get_stackplot_values, but only returns a single timeline,
+    containing the total number of threads from all plugins."""
+    events = intervals.sort_events([b["block_events"] for b in plugins])
+    return events_to_timeline(events[0], events[1])
 
 def set_axes_dimensions(axes, min_x, max_x, min_y, max_y):
     """Sets the ticks and size for the given axes. Includes padding space so
@@ -241,32 +243,45 @@ def plugin_sort_key(plugin):
 
 def plugin_has_block_times(plugin):
     """Returns true only if the plugin includes some block times."""
-    if len(plugin["times"]) < 2:
-        return False
-    for t in plugin["times"][1:]:
-        # Return true only if the plugin contains at least 1 block time.
-        if "block_times" not in t:
-            continue
-        if len(t["block_times"]) >= 1:
-            return True
-    return False
+    return len(plugin["block_events"][0]) >= 1
 
-def get_first_block_start_time(times, count):
-    for i in range(len(times)):
-        if count[i] != 0:
-            return times[i]
-    return min(times)
+def get_first_block_start_time(plugins):
+    """Returns the time at which the first block in any of the plugin
+    summaries started."""
+    return min([p["block_index"].get_first_start_time() for p in plugins])
 
-def get_last_block_end_time(times, count):
-    for i in range(len(times)):
-        if count[len(times) - i - 1] != 0:
-            return times[len(times) - i - 1]
-    return max(times)
+def get_last_block_end_time(plugins):
+    """Returns the time at which the last block in any of the plugin
+    summaries ended."""
+    return max([p["block_index"].get_last_end_time() for p in plugins])
 
-def plot_scenario(plugins, name, zoom_to_activity):
-    """Takes a list of parsed plugin results and a scenario name and
+def convert_to_cpu_time(plugin):
+    """Takes a plugin summary and returns a copy of it with the times in its
+    block events and block index converted from GPU time to CPU time in
+    milliseconds, using the plugin's clock alignment."""
+    alignment = plugin["clock_alignment"]
+    if alignment is None:
+        print("Error! Can't convert the block times of %s to CPU time." %
+            (plugin_sort_key(plugin)))
+        exit(1)
+    to_return = dict(plugin)
+    events = plugin["block_events"]
+    to_return["block_events"] = [
+        clock_alignment.gpu_to_cpu(events[0], alignment) * 1000.0, events[1],
+        events[2]]
+    index = plugin["block_index"]
+    to_return["block_index"] = block_index.BlockIndex(
+        clock_alignment.gpu_to_cpu(index.starts, alignment) * 1000.0,
+        clock_alignment.gpu_to_cpu(index.ends, alignment) * 1000.0,
+        index.thread_counts, index.kernels)
+    return to_return
+
+def plot_scenario(plugins, name, zoom_to_activity, cpu_time=False):
+    """Takes a list of plugin summaries and a scenario name and
     generates a plot showing the timeline of plugin behaviors for the
-    specific scenario. Returns a matplotlib Figure object."""
+    specific scenario. If cpu_time is True, the block times are converted to
+    CPU time (in milliseconds) before plotting. Returns a matplotlib Figure
+    object."""
     plugins = sorted(plugins, key = plugin_sort_key)
     # Remove any plugins that don't have any block times.
     tmp = []
@@ -274,18 +289,19 @@ def plot_scenario(plugins, name, zoom_to_activity):
         if plugin_has_block_times(b):
             tmp.append(b)
     plugins = tmp
+    if cpu_time:
+        plugins = [convert_to_cpu_time(b) for b in plugins]
+    import matplotlib.pyplot as plot
     figure = plot.figure()
-    figure.canvas.set_window_title(name)
+    plot_utils.set_window_title(figure, name)
     total_timeline = get_total_timeline(plugins)
-    min_time = min(total_timeline[0])
-    max_time = max(total_timeline[0])
+    min_time = total_timeline[0].min()
+    max_time = total_timeline[0].max()
     # Use alternate min and max times (corresponding to when threads are
     # actually running) if zoom_to_activity is True.
     if zoom_to_activity:
-        min_time = get_first_block_start_time(total_timeline[0],
-            total_timeline[1])
-        max_time = get_last_block_end_time(total_timeline[0],
-            total_timeline[1])
+        min_time = get_first_block_start_time(plugins)
+        max_time = get_last_block_end_time(plugins)
 
     # Just start the times at 0 for the paper's plots.
     time_offset = min_time
@@ -293,9 +309,9 @@ def plot_scenario(plugins, name, zoom_to_activity):
     max_time = max_time - time_offset
 
     #axes = figure.add_subplot(len(plugins) + 1, 1, 1)
-    total_timeline[0].append(max_time)
-    total_timeline[1].append(0)
-    max_threads = max(total_timeline[1])
+    total_timeline[0] = numpy.append(total_timeline[0], max_time)
+    total_timeline[1] = numpy.append(total_timeline[1], 0)
+    max_threads = total_timeline[1].max()
     #set_axes_dimensions(axes, min_time, max_time, 0, max_threads)
     #axes.plot(total_timeline[0], total_timeline[1], color="k", lw=2)
     #axes.set_ylabel("# threads,\ntotal")
@@ -306,45 +322,72 @@ def plot_scenario(plugins, name, zoom_to_activity):
         timeline = get_thread_timeline(plugin)
 
         # Adjust all of the timeline's times to start at 0.
-        for j in range(len(timeline[0])):
-            timeline[0][j] -= time_offset
+        timeline[0] = timeline[0] - time_offset
 
         # Make sure all timelines extend to the right end of the plot
-        timeline[0].append(max_time)
-        timeline[1].append(0)
+        timeline[0] = numpy.append(timeline[0], max_time)
+        timeline[1] = numpy.append(timeline[1], 0)
 
-        max_threads = max(timeline[1])
+        max_threads = timeline[1].max()
         set_axes_dimensions(axes, min_time, max_time, 0, max_threads)
         axes.set_yticks([0, 40000, 80000, 120000, 160000])
-        axes.plot(timeline[0], timeline[1], color="k", lw=2)
+        plot_decimated_timeline(axes, timeline, color="k", lw=2)
         label = "%d: %s" % (i + 1, plugin["plugin_name"])
         if "label" in plugin:
             label = plugin["label"]
         axes.set_ylabel("# threads,\n" + label)
     # Add the X label below the bottommost subplot
-    axes.set_xlabel("Time (millions of GPU cycles)")
+    if cpu_time:
+        axes.set_xlabel("Time (milliseconds, CPU clock)")
+    else:
+        axes.set_xlabel("Time (millions of GPU cycles)")
     return figure
 
-def show_plots(filenames, zoom_to_activity):
-    """Takes a list of filenames, and generates one plot per scenario found in
-    the files."""
-    parsed_files = []
-    for name in filenames:
-        with open(name) as f:
-            parsed_files.append(json.loads(f.read()))
-    # Group the files by scenario
+def group_by_scenario(plugins):
+    """Takes a list of plugin summaries and returns a dict mapping each
+    scenario name to the list of summaries for that scenario."""
     scenarios = {}
-    for plugin in parsed_files:
+    for plugin in plugins:
         scenario = plugin["scenario_name"]
         if not scenario in scenarios:
             scenarios[scenario] = []
         scenarios[scenario].append(plugin)
+    return scenarios
+
+def load_scenarios(filenames, jobs):
+    """Takes a list of filenames and returns the dict returned by
+    group_by_scenario for them. The files are parsed in the given number of
+    worker processes."""
+    parsed_files = list(parallel.map_in_processes(summarize_file,
+        [(name,) for name in filenames], jobs))
+    return group_by_scenario(parsed_files)
+
+def show_plots(filenames, zoom_to_activity, cpu_time, jobs):
+    """Takes a list of filenames, and generates one plot per scenario found in
+    the files. The files are parsed in the given number of worker processes."""
+    import matplotlib.pyplot as plot
+    scenarios = load_scenarios(filenames, jobs)
     figures = []
     for scenario in scenarios:
         figures.append(plot_scenario(scenarios[scenario], scenario,
-            zoom_to_activity))
+            zoom_to_activity, cpu_time))
     plot.show()
 
+def save_plots(filenames, zoom_to_activity, cpu_time, jobs, output_dir,
+    formats):
+    """Like show_plots, but saves each plot to output_dir in each of the given
+    formats rather than displaying it. The plots are also drawn in the given
+    number of worker processes."""
+    scenarios = load_scenarios(filenames, jobs)
+    figure_list = []
+    for scenario in scenarios:
+        figure_list.append([plot_scenario,
+            (scenarios[scenario], scenario, zoom_to_activity, cpu_time),
+            plot_utils.get_output_name(scenario)])
+    for path in plot_utils.export_figures(figure_list, output_dir, formats,
+        jobs):
+        print("Saved " + path)
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("-d", "--directory",
@@ -352,7 +395,19 @@ if __name__ == "__main__":
     parser.add_argument("-z", "--zoom-to-activity",
         help="If set, the timeline will be centered on actual block-time execution, rather than the full program timeline.",
         action="store_true")
+    parser.add_argument("-c", "--cpu_time", action="store_true",
+        help="If set, convert block times to the CPU's clock (fitted using "+
+            "each file's kernel launch times), rather than plotting GPU "+
+            "clock cycles.")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+        help="The number of processes to use when parsing result files, "+
+            "and when saving plots to files.")
+    plot_utils.add_output_arguments(parser)
     args = parser.parse_args()
     filenames = glob.glob(args.directory + "/*.json")
-    show_plots(filenames, args.zoom_to_activity)
-
+    if args.output_dir is None:
+        show_plots(filenames, args.zoom_to_activity, args.cpu_time, args.jobs)
+    else:
+        plot_utils.use_headless_backend()
+        save_plots(filenames, args.zoom_to_activity, args.cpu_time, args.jobs,
+            args.output_dir, plot_utils.parse_formats(args.format))
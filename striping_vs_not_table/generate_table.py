@@ -1,42 +1,43 @@
-import json
-import numpy
-
-def compute_stats(data):
-    """ Returns the min, max, med, mean, and stddev (in that order) of the
-    given data. """
-    data.sort()
-    med = data[int(len(data) / 2)]
-    mean = numpy.mean(data)
-    std = numpy.std(data)
-    return data[0], data[-1], med, mean, std
+import os
+import sys
+# The shared modules live in the common/ directory at the top of this repo.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import intervals
+from common import result_trace
+from common import stats
 
 def get_times(plugin):
     """ Returns an array of the plugin's "execute_times", converted to ms. """
-    to_return = []
-    k = "execute_times"
-    for t in plugin["times"]:
-        if not k in t:
-            continue
-        # End time - start time, converted to ms.
-        to_return.append((t[k][1] - t[k][0]) * 1000.0)
-    return to_return
+    # End time - start time, converted to ms.
+    return intervals.get_durations(plugin, "execute_times") * 1000.0
+
+def get_row_list():
+    """ Returns a list of dicts, one per row of the table, containing the
+    result "file" name, the two CU masks, and the scenario name. """
+    return [
+        {"file": "./1024_vs_256_evenly_partitioned.json", "cu_mask": r'\texttt{1010}...\texttt{101\textbf{0}}', "competitor_mask": r'\texttt{0101}...\texttt{0101}', "scenario": "Striped, Equal Partitions"},
+        {"file": "./1024_vs_256_unevenly_partitioned.json", "cu_mask": r'\texttt{1010}...\texttt{101\textbf{1}}', "competitor_mask": r'\texttt{0101}...\texttt{0101}', "scenario": "Striped, Unequal Partitions"},
+        {"file": "./mm1024_unstriped_even.json", "cu_mask": r'\texttt{1111}...\texttt{000\textbf{0}}', "competitor_mask": r'\texttt{0000}...\texttt{1111}', "scenario": "Unstriped, Equal Partitions"},
+        {"file": "./mm1024_unstriped_uneven.json", "cu_mask": r'\texttt{1111}...\texttt{000\textbf{1}}', "competitor_mask": r'\texttt{0000}...\texttt{1111}', "scenario": "Unstriped, Unequal Partitions"},
+    ]
 
-def print_table_row(filename, cu_mask, competitor_mask, scenario):
-    stats = None
-    with open(filename) as f:
-        plugin = json.loads(f.read())
-        times = get_times(plugin)
-        stats = compute_stats(times)
-    print("%s & %s & %s & %.3f & %.3f & %.3f & %.3f & %.3f \\\\" % (scenario, cu_mask,
-        competitor_mask, stats[0], stats[1], stats[2], stats[3], stats[4]))
-    return None
+def summarize_file(filename):
+    """ Returns the stats, as returned by compute_stats, of the execute times
+    in the given result file. """
+    return stats.compute_stats(get_times(result_trace.load_trace(filename)))
 
-print(r'\hline')
-print(r'Scenario & \mmsbig{} CU Mask & \mmsmall{} CU Mask & Min & Max & Median & Arith. Mean & Std. Dev. \\')
-print(r'\hline')
-print_table_row("./1024_vs_256_evenly_partitioned.json", r'\texttt{1010}...\texttt{101\textbf{0}}', r'\texttt{0101}...\texttt{0101}', "Striped, Equal Partitions")
-print_table_row("./1024_vs_256_unevenly_partitioned.json", r'\texttt{1010}...\texttt{101\textbf{1}}', r'\texttt{0101}...\texttt{0101}', "Striped, Unequal Partitions")
-print_table_row("./mm1024_unstriped_even.json", r'\texttt{1111}...\texttt{000\textbf{0}}', r'\texttt{0000}...\texttt{1111}', "Unstriped, Equal Partitions")
-print_table_row("./mm1024_unstriped_uneven.json", r'\texttt{1111}...\texttt{000\textbf{1}}', r'\texttt{0000}...\texttt{1111}', "Unstriped, Unequal Partitions")
-print(r'\hline')
+def print_table(rows, all_stats, output=sys.stdout):
+    """ Takes the list returned by get_row_list and the corresponding list of
+    stats returned by summarize_file, and writes the LaTeX table to the given
+    file. """
+    print(r'\hline', file=output)
+    print(r'Scenario & \mmsbig{} CU Mask & \mmsmall{} CU Mask & Min & Max & Median & Arith. Mean & Std. Dev. \\', file=output)
+    print(r'\hline', file=output)
+    for row, v in zip(rows, all_stats):
+        print("%s & %s & %s & %.3f & %.3f & %.3f & %.3f & %.3f \\\\" % (row["scenario"], row["cu_mask"],
+            row["competitor_mask"], v[0], v[1], v[2], v[3], v[4]), file=output)
+    print(r'\hline', file=output)
 
+if __name__ == "__main__":
+    rows = get_row_list()
+    print_table(rows, [summarize_file(row["file"]) for row in rows])
@@ -1,20 +1,27 @@
 # This is a quick script that runs four scenarios with different CU masks of
 # MM1024 vs MM256.
-import json
-import subprocess
-import time
+import argparse
+import os
+import sys
+# The shared modules live in the common/ directory at the top of this repo.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import experiment_matrix
+from common import experiment_scheduler
 
-def generate_configs():
-    """ Returns a list of JSON configs, each of which must be run to generate
-    the data. """
-    # Base configs for MM1024 and MM256
+def get_matrix():
+    """ Returns the experiment matrix (see common/experiment_matrix.py)
+    describing the experiments run by this script: MM1024 vs. MM256 with
+    unstriped CU masks. """
+    # Base configs for MM1024 and MM256. The masks are replaced in each
+    # experiment.
+    masks = experiment_matrix.get_partition_masks("packed_even", 60, 60)
     mm1024_config = {
         "label": "MM1024",
         "filename": "./bin/matrix_multiply.so",
         "log_name": "./results/mm1024_unstriped_even.json",
         "thread_count": 1024,
         "block_count": 1,
-        "compute_unit_mask": "1" * 30 + "0" * 30,
+        "compute_unit_mask": masks[0],
         "additional_info": {
             "matrix_width": 1024,
             "skip_copy": True
@@ -26,15 +33,12 @@ def generate_configs():
         "log_name": "/dev/null",
         "thread_count": 256,
         "block_count": 1,
-        "compute_unit_mask": "0" * 30 + "1" * 30,
+        "compute_unit_mask": masks[1],
         "additional_info": {
             "matrix_width": 1024,
             "skip_copy": True
         }
     }
-
-    to_return = []
-    # The first overall config: Un-striped even CU masks
     overall_config = {
         "name": "MM1024 vs MM256 (Unstriped Even Partitions)",
         "max_iterations": 0,
@@ -44,28 +48,41 @@ def generate_configs():
         "do_warmup": True,
         "omit_block_times": True,
         "sync_every_iteration": False,
-        "plugins": [mm1024_config, mm256_config]
+        "plugins": []
+    }
+    # We already have data for striped even and striped uneven, from the
+    # worst-case experiment.
+    return {
+        "base_config": overall_config,
+        "workloads": [
+            ["MM1024", "1024", mm1024_config],
+            ["MM256", "256", mm256_config],
+        ],
+        "isolated": [],
+        "competitors": {"MM1024": ["MM256"]},
+        "partitionings": ["packed_even", "packed_uneven"],
+        "gpu_cu_count": 60,
+        "cu_counts": [60],
+        "results_directory": "./results",
+        "competitor_label": None,
+        "file_name": [None, "mm{short_name}_{file_suffix}{cu_suffix}.json"],
+        "scenario_name": [None,
+            "{workload} vs {competitor} ({partitioning_label})"],
+        "label": [None, "{workload}"],
+        "category": [None, "{workload} (vs. {competitor})"],
     }
-    to_return.append(json.dumps(overall_config))
-
-    # Second experiment: Un-striped uneven CU masks
-    overall_config["name"] = "MM1024 vs MM256 (Unstriped Uneven Partitions)"
-    mm1024_config["compute_unit_mask"] = "1" * 30 + "0" * 29 + "1"
-    mm1024_config["log_name"] = "./results/mm1024_unstriped_uneven.json"
-    to_return.append(json.dumps(overall_config))
-
-    # We already have data for striped even and striped uneven.
 
-    return to_return
+def generate_configs(shard_index=0, shard_count=1):
+    """ Returns a list of JSON configs, each of which must be run to generate
+    the data. """
+    return experiment_matrix.generate_configs(get_matrix(), shard_index,
+        shard_count)
 
 if __name__ == "__main__":
-    configs = generate_configs()
-    for i in range(len(configs)):
-        print("Running experiment %d of %d" % (i + 1, len(configs)))
-        config = configs[i]
-        process = subprocess.Popen(["./bin/runner", "-"],
-            stdin=subprocess.PIPE)
-        process.communicate(input=config)
-        print("Sleeping a bit.\n")
-        time.sleep(2.0)
-
+    parser = argparse.ArgumentParser()
+    experiment_scheduler.add_arguments(parser,
+        "./results/striping_vs_not_journal.jsonl")
+    experiment_matrix.add_arguments(parser)
+    args = parser.parse_args()
+    configs = generate_configs(args.shard_index, args.shard_count)
+    experiment_scheduler.run_from_args(configs, args)
@@ -1,47 +1,72 @@
-import json
-import matplotlib.pyplot as plot
+# matplotlib is only imported by the functions that draw plots, so that
+# printing the table on its own (using --table_only) starts quickly.
+import argparse
 import numpy
+import os
+import sys
+# The shared modules live in the common/ directory at the top of this repo.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import experiment_matrix
+from common import intervals
+from common import plot_utils
+from common import result_trace
+from common import stats
+import worst_case_experiment
 
-def convert_values_to_cdf(values):
+# The smallest number of points a downsampled CDF can have.
+MIN_CDF_POINTS = 8
+
+def downsample_cdf(data, ratios, max_points):
+    """Takes the two vectors of a CDF, as returned by convert_values_to_cdf,
+    and returns the indices of at most max_points points to keep. The last
+    quarter of the allowed points are always the exact points at the top of
+    the CDF, so the tail (including the max) isn't distorted. The remaining
+    points are split between evenly-spaced times and evenly-spaced
+    percentages, starting at the min, so the plotted curve keeps its shape
+    both horizontally and vertically."""
+    if max_points < MIN_CDF_POINTS:
+        raise Exception("A CDF needs at least %d points" % (MIN_CDF_POINTS))
+    n = len(data)
+    tail_count = max_points // 4
+    body_count = (max_points - tail_count - 1) // 2
+    tail_start = n - tail_count
+    body_data = data[:tail_start]
+    body_ratios = ratios[:tail_start]
+    x_targets = numpy.linspace(body_data[0], body_data[-1], body_count)
+    y_targets = numpy.linspace(body_ratios[0], body_ratios[-1], body_count)
+    x_indices = numpy.searchsorted(body_data, x_targets)
+    y_indices = numpy.searchsorted(body_ratios, y_targets)
+    keep = numpy.concatenate(([0], x_indices, y_indices,
+        numpy.arange(tail_start, n)))
+    return numpy.unique(numpy.minimum(keep, n - 1))
+
+def convert_values_to_cdf(values, max_points=None):
     """Takes a 1-D list of values and converts it to a CDF representation. The
-    CDF consists of a vector of times and a vector of percentages of 100."""
+    CDF consists of a vector of times and a vector of percentages of 100. If
+    max_points is given, the CDF is downsampled to contain at most that many
+    points (see downsample_cdf). The values aren't modified."""
     if len(values) == 0:
         return [[], []]
-    values.sort()
+    unique_values, counts = numpy.unique(values, return_counts=True)
     total_size = float(len(values))
-    current_min = values[0]
-    count = 0.0
-    data_list = [values[0]]
-    ratio_list = [0.0]
-    for v in values:
-        count += 1.0
-        if v > current_min:
-            data_list.append(v)
-            ratio_list.append((count / total_size) * 100.0)
-            current_min = v
-    data_list.append(values[-1])
-    ratio_list.append(100)
+    # Each distinct value is plotted at the percentage of samples before it,
+    # plus one (i.e. the percentage at the time the value was first seen when
+    # walking through the sorted values).
+    counts_before = numpy.cumsum(counts) - counts
+    data_list = numpy.concatenate((unique_values, unique_values[-1:]))
+    ratio_list = numpy.zeros(len(data_list))
+    ratio_list[1:-1] = ((counts_before[1:] + 1.0) / total_size) * 100.0
+    ratio_list[-1] = 100.0
+    if (max_points is not None) and (len(data_list) > max_points):
+        keep = downsample_cdf(data_list, ratio_list, max_points)
+        data_list = data_list[keep]
+        ratio_list = ratio_list[keep]
     return [data_list, ratio_list]
 
-def compute_stats(data):
-    """ Returns the min, max, med, mean, and stddev (in that order) of the
-    given data. """
-    data.sort()
-    med = data[int(len(data) / 2)]
-    mean = numpy.mean(data)
-    std = numpy.std(data)
-    return data[0], data[-1], med, mean, std
-
 def get_times(plugin):
     """ Returns an array of the plugin's "execute_times", converted to ms. """
-    to_return = []
-    k = "execute_times"
-    for t in plugin["times"]:
-        if not k in t:
-            continue
-        # End time - start time, converted to ms.
-        to_return.append((t[k][1] - t[k][0]) * 1000.0)
-    return to_return
+    # End time - start time, converted to ms.
+    return intervals.get_durations(plugin, "execute_times") * 1000.0
 
 def get_line_dashes(label):
     """ Returns the line style that we'll use across all plots for a given
@@ -81,8 +106,9 @@ def add_plot_padding(axes):
 def generate_plot(data, name):
     """ Takes a list of processed data elements and returns a figure, with the
     given title, of a CDF plot. """
+    import matplotlib.pyplot as plot
     figure = plot.figure()
-    figure.canvas.set_window_title(name)
+    plot_utils.set_window_title(figure, name)
     axes = figure.add_subplot(1, 1, 1)
     axes.autoscale(enable=True, axis="both", tight=True)
     for i in range(len(data)):
@@ -97,97 +123,141 @@ def generate_plot(data, name):
     legend = plot.legend(loc=9)
     #legend.draggable()
     legend.set_draggable(True)
+    figure.subplots_adjust(bottom=0.35)
     return figure
 
-def get_data_list():
-    """ Returns a list of data from parsed JSON files, computing stats and CDFs
-    for each file. """
-    iso = "Isolated"
-    full = "Full GPU Sharing"
-    even = "Evenly Partitioned"
-    bad = "Partitioned, w/ Additional Shared CU"
-    c1 = "MM1024 (vs. MM1024)"
-    c2 = "MM1024 (vs. MM256)"
-    c3 = "MM256 (vs. MM256)"
-    c4 = "MM256 (vs. MM1024)"
-
-    to_return = [
-        # 0
-        {"label": iso, "file": "1024_isolated.json", "category": "MM1024 Isolated"},
-        # 1
-        {"label": iso, "file": "256_isolated.json", "category": "MM256 Isolated"},
-        # 2
-        {"label": full, "file": "1024_vs_1024_full_shared.json", "category": c1},
-        # 3
-        {"label": even, "file": "1024_vs_1024_evenly_partitioned.json", "category": c1},
-        # 4
-        {"label": bad, "file": "1024_vs_1024_unevenly_partitioned.json", "category": c1},
-        # 5
-        {"label": full, "file": "1024_vs_256_full_shared.json", "category": c2},
-        # 6
-        {"label": even, "file": "1024_vs_256_evenly_partitioned.json", "category": c2},
-        # 7
-        {"label": bad, "file": "1024_vs_256_unevenly_partitioned.json", "category": c2},
-        # 8
-        {"label": full, "file": "256_vs_256_full_shared.json", "category": c3},
-        # 9
-        {"label": even, "file": "256_vs_256_evenly_partitioned.json", "category": c3},
-        # 10
-        {"label": bad, "file": "256_vs_256_unevenly_partitioned.json", "category": c3},
-        # 11
-        {"label": full, "file": "256_vs_1024_full_shared.json", "category": c4},
-        # 12
-        {"label": even, "file": "256_vs_1024_evenly_partitioned.json", "category": c4},
-        # 13
-        {"label": bad, "file": "256_vs_1024_unevenly_partitioned.json", "category": c4},
-    ]
+def get_file_list():
+    """ Returns a list of dicts, one per line in the table, containing the
+    "label", "category" and result "file" name of each line, in the order of
+    the experiments in worst_case_experiment.py. """
+    to_return = []
+    for e in experiment_matrix.get_manifest(worst_case_experiment.get_matrix()):
+        to_return.append({"label": e["label"], "file": e["file"],
+            "category": e["category"]})
+    return to_return
 
-    # Parse the data, compute stats and CDFs
-    for i in range(len(to_return)):
-        with open(to_return[i]["file"]) as f:
-            to_return[i]["data"] = json.loads(f.read())
-        times = get_times(to_return[i]["data"])
-        to_return[i]["times"] = times
-        to_return[i]["stats"] = compute_stats(times)
-        to_return[i]["cdf"] = convert_values_to_cdf(times)
+def parse_max_cdf_points(text):
+    """ Parses the value of the --max_cdf_points argument, which must be 0 (to
+    plot every point) or at least MIN_CDF_POINTS. """
+    value = int(text)
+    if (value != 0) and (value < MIN_CDF_POINTS):
+        raise argparse.ArgumentTypeError("must be 0 or at least %d" %
+            (MIN_CDF_POINTS))
+    return value
 
+def summarize_file(filename, max_cdf_points, include_cdf=True):
+    """ Takes the name of a result file and returns a dict containing the
+    number of samples ("count"), the "stats" returned by compute_stats, and
+    the "cdf" of the file's times, containing at most max_cdf_points points
+    (or every point if max_cdf_points is None). The "cdf" is left out if
+    include_cdf is False, e.g. if only the table is needed. """
+    times = get_times(result_trace.load_trace(filename))
+    to_return = {
+        "count": len(times),
+        "stats": stats.compute_stats(times),
+    }
+    if include_cdf:
+        to_return["cdf"] = convert_values_to_cdf(times, max_cdf_points)
     return to_return
 
-def show_plots(data):
-    """ Generates and displays the 4 CDF plots. """
+def get_data_list(max_cdf_points, include_cdf=True):
+    """ Returns the list from get_file_list, with the fields returned by
+    summarize_file added to each element. """
+    to_return = get_file_list()
+    for d in to_return:
+        d.update(summarize_file(d["file"], max_cdf_points, include_cdf))
+    return to_return
+
+def get_plot_list():
+    """ Returns a list of [name, indices] pairs, one for each of the 4 CDF
+    plots, where indices are the indices of the plot's lines in the list
+    returned by get_file_list. """
+    manifest = experiment_matrix.get_manifest(
+        worst_case_experiment.get_matrix())
+    def find(workload, competitor, partitioning):
+        return experiment_matrix.find_experiment(manifest, workload,
+            competitor, partitioning)
     # Some of this data is reordered slightly so that the legend is always in
     # the order of the curves from left to right.
-    plot1_data = [data[0], data[2], data[3], data[4]]
-    # 1024-vs-256, where partitioned is faster
-    plot2_data = [data[0], data[6], data[5], data[7]]
-    plot3_data = [data[1], data[8], data[9], data[10]]
-    # In this plot, vs. 1024 is faster (?? but consistently) than isolated.
-    plot4_data = [data[11], data[1], data[12], data[13]]
+    return [
+        ["MM1024 (vs. MM1024)", [find("MM1024", None, "isolated"),
+            find("MM1024", "MM1024", "full"),
+            find("MM1024", "MM1024", "even"),
+            find("MM1024", "MM1024", "uneven")]],
+        # 1024-vs-256, where partitioned is faster
+        ["MM1024 (vs. MM256)", [find("MM1024", None, "isolated"),
+            find("MM1024", "MM256", "even"),
+            find("MM1024", "MM256", "full"),
+            find("MM1024", "MM256", "uneven")]],
+        ["MM256 (vs. MM256)", [find("MM256", None, "isolated"),
+            find("MM256", "MM256", "full"),
+            find("MM256", "MM256", "even"),
+            find("MM256", "MM256", "uneven")]],
+        # In this plot, vs. 1024 is faster (?? but consistently) than isolated.
+        ["MM256 (vs. MM1024)", [find("MM256", "MM1024", "full"),
+            find("MM256", None, "isolated"),
+            find("MM256", "MM1024", "even"),
+            find("MM256", "MM1024", "uneven")]],
+    ]
+
+def show_plots(data):
+    """ Generates and displays the 4 CDF plots. """
+    import matplotlib.pyplot as plot
     figures = []
-    figures.append(generate_plot(plot1_data, "MM1024 (vs. MM1024)"))
-    plot.subplots_adjust(bottom=0.35)
-    figures.append(generate_plot(plot2_data, "MM1024 (vs. MM256)"))
-    plot.subplots_adjust(bottom=0.35)
-    figures.append(generate_plot(plot3_data, "MM256 (vs. MM256)"))
-    plot.subplots_adjust(bottom=0.35)
-    figures.append(generate_plot(plot4_data, "MM256 (vs. MM1024)"))
-    plot.subplots_adjust(bottom=0.35)
+    for name, indices in get_plot_list():
+        figures.append(generate_plot([data[i] for i in indices], name))
     plot.show()
     return None
 
-def print_table(data):
-    print(r'Scenario & Partitioning & \# Samples & Min & Max & Median & Arith. Mean & Std. Dev. \\')
-    print(r'\hline')
+def save_plots(data, output_dir, formats, jobs):
+    """ Saves the 4 CDF plots to files in output_dir, in each of the given
+    formats, drawing them in the given number of worker processes. """
+    figure_list = []
+    for name, indices in get_plot_list():
+        figure_list.append([generate_plot, ([data[i] for i in indices], name),
+            "cdf_" + plot_utils.get_output_name(name)])
+    for path in plot_utils.export_figures(figure_list, output_dir, formats,
+        jobs):
+        print("Saved " + path)
+
+def print_table(data, output=sys.stdout):
+    """ Writes the LaTeX table rows for the data to the given file. """
+    print(r'Scenario & Partitioning & \# Samples & Min & Max & Median & Arith. Mean & Std. Dev. \\', file=output)
+    print(r'\hline', file=output)
     for d in data:
-        print("% Category: " + d["category"])
+        print("% Category: " + d["category"], file=output)
         v = d["stats"]
-        n = len(d["times"])
+        n = d["count"]
         print(" & %s & %d & %.3f & %.3f & %.3f & %.3f & %.3f \\\\" % (d["label"], n,
-            v[0], v[1], v[2], v[3], v[4]))
-    print(r'\hline')
+            v[0], v[1], v[2], v[3], v[4]), file=output)
+    print(r'\hline', file=output)
 
 if __name__ == "__main__":
-    data = get_data_list()
-    show_plots(data)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max_cdf_points", type=parse_max_cdf_points,
+        default=2000,
+        help="The maximum number of points to plot in each CDF, at least "+
+            str(MIN_CDF_POINTS) + ". Set to 0 to plot every point.")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+        help="The number of processes to use when saving plots to files.")
+    parser.add_argument("--table_only", action="store_true",
+        help="Only print the table, without computing CDFs or drawing any "+
+            "plots. matplotlib isn't imported in this case.")
+    plot_utils.add_output_arguments(parser)
+    args = parser.parse_args()
+    max_cdf_points = args.max_cdf_points
+    if max_cdf_points == 0:
+        max_cdf_points = None
+    if args.table_only:
+        print_table(get_data_list(max_cdf_points, False))
+        exit(0)
+    if args.output_dir is not None:
+        plot_utils.use_headless_backend()
+    data = get_data_list(max_cdf_points)
+    if args.output_dir is None:
+        show_plots(data)
+    else:
+        save_plots(data, args.output_dir, plot_utils.parse_formats(args.format),
+            args.jobs)
     print_table(data)
 
@@ -2,16 +2,18 @@
 # in the paper. Run it while in the `hip_plugin_framework` directory, then copy
 # the .json files from `hip_plugin_framework/results/`.
 import argparse
-import copy
-import json
-import subprocess
-import time
+import os
+import sys
+# The shared modules live in the common/ directory at the top of this repo.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import experiment_matrix
+from common import experiment_scheduler
 
-def generate_configs():
-    """ Returns a list of JSON configs, containing one JSON string per
-    experiment in the paper. """
-    # Start by defining a base config for MM1024 and MM256. We'll copy these
-    # and modify them as necessary.
+def get_matrix():
+    """ Returns the experiment matrix (see common/experiment_matrix.py)
+    describing every experiment in the paper: each workload on its own, and
+    against each competitor, using each way of partitioning the GPU. This is
+    also used by generate_plots_and_table.py to find the results. """
     mm1024_config = {
         "label": "MM1024",
         "log_name": "./results/mm1024_isolated.json",
@@ -34,10 +36,6 @@ def generate_configs():
             "skip_copy": True
         }
     }
-    to_return = []
-
-    # We'll also copy and modify this top-level config, generally only to
-    # change the scenario name.
     overall_config = {
         "name": "MM1024 vs MM1024",
         "max_iterations": 0,
@@ -47,129 +45,45 @@ def generate_configs():
         "do_warmup": True,
         "omit_block_times": True,
         "sync_every_iteration": False,
-        "plugins": [mm1024_config]
+        "plugins": []
+    }
+    return {
+        "base_config": overall_config,
+        "workloads": [
+            ["MM1024", "1024", mm1024_config],
+            ["MM256", "256", mm256_config],
+        ],
+        "isolated": ["MM1024", "MM256"],
+        # Each workload is run against itself first.
+        "competitors": {
+            "MM1024": ["MM1024", "MM256"],
+            "MM256": ["MM256", "MM1024"],
+        },
+        "partitionings": ["full", "even", "uneven"],
+        # The CU masks are for a Radeon VII, with 60 CUs.
+        "gpu_cu_count": 60,
+        "cu_counts": [60],
+        "results_directory": "./results",
+        "competitor_label": "Competitor",
+        "file_name": ["{short_name}_isolated{cu_suffix}.json",
+            "{short_name}_vs_{competitor_short_name}_{file_suffix}" +
+            "{cu_suffix}.json"],
+        "scenario_name": ["{workload} Isolated", "{workload} vs {competitor}"],
+        "label": ["Isolated", "{partitioning_label}"],
+        "category": ["{workload} Isolated", "{workload} (vs. {competitor})"],
     }
 
-    # 1024: isolated
-    mm1024_config["label"] = "Isolated"
-    mm1024_config["log_name"] = "./results/1024_isolated.json"
-    overall_config["name"] = "MM1024 Isolated"
-    overall_config["plugins"] = [mm1024_config]
-    to_return.append(json.dumps(overall_config))
-
-    # 256: isolated
-    mm256_config["label"] = "Isolated"
-    mm256_config["log_name"] = "./results/256_isolated.json"
-    overall_config["name"] = "MM256 Isolated"
-    overall_config["plugins"] = [mm256_config]
-    to_return.append(json.dumps(overall_config))
-
-    overall_config["name"] = "MM1024 vs MM1024"
-    # 1024 vs 1024: Fully shared GPU
-    mm1024_config["label"] = "Full GPU Sharing"
-    mm1024_config["log_name"] = "./results/1024_vs_1024_full_shared.json"
-    competitor1024 = copy.deepcopy(mm1024_config)
-    competitor1024["log_name"] = "/dev/null"
-    competitor1024["label"] = "Competitor"
-    overall_config["plugins"] = [mm1024_config, competitor1024]
-    to_return.append(json.dumps(overall_config))
-    # Partitioned equally
-    mm1024_config["label"] = "Evenly Partitioned"
-    mm1024_config["log_name"] = "./results/1024_vs_1024_evenly_partitioned.json"
-    mm1024_config["compute_unit_mask"] = "10" * 30
-    competitor1024["compute_unit_mask"] = "01" * 30
-    to_return.append(json.dumps(overall_config))
-    # Uneven partitioned
-    mm1024_config["label"] = "Partitioned, w/ Additional Shared CU"
-    mm1024_config["log_name"] = "./results/1024_vs_1024_unevenly_partitioned.json"
-    mm1024_config["compute_unit_mask"] = "10" * 29 + "11"
-    to_return.append(json.dumps(overall_config))
-
-    # Remove the CU masks
-    del mm1024_config["compute_unit_mask"]
-    del competitor1024["compute_unit_mask"]
-
-    overall_config["name"] = "MM1024 vs MM256"
-    # 1024 vs 256: Fully shared GPU
-    mm1024_config["log_name"] = "./results/1024_vs_256_full_shared.json"
-    mm1024_config["label"] = "Full GPU Sharing"
-    competitor256 = copy.deepcopy(mm256_config)
-    competitor256["log_name"] = "/dev/null"
-    competitor256["label"] = "Competitor"
-    overall_config["plugins"] = [mm1024_config, competitor256]
-    to_return.append(json.dumps(overall_config))
-    # Partitioned equally
-    mm1024_config["log_name"] = "./results/1024_vs_256_evenly_partitioned.json"
-    mm1024_config["label"] = "Evenly Partitioned"
-    mm1024_config["compute_unit_mask"] = "10" * 30
-    competitor256["compute_unit_mask"] = "01" * 30
-    to_return.append(json.dumps(overall_config))
-    # Uneven partitioned
-    mm1024_config["log_name"] = "./results/1024_vs_256_unevenly_partitioned.json"
-    mm1024_config["label"] = "Partitioned, w/ Additional Shared CU"
-    mm1024_config["compute_unit_mask"] = "10" * 29 + "11"
-    to_return.append(json.dumps(overall_config))
-
-    # Remove CU masks again
-    del mm1024_config["compute_unit_mask"]
-    del competitor256["compute_unit_mask"]
-
-    overall_config["name"] = "MM256 vs MM256"
-    # 256 vs 256: Fully shared GPU
-    mm256_config["log_name"] = "./results/256_vs_256_full_shared.json"
-    mm256_config["label"] = "Full GPU Sharing"
-    overall_config["plugins"] = [mm256_config, competitor256]
-    to_return.append(json.dumps(overall_config))
-    # Partitioned equally
-    mm256_config["log_name"] = "./results/256_vs_256_evenly_partitioned.json"
-    mm256_config["label"] = "Evenly Partitioned"
-    mm256_config["compute_unit_mask"] = "10" * 30
-    competitor256["compute_unit_mask"] = "01" * 30
-    to_return.append(json.dumps(overall_config))
-    # Uneven partitioned
-    mm256_config["log_name"] = "./results/256_vs_256_unevenly_partitioned.json"
-    mm256_config["label"] = "Partitioned, w/ Additional Shared CU"
-    mm256_config["compute_unit_mask"] = "10" * 29 + "11"
-    to_return.append(json.dumps(overall_config))
-
-    # Remove CU masks again
-    del mm256_config["compute_unit_mask"]
-    del competitor256["compute_unit_mask"]
-
-    overall_config["name"] = "MM256 vs MM1024"
-    # 256 vs 1024: Fully shared GPU
-    mm256_config["log_name"] = "./results/256_vs_1024_full_shared.json"
-    mm256_config["label"] = "Full GPU Sharing"
-    overall_config["plugins"] = [mm256_config, competitor1024]
-    to_return.append(json.dumps(overall_config))
-    # Partitioned equally
-    mm256_config["log_name"] = "./results/256_vs_1024_evenly_partitioned.json"
-    mm256_config["label"] = "Evenly Partitioned"
-    mm256_config["compute_unit_mask"] = "10" * 30
-    competitor1024["compute_unit_mask"] = "01" * 30
-    to_return.append(json.dumps(overall_config))
-    # Uneven partitioned
-    mm256_config["log_name"] = "./results/256_vs_1024_unevenly_partitioned.json"
-    mm256_config["label"] = "Partitioned, w/ Additional Shared CU"
-    mm256_config["compute_unit_mask"] = "10" * 29 + "11"
-    to_return.append(json.dumps(overall_config))
-
-    # All done
-    return to_return
+def generate_configs(shard_index=0, shard_count=1):
+    """ Returns a list of JSON configs, containing one JSON string per
+    experiment in the paper (or per experiment in the given shard). """
+    return experiment_matrix.generate_configs(get_matrix(), shard_index,
+        shard_count)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument("--start_experiment", type=int, default=1,
-        help="The number of the first experiment to resume from, for use if "+
-            "one of the tests hangs.")
+    experiment_scheduler.add_arguments(parser,
+        "./results/worst_case_journal.jsonl")
+    experiment_matrix.add_arguments(parser)
     args = parser.parse_args()
-    configs = generate_configs()
-    for i in range(args.start_experiment - 1, len(configs)):
-        print("Running experiment %d of %d" % (i + 1, len(configs)))
-        config = configs[i]
-        process = subprocess.Popen(["./bin/runner", "-"],
-            stdin=subprocess.PIPE)
-        process.communicate(input=config)
-        print("Sleeping a bit.\n")
-        time.sleep(2.0)
-
+    configs = generate_configs(args.shard_index, args.shard_count)
+    experiment_scheduler.run_from_args(configs, args)